@@ -0,0 +1,377 @@
+"""Benchmarks every repository method and the services built on them, at several catalogue sizes.
+
+    $ python -m benchmarks.bench_repository --sizes 1000,100000,1000000 --output results.json
+    $ python -m benchmarks.bench_repository --repository shared --compare results.json
+
+Results are written as JSON, one entry per (size, case), so runs on two commits can be diffed with --compare.
+"""
+
+import argparse
+import atexit
+import gc
+import importlib
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, List
+
+from benchmarks.synthetic import synthetic_movies
+from watch_movies.adapters.instrumented_repository import InstrumentedRepository
+from watch_movies.adapters.memory_repository import MemoryRepository, populate, title_words
+from watch_movies.adapters.movie_columns import Between
+from watch_movies.adapters.query_cache import QueryCache, QueryCacheRepository
+from watch_movies.adapters.repository import AbstractRepository, RepositoryException
+from watch_movies.adapters.repository_proxy import REPOSITORY_METHODS
+from watch_movies.adapters.shared_catalogue import SharedCatalogue, SharedCatalogueRepository, write_catalogue
+from watch_movies.domain.model import Genre, Movie, User, make_review
+from watch_movies.movie_lib import services as movie_services
+from watch_movies.search import services as search_services
+from watch_movies.utilities import services as utility_services
+
+
+DEFAULT_SIZES = (1000, 100000, 1000000)
+SAMPLE_DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'watch_movies', 'adapters', 'data')
+
+# A case is timed in batches, doubling the batch until one takes at least MIN_BATCH_TIME, then repeated REPEATS
+# times; the best batch is reported, being the one least disturbed by the rest of the system.
+MIN_BATCH_TIME = 0.05
+REPEATS = 3
+
+# A change in ops/sec beyond this fraction is reported by --compare.
+REGRESSION_THRESHOLD = 0.1
+
+
+# ============================================
+# Repository backends
+# ============================================
+
+def memory_backend(movies: List[Movie]) -> AbstractRepository:
+    repository = MemoryRepository()
+    repository.add_movies(movies)
+    return repository
+
+
+def shared_backend(movies: List[Movie]) -> AbstractRepository:
+    directory = tempfile.mkdtemp(prefix='watch_movies_bench_')
+    atexit.register(shutil.rmtree, directory, True)
+    path = os.path.join(directory, 'catalogue.bin')
+    write_catalogue(movies, path)
+    return SharedCatalogueRepository(SharedCatalogue(path))
+
+
+def instrumented_backend(movies: List[Movie]) -> AbstractRepository:
+    return InstrumentedRepository(memory_backend(movies))
+
+
+def cached_backend(movies: List[Movie]) -> AbstractRepository:
+    return QueryCacheRepository(memory_backend(movies), QueryCache())
+
+
+BACKENDS = {
+    'memory': memory_backend,
+    'shared': shared_backend,
+    'instrumented': instrumented_backend,
+    'cached': cached_backend
+}
+
+
+def resolve_backend(spec: str) -> Callable[[List[Movie]], AbstractRepository]:
+    """ Returns the backend named spec, or the callable named by a 'module:function' spec.
+
+    A backend is any callable taking a list of movies and returning a repository holding them, so a new repository
+    implementation can be benchmarked without changing this module.
+    """
+    if spec in BACKENDS:
+        return BACKENDS[spec]
+    module_name, separator, function_name = spec.partition(':')
+    if separator == '':
+        raise ValueError(f'unknown repository {spec!r}: use one of {", ".join(BACKENDS)} or module:function')
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+# ============================================
+# Cases
+# ============================================
+
+class Fixture:
+    # The inputs shared by the cases: a populated repository, and deterministic samples of its contents.
+
+    def __init__(self, repository: AbstractRepository, movies: List[Movie], seed: int):
+        self.repository = repository
+        self.size = len(movies)
+        rng = random.Random(seed)
+        sample = [movies[rng.randrange(len(movies))] for _ in range(256)]
+        self.ids = [movie.id for movie in sample]
+        self.movies = [repository.get_movie(movie_id) for movie_id in self.ids]
+        self.pages = [[movie.id for movie in movies[start:start + 10]]
+                      for start in (rng.randrange(max(1, len(movies) - 10)) for _ in range(64))]
+        self.years = sorted({movie.release_year for movie in sample})
+        self.actors = [movie.actors[0].actor_full_name for movie in sample if len(movie.actors) > 0]
+        self.directors = [movie.director.director_full_name for movie in sample if movie.director is not None]
+        self.genres = [movie.genres[0].genre_name for movie in sample if len(movie.genres) > 0]
+        self.title_words = [title_words(movie.title)[-1] for movie in sample if len(title_words(movie.title)) > 0]
+        self.queries = [f'genre:"{genre}" year:2010..2014 rating:6..' for genre in self.genres[:16]]
+        self.predicate = Between('rating', 7.0, 8.0) & Between('year', 2010, 2012)
+        self.usernames = [f'bench{i}' for i in range(256)]
+        self.next_movie_id = max(movie.id for movie in movies) + 1
+        self.added = 0
+        self._position = 0
+
+    def pick(self, values: list):
+        # Cycles through values, so each call sees a different but reproducible input.
+        self._position += 1
+        return values[self._position % len(values)]
+
+    def new_movie(self) -> Movie:
+        movie = Movie(f'Benchmark {self.next_movie_id}', 2016)
+        movie.add_id(self.next_movie_id)
+        self.next_movie_id += 1
+        return movie
+
+    def new_user(self) -> User:
+        self.added += 1
+        return User(f'benchmark{self.added}', 'Password1')
+
+
+# Cases reading the repository, by name: each is called with a Fixture.
+QUERY_CASES = {
+    'get_movie': lambda f: f.repository.get_movie(f.pick(f.ids)),
+    'get_movies_by_ids': lambda f: f.repository.get_movies_by_ids(f.pick(f.pages)),
+    'get_movies_by_year': lambda f: f.repository.get_movies_by_year(f.pick(f.years)),
+    'get_movie_ids_matching': lambda f: f.repository.get_movie_ids_matching(f.predicate),
+    'get_number_of_movies': lambda f: f.repository.get_number_of_movies(),
+    'get_first_movie': lambda f: f.repository.get_first_movie(),
+    'get_last_movie': lambda f: f.repository.get_last_movie(),
+    'get_movie_ids_for_actor': lambda f: f.repository.get_movie_ids_for_actor(f.pick(f.actors)),
+    'get_movie_ids_for_director': lambda f: f.repository.get_movie_ids_for_director(f.pick(f.directors)),
+    'get_movie_ids_for_genre': lambda f: f.repository.get_movie_ids_for_genre(f.pick(f.genres)),
+    'get_movie_ids_for_title_word': lambda f: f.repository.get_movie_ids_for_title_word(f.pick(f.title_words)),
+    'get_id_of_previous_movie': lambda f: f.repository.get_id_of_previous_movie(f.pick(f.movies)),
+    'get_id_of_next_movie': lambda f: f.repository.get_id_of_next_movie(f.pick(f.movies)),
+    'get_genres': lambda f: f.repository.get_genres(),
+    'get_director': lambda f: f.repository.get_director(),
+    'get_actors': lambda f: f.repository.get_actors(),
+    'get_user': lambda f: f.repository.get_user(f.pick(f.usernames)),
+    'get_reviews': lambda f: f.repository.get_reviews(),
+}
+
+# Cases converting repository results into the dicts the views render.
+SERVICE_CASES = {
+    'services.get_movie': lambda f: movie_services.get_movie(f.pick(f.ids), f.repository),
+    'services.get_movies_by_ids': lambda f: movie_services.get_movies_by_ids(f.pick(f.pages), f.repository),
+    'services.get_reviews_for_movie': lambda f: movie_services.get_reviews_for_movie(f.ids[0], f.repository),
+    'services.get_random_movies': lambda f: utility_services.get_random_movies(5, f.repository),
+    'services.get_genre_names': lambda f: utility_services.get_genre_names(f.repository),
+    'services.search_exists': lambda f: search_services.search_exists(f.pick(f.genres), 'Genre', f.repository),
+    'services.query_movies': lambda f: search_services.query_movies(f.pick(f.queries), f.repository),
+}
+
+# Cases changing the repository; they run last, so that they don't change what the other cases measure.
+WRITE_CASES = {
+    'add_user': lambda f: f.repository.add_user(f.new_user()),
+    'add_users': lambda f: f.repository.add_users([f.new_user() for _ in range(100)]),
+    'add_review': lambda f: f.repository.add_review(
+        make_review(f.pick(f.movies), 'A benchmark review.', f.repository.get_user(f.pick(f.usernames)))),
+    'add_reviews': lambda f: f.repository.add_reviews(
+        [make_review(f.pick(f.movies), 'A benchmark review.', f.repository.get_user(f.pick(f.usernames)))
+         for _ in range(100)]),
+    'add_to_watchlist': lambda f: f.repository.add_to_watchlist(
+        f.repository.get_user(f.pick(f.usernames)), [f.pick(f.movies) for _ in range(10)]),
+    'remove_from_watchlist': lambda f: f.repository.remove_from_watchlist(
+        f.repository.get_user(f.pick(f.usernames)), [f.pick(f.ids) for _ in range(10)]),
+    'add_watched_movie': lambda f: f.repository.add_watched_movie(
+        f.repository.get_user(f.pick(f.usernames)), f.pick(f.movies)),
+    'add_genre': lambda f: f.repository.add_genre(Genre(f.pick(f.genres))),
+    'add_movie': lambda f: f.repository.add_movie(f.new_movie()),
+    'add_movies': lambda f: f.repository.add_movies([f.new_movie() for _ in range(100)]),
+}
+
+CASES = {**QUERY_CASES, **SERVICE_CASES, **WRITE_CASES}
+
+# Every repository method has a case (checked by the tests), so new methods aren't left unmeasured.
+UNCOVERED_METHODS = sorted(set(REPOSITORY_METHODS) - set(CASES))
+
+
+def time_case(case: Callable[[Fixture], object], fixture: Fixture, min_batch_time: float = MIN_BATCH_TIME,
+              repeats: int = REPEATS) -> dict:
+    """ Returns the best ops/sec and mean seconds per call over repeats batches of calls to case. """
+    batch = 1
+    while True:
+        elapsed = _time_batch(case, fixture, batch)
+        if elapsed >= min_batch_time or batch >= 1 << 20:
+            break
+        batch *= 2 if elapsed == 0 else max(2, min(10, int(min_batch_time / elapsed) + 1))
+
+    best = elapsed
+    for _ in range(repeats - 1):
+        best = min(best, _time_batch(case, fixture, batch))
+    return {
+        'calls': batch,
+        'ops_per_sec': batch / best if best > 0 else float('inf'),
+        'seconds_per_call': best / batch
+    }
+
+
+def _time_batch(case, fixture: Fixture, batch: int) -> float:
+    start = time.perf_counter()
+    for _ in range(batch):
+        case(fixture)
+    return time.perf_counter() - start
+
+
+def measure_build(backend, movies: List[Movie], memory: bool) -> (AbstractRepository, dict):
+    # Builds a repository from movies, timing it and, if memory is set, measuring the memory it allocates (on top
+    # of the movies themselves, which exist before the repository is built).
+    gc.collect()
+    start = time.perf_counter()
+    repository = backend(movies)
+    result = {'seconds': time.perf_counter() - start}
+
+    if memory:
+        # tracemalloc slows allocation down, so memory is measured on a second build which isn't timed.
+        del repository
+        gc.collect()
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        repository = backend(movies)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result['retained_bytes'] = current - baseline
+        result['peak_bytes'] = peak - baseline
+        result['bytes_per_movie'] = (current - baseline) / max(1, len(movies))
+    return repository, result
+
+
+def run(sizes, backend_spec: str = 'memory', seed: int = 0, cases=None, memory: bool = True,
+        min_batch_time: float = MIN_BATCH_TIME, log=print) -> dict:
+    """ Runs the benchmarks, returning results ready to be written as JSON. """
+    backend = resolve_backend(backend_spec)
+    cases = cases or list(CASES)
+    # The real loader, on the sample data file, for reference.
+    start = time.perf_counter()
+    populate(SAMPLE_DATA_PATH, MemoryRepository())
+    results = {
+        'metadata': _metadata(backend_spec, seed),
+        'populate_sample_seconds': time.perf_counter() - start,
+        'results': dict()
+    }
+
+    for size in sizes:
+        log(f'{size} movies: generating')
+        movies = list(synthetic_movies(size, seed))
+        log(f'{size} movies: building repository with {backend_spec}')
+        repository, build = measure_build(backend, movies, memory)
+        size_results = {'populate': build}
+        log(f'  populate: {build["seconds"]:.3f}s' +
+            (f', {build["retained_bytes"] / 1e6:.1f}MB retained' if memory else ''))
+
+        fixture = Fixture(repository, movies, seed)
+        for username in fixture.usernames:
+            repository.add_user(User(username, 'Password1'))
+        del movies
+
+        for name in cases:
+            if name not in CASES:
+                continue
+            try:
+                timing = time_case(CASES[name], fixture, min_batch_time)
+            except (RepositoryException, NotImplementedError) as e:
+                # e.g. read-only backends don't support adding movies.
+                size_results[name] = {'unsupported': type(e).__name__}
+                log(f'  {name}: unsupported')
+                continue
+            size_results[name] = timing
+            log(f'  {name}: {timing["ops_per_sec"]:,.0f} ops/sec')
+
+        results['results'][str(size)] = size_results
+        del fixture, repository
+        gc.collect()
+    return results
+
+
+def compare(old: dict, new: dict, threshold: float = REGRESSION_THRESHOLD) -> List[str]:
+    """ Returns a line per case whose ops/sec (or populate time or memory) changed by more than threshold. """
+    lines = list()
+    for size, new_cases in new['results'].items():
+        old_cases = old['results'].get(size)
+        if old_cases is None:
+            continue
+        for name, new_result in new_cases.items():
+            old_result = old_cases.get(name)
+            if old_result is None:
+                continue
+            for key, higher_is_better in (('ops_per_sec', True), ('seconds', False), ('retained_bytes', False)):
+                if key not in new_result or key not in old_result or old_result[key] == 0:
+                    continue
+                change = new_result[key] / old_result[key] - 1
+                if abs(change) < threshold:
+                    continue
+                worse = change < 0 if higher_is_better else change > 0
+                lines.append(f'{"REGRESSION" if worse else "improvement"} {size} {name} {key}: '
+                             f'{old_result[key]:,.6g} -> {new_result[key]:,.6g} ({change:+.0%})')
+    return lines
+
+
+def _metadata(backend_spec: str, seed: int) -> dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(__file__)).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'repository': backend_spec,
+        'seed': seed,
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': datetime.now().isoformat(timespec='seconds')
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES),
+                        help='comma separated catalogue sizes')
+    parser.add_argument('--repository', default='memory',
+                        help=f'one of {", ".join(BACKENDS)}, or module:function returning a repository of movies')
+    parser.add_argument('--cases', help='comma separated cases to run (default: all)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-memory', action='store_true', help="don't measure memory (halves the build time)")
+    parser.add_argument('--min-batch-time', type=float, default=MIN_BATCH_TIME)
+    parser.add_argument('--output', help='file to write the results to, as JSON')
+    parser.add_argument('--compare', help='results file of an earlier run to compare with')
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    cases = args.cases.split(',') if args.cases else None
+    results = run(sizes, args.repository, args.seed, cases, not args.no_memory, args.min_batch_time,
+                  log=lambda line: print(line, file=sys.stderr))
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+            output.write('\n')
+    else:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        print()
+
+    if args.compare:
+        with open(args.compare) as previous:
+            changes = compare(json.load(previous), results)
+        for line in changes:
+            print(line, file=sys.stderr)
+        if any(line.startswith('REGRESSION') for line in changes):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
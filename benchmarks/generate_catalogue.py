@@ -0,0 +1,68 @@
+"""Generates a synthetic catalogue, and optionally users and reviews, of any size.
+
+    $ python -m benchmarks.generate_catalogue --movies 10000000 --users 100000 --reviews 1000000 --output /tmp/big
+
+The distributions are learned from a sample catalogue (by default the application's Data1000Movies.csv), and the
+output is determined by --seed. Rows are written as they are generated, so memory use doesn't grow with the size.
+The output directory can be used as a data path, e.g. by benchmarks.bench_repository or populate().
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from benchmarks.synthetic import CatalogueModel, write_movies_csv, write_reviews_csv, write_users_csv
+
+
+SAMPLE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'watch_movies', 'adapters', 'data',
+                           'Data1000Movies.csv')
+
+# The file names the application's loaders expect.
+MOVIES_FILE = 'Data1000Movies.csv'
+USERS_FILE = 'users.csv'
+REVIEWS_FILE = 'comments.csv'
+
+
+def generate(output: str, movies: int, users: int = 0, reviews: int = 0, seed: int = 0, sample: str = SAMPLE_PATH,
+             log=print):
+    model = CatalogueModel.learn(sample)
+    os.makedirs(output, exist_ok=True)
+
+    start = time.perf_counter()
+    write_movies_csv(os.path.join(output, MOVIES_FILE), movies, seed, model)
+    log(f'{movies} movies written in {time.perf_counter() - start:.1f}s')
+
+    if users > 0:
+        start = time.perf_counter()
+        write_users_csv(os.path.join(output, USERS_FILE), users, seed)
+        log(f'{users} users written in {time.perf_counter() - start:.1f}s')
+
+    if reviews > 0:
+        if users == 0:
+            raise ValueError('reviews need users to write them')
+        start = time.perf_counter()
+        write_reviews_csv(os.path.join(output, REVIEWS_FILE), reviews, movies, users, seed, model)
+        log(f'{reviews} reviews written in {time.perf_counter() - start:.1f}s')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--movies', type=int, required=True)
+    parser.add_argument('--users', type=int, default=0)
+    parser.add_argument('--reviews', type=int, default=0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--sample', default=SAMPLE_PATH, help='catalogue to learn the distributions from')
+    parser.add_argument('--output', required=True, help='directory to write the files to')
+    args = parser.parse_args(argv)
+
+    try:
+        generate(args.output, args.movies, args.users, args.reviews, args.seed, args.sample,
+                 log=lambda line: print(line, file=sys.stderr))
+    except ValueError as e:
+        parser.error(str(e))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,496 @@
+"""Drives the web application with a mix of requests at a given concurrency, and reports latency per route.
+
+    $ python -m benchmarks.load_test --concurrency 8 --duration 30
+    $ python -m benchmarks.load_test --serve --workers 4 --concurrency 32 --budget movie:p95=50 --budget '*:p99=250'
+    $ python -m benchmarks.load_test --url http://localhost:5000 --replay access.log
+
+Requests go to the application in-process by default (through Flask's test client), to a server started for the
+run with --serve, or to a running server with --url. Each concurrent virtual user registers and logs in first, so
+that it can post reviews. With --replay, the requests of a recorded log are sent instead of the generated mix.
+"""
+
+import argparse
+import csv
+import http.client
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter, namedtuple
+from http.cookies import SimpleCookie
+from typing import Iterator, List
+from urllib.parse import urlencode, urlsplit, quote
+
+
+DEFAULT_DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'watch_movies', 'adapters', 'data')
+
+# Relative frequencies of the routes in the generated mix.
+ROUTE_WEIGHTS = {
+    'home': 15,
+    'browse': 30,
+    'movie': 25,
+    'search': 10,
+    'login': 5,
+    'review': 15
+}
+
+QUANTILES = (0.5, 0.95, 0.99)
+PASSWORD = 'LoadTest1234'
+CSRF_TOKEN_PATTERN = re.compile(rb'name="csrf_token" type="hidden" value="([^"]+)"')
+
+# A request to send: route is the name it is reported under; data is the form posted, if any.
+LoadRequest = namedtuple('LoadRequest', 'route method path data')
+
+
+# ============================================
+# Requests
+# ============================================
+
+class CatalogueSample:
+    # Movie ids and the names of genres, actors and directors to build requests from, read from a data file.
+
+    def __init__(self, data_path: str = DEFAULT_DATA_PATH):
+        self.ids, genres, actors, directors = list(), set(), set(), set()
+        with open(os.path.join(data_path, 'Data1000Movies.csv'), mode='r', encoding='utf-8-sig', newline='') as file:
+            reader = csv.reader(file)
+            next(reader)
+            for row in reader:
+                self.ids.append(int(row[0]))
+                genres.update(genre.strip() for genre in row[2].split(','))
+                actors.update(actor.strip() for actor in row[5].split(','))
+                directors.add(row[4].strip())
+        self.genres = sorted(genres)
+        self.actors = sorted(actors)
+        self.directors = sorted(directors)
+
+
+class RequestMix:
+    """ Generates requests for the routes in weights, in proportion to the weights. """
+
+    def __init__(self, sample: CatalogueSample, weights: dict = None, seed: int = 0):
+        self._sample = sample
+        self._weights = weights or ROUTE_WEIGHTS
+        self._routes = list(self._weights)
+        self._rng = random.Random(seed)
+
+    def __iter__(self) -> Iterator[LoadRequest]:
+        # Not thread-safe: run_load() hands the requests out to its threads.
+        weights = list(self._weights.values())
+        while True:
+            route = self._rng.choices(self._routes, weights)[0]
+            yield self.make_request(route, self._rng)
+
+    def make_request(self, route: str, rng: random.Random, path: str = None) -> LoadRequest:
+        sample = self._sample
+        if route == 'home':
+            return LoadRequest(route, 'GET', path or '/', None)
+        if route == 'movie':
+            return LoadRequest(route, 'GET', path or f'/movies_by_id?id={rng.choice(sample.ids)}', None)
+        if route == 'browse':
+            kind, names = rng.choice((('genre', sample.genres), ('actor', sample.actors),
+                                      ('director', sample.directors)))
+            query = urlencode({kind: rng.choice(names), 'cursor': 3 * rng.randrange(3)})
+            return LoadRequest(route, 'GET', path or f'/movies_by_{kind}?{query}', None)
+        if route == 'search':
+            select, names = rng.choice((('Genre', sample.genres), ('Actor', sample.actors),
+                                        ('Director', sample.directors)))
+            return LoadRequest(route, 'POST', path or '/search', {'search': rng.choice(names), 'select': select})
+        if route == 'login':
+            # The virtual user's credentials are filled in when it sends the request.
+            return LoadRequest(route, 'POST', path or '/authentication/login', {'password': PASSWORD})
+        if route == 'review':
+            movie_id = rng.choice(sample.ids)
+            return LoadRequest(route, 'POST', path or '/review',
+                               {'movie_id': movie_id, 'review': f'Load test review number {rng.randrange(10 ** 6)}'})
+        raise ValueError(f'unknown route {route!r}')
+
+
+def route_of(path: str) -> str:
+    # The name requests to path are reported under, matching the generated mix's route names.
+    route_path = urlsplit(path).path
+    if route_path == '/':
+        return 'home'
+    if route_path == '/movies_by_id':
+        return 'movie'
+    if route_path.startswith('/movies_by_'):
+        return 'browse'
+    if route_path == '/search':
+        return 'search'
+    if route_path == '/authentication/login':
+        return 'login'
+    if route_path == '/review':
+        return 'review'
+    return route_path.strip('/').split('/')[0] or 'home'
+
+
+def read_request_log(path: str, mix: RequestMix, seed: int = 0) -> Iterator[LoadRequest]:
+    """ Yields the requests recorded in path, in order.
+
+    Lines are either access log lines (as written by the development server, gunicorn or nginx), of which the
+    method and path are used, or JSON objects with 'method', 'path' and optionally 'data' keys. Access logs don't
+    record form data, so it is generated for POST requests to the known routes.
+    """
+    access_line = re.compile(r'"(GET|POST|PUT|DELETE|HEAD) (\S+) HTTP/[\d.]+"')
+    rng = random.Random(seed)
+    with open(path, encoding='utf-8') as log:
+        for line in log:
+            line = line.strip()
+            if line == '':
+                continue
+            if line.startswith('{'):
+                record = json.loads(line)
+                method, request_path, data = record['method'].upper(), record['path'], record.get('data')
+            else:
+                match = access_line.search(line)
+                if match is None:
+                    continue
+                method, request_path, data = match.group(1), match.group(2), None
+            route = route_of(request_path)
+            if method == 'POST' and data is None and route in ROUTE_WEIGHTS:
+                data = mix.make_request(route, rng, request_path).data
+            yield LoadRequest(route, method, request_path, data)
+
+
+class SharedIterator:
+    # Hands out the items of an iterator to several threads.
+
+    def __init__(self, iterable):
+        self._iterator = iter(iterable)
+        self._lock = threading.Lock()
+
+    def next(self):
+        with self._lock:
+            return next(self._iterator, None)
+
+
+# ============================================
+# Clients
+# ============================================
+
+class InProcessClient:
+    """ Sends requests to a Flask app through its test client, without a network or server. """
+
+    def __init__(self, app):
+        self._client = app.test_client()
+
+    def request(self, method: str, path: str, data: dict = None) -> (int, bytes):
+        response = self._client.open(path, method=method, data=data)
+        try:
+            return response.status_code, response.get_data()
+        finally:
+            response.close()
+
+
+class HttpClient:
+    """ Sends requests to a server over a persistent HTTP connection, keeping the session cookie. """
+
+    def __init__(self, url: str, timeout: float = 30):
+        parts = urlsplit(url)
+        self._host = parts.hostname
+        self._port = parts.port or 80
+        self._timeout = timeout
+        self._connection = None
+        self._cookies = SimpleCookie()
+
+    def request(self, method: str, path: str, data: dict = None) -> (int, bytes):
+        headers = {}
+        body = None
+        if len(self._cookies) > 0:
+            headers['Cookie'] = '; '.join(f'{name}={morsel.value}' for name, morsel in self._cookies.items())
+        if data is not None:
+            body = urlencode(data)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+
+        for attempt in (1, 2):
+            if self._connection is None:
+                self._connection = http.client.HTTPConnection(self._host, self._port, timeout=self._timeout)
+            try:
+                self._connection.request(method, quote(path, safe='/?=&%+'), body, headers)
+                response = self._connection.getresponse()
+                content = response.read()
+                break
+            except (http.client.HTTPException, ConnectionError):
+                # The server closed the kept-alive connection; retry once on a new one.
+                self._connection.close()
+                self._connection = None
+                if attempt == 2:
+                    raise
+        if response.will_close:
+            self._connection.close()
+            self._connection = None
+        for header in response.headers.get_all('Set-Cookie') or ():
+            self._cookies.load(header)
+        return response.status, content
+
+
+class VirtualUser:
+    # A client logged in as its own user, able to fill in the CSRF token and credentials of the forms it posts.
+
+    def __init__(self, client, username: str):
+        self.client = client
+        self.username = username
+        self._csrf_token = None
+
+    def start(self):
+        self._refresh_csrf_token()
+        self.client.request('POST', '/authentication/register', self._form({'username': self.username,
+                                                                            'password': PASSWORD}))
+        # Registering fails harmlessly when the user exists from an earlier run.
+        self.client.request('POST', '/authentication/login', self._form({'username': self.username,
+                                                                         'password': PASSWORD}))
+        self._refresh_csrf_token()
+
+    def send(self, request: LoadRequest) -> (int, int):
+        data = request.data
+        if data is not None:
+            if request.route == 'login':
+                data = dict(data, username=self.username)
+            data = self._form(data)
+        status, content = self.client.request(request.method, request.path, data)
+        if request.route == 'login' and request.method == 'POST':
+            # Logging in starts a new session, invalidating the CSRF token (outside of the measurement).
+            self._refresh_csrf_token()
+        return status, len(content)
+
+    def _refresh_csrf_token(self):
+        status, content = self.client.request('GET', '/authentication/login')
+        self._csrf_token = _csrf_token(content)
+
+    def _form(self, data: dict) -> dict:
+        if self._csrf_token is not None:
+            return dict(data, csrf_token=self._csrf_token)
+        return data
+
+
+def _csrf_token(content: bytes):
+    match = CSRF_TOKEN_PATTERN.search(content)
+    if match is None:
+        return None
+    return match.group(1).decode()
+
+
+# ============================================
+# Running and reporting
+# ============================================
+
+class LoadResults:
+    """ The latency, status and size of every request sent, by route. Threads record into their own lists. """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._records = list()
+        self.elapsed = 0.0
+
+    def recorder(self) -> list:
+        records = list()
+        with self._lock:
+            self._records.append(records)
+        return records
+
+    def summary(self) -> dict:
+        """ Returns {route: {'requests', 'errors', 'statuses', 'throughput', 'p50', 'p95', 'p99', 'max'}}. """
+        by_route = dict()
+        for records in self._records:
+            for route, seconds, status, size in records:
+                by_route.setdefault(route, list()).append((seconds, status))
+
+        summary = dict()
+        for route, samples in sorted(by_route.items()):
+            latencies = sorted(seconds for seconds, _ in samples)
+            statuses = Counter(str(status) for _, status in samples)
+            route_summary = {
+                'requests': len(samples),
+                'errors': sum(1 for _, status in samples if status is None or status >= 500),
+                'statuses': dict(statuses),
+                'throughput': len(samples) / self.elapsed if self.elapsed > 0 else 0.0,
+                'max': latencies[-1]
+            }
+            for quantile in QUANTILES:
+                route_summary[f'p{int(quantile * 100)}'] = latencies[min(len(latencies) - 1,
+                                                                         int(quantile * len(latencies)))]
+            summary[route] = route_summary
+        return summary
+
+
+def run_load(client_factory, requests, concurrency: int, duration: float = None, limit: int = None,
+             warmup: int = 0) -> LoadResults:
+    """ Sends requests from concurrency virtual users until duration seconds have passed, limit requests have been
+    sent, or requests runs out, whichever comes first. The first warmup requests aren't measured.
+    """
+    results = LoadResults()
+    shared = SharedIterator(requests)
+    sent = Counter()
+    sent_lock = threading.Lock()
+    users = [VirtualUser(client_factory(), f'loadtest{number}') for number in range(concurrency)]
+    for user in users:
+        user.start()
+
+    for _ in range(warmup):
+        request = shared.next()
+        if request is None:
+            break
+        users[0].send(request)
+
+    start = time.perf_counter()
+    deadline = start + duration if duration else None
+
+    def work(user: VirtualUser):
+        records = results.recorder()
+        while deadline is None or time.perf_counter() < deadline:
+            if limit is not None:
+                with sent_lock:
+                    if sent['requests'] >= limit:
+                        return
+                    sent['requests'] += 1
+            request = shared.next()
+            if request is None:
+                return
+            request_start = time.perf_counter()
+            try:
+                status, size = user.send(request)
+            except (OSError, http.client.HTTPException):
+                status, size = None, 0
+            records.append((request.route, time.perf_counter() - request_start, status, size))
+
+    threads = [threading.Thread(target=work, args=(user,), daemon=True) for user in users]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.elapsed = time.perf_counter() - start
+    return results
+
+
+def parse_budget(spec: str) -> (str, str, float):
+    """ Parses 'route:p95=50' (milliseconds) into ('route', 'p95', 0.05). The route '*' applies to all routes. """
+    match = re.fullmatch(r'([^:]+):(p\d+|max)=([\d.]+)(ms|s)?', spec)
+    if match is None:
+        raise ValueError(f'invalid budget {spec!r}, expected e.g. movie:p95=50')
+    route, statistic, value, unit = match.groups()
+    seconds = float(value) if unit == 's' else float(value) / 1000
+    return route, statistic, seconds
+
+
+def check_budgets(summary: dict, budgets: List[tuple]) -> List[str]:
+    """ Returns a message for each route and statistic over its budget. """
+    violations = list()
+    for route, statistic, limit in budgets:
+        routes = summary if route == '*' else ({route: summary[route]} if route in summary else {})
+        for name, route_summary in routes.items():
+            if statistic not in route_summary:
+                raise ValueError(f'unknown statistic {statistic!r}; use one of p50, p95, p99, max')
+            if route_summary[statistic] > limit:
+                violations.append(f'{name} {statistic} {route_summary[statistic] * 1000:.1f}ms exceeds the budget '
+                                  f'of {limit * 1000:.1f}ms')
+    return violations
+
+
+def format_summary(summary: dict) -> str:
+    lines = [f'{"route":<10}{"requests":>10}{"errors":>8}{"req/s":>10}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}'
+             f'{"max ms":>10}']
+    for route, s in summary.items():
+        lines.append(f'{route:<10}{s["requests"]:>10}{s["errors"]:>8}{s["throughput"]:>10.1f}{s["p50"] * 1000:>10.2f}'
+                     f'{s["p95"] * 1000:>10.2f}{s["p99"] * 1000:>10.2f}{s["max"] * 1000:>10.2f}')
+    return '\n'.join(lines)
+
+
+def start_server(port: int, workers: int, threaded: bool = True) -> subprocess.Popen:
+    # Starts the preforked server from the project directory, and waits until it accepts connections.
+    command = [sys.executable, '-m', 'watch_movies.prefork', '--port', str(port), '--workers', str(workers)]
+    if threaded:
+        command.append('--threaded')
+    server = subprocess.Popen(command, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f'the server exited with status {server.returncode}')
+        try:
+            socket.create_connection(('localhost', port), timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError('the server did not start within 120 seconds')
+
+
+def in_process_app(data_path: str):
+    from watch_movies import create_app
+    return create_app({'TEST_DATA_PATH': data_path, 'WTF_CSRF_ENABLED': False})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--url', help='base URL of a running server')
+    target.add_argument('--serve', action='store_true', help='start a preforked server for the run')
+    parser.add_argument('--port', type=int, default=5099, help='port of the server started by --serve')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='worker processes of the server started by --serve (users are held per worker, so '
+                             'with more than one, logins and reviews fail when they reach another worker)')
+    parser.add_argument('--data', default=DEFAULT_DATA_PATH,
+                        help='directory of the catalogue to request movies from (and to serve in-process)')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=10, help='seconds to run for (0 for no limit)')
+    parser.add_argument('--requests', type=int, help='number of requests to send')
+    parser.add_argument('--warmup', type=int, default=20, help='requests to send before measuring')
+    parser.add_argument('--mix', help='route weights, e.g. home=1,movie=3 (default: %s)' %
+                        ','.join(f'{route}={weight}' for route, weight in ROUTE_WEIGHTS.items()))
+    parser.add_argument('--replay', help='request log to replay instead of the generated mix')
+    parser.add_argument('--budget', action='append', default=[],
+                        help='latency budget in ms, e.g. movie:p95=50 or *:p99=250; repeatable')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='file to write the summary to, as JSON')
+    args = parser.parse_args(argv)
+
+    try:
+        budgets = [parse_budget(spec) for spec in args.budget]
+        weights = None
+        if args.mix:
+            weights = {route: float(weight) for route, weight in
+                       (item.split('=') for item in args.mix.split(','))}
+    except ValueError as e:
+        parser.error(str(e))
+
+    mix = RequestMix(CatalogueSample(args.data), weights, args.seed)
+    requests = read_request_log(args.replay, mix, args.seed) if args.replay else mix
+
+    server = None
+    try:
+        if args.serve:
+            server = start_server(args.port, args.workers)
+            url = f'http://localhost:{args.port}'
+        else:
+            url = args.url
+        if url is not None:
+            client_factory = lambda: HttpClient(url)
+        else:
+            app = in_process_app(args.data)
+            client_factory = lambda: InProcessClient(app)
+
+        results = run_load(client_factory, requests, args.concurrency, args.duration or None, args.requests,
+                           args.warmup)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    summary = results.summary()
+    print(format_summary(summary))
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({'elapsed': results.elapsed, 'routes': summary}, output, indent=2, sort_keys=True)
+            output.write('\n')
+
+    violations = check_budgets(summary, budgets)
+    for violation in violations:
+        print(violation, file=sys.stderr)
+    return 1 if violations else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
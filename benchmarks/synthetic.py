@@ -0,0 +1,326 @@
+"""Synthetic movie catalogues of any size, for benchmarking and load testing."""
+
+import csv
+import math
+import random
+import statistics
+from collections import Counter
+from datetime import datetime
+from typing import Iterator
+
+from watch_movies.domain.model import Director, Genre, Movie, Actor
+
+
+# Distributions measured on watch_movies/adapters/data/Data1000Movies.csv; CatalogueModel.learn() measures them on
+# any file in that format.
+GENRE_WEIGHTS = {
+    'Drama': 513, 'Action': 303, 'Comedy': 279, 'Adventure': 259, 'Thriller': 195, 'Crime': 150, 'Romance': 141,
+    'Sci-Fi': 120, 'Horror': 119, 'Mystery': 106, 'Fantasy': 101, 'Biography': 81, 'Family': 51, 'Animation': 49,
+    'History': 29, 'Sport': 18, 'Music': 16, 'War': 13, 'Western': 7, 'Musical': 5
+}
+GENRE_COUNT_WEIGHTS = {1: 105, 2: 235, 3: 660}
+CAST_SIZE_WEIGHTS = {3: 1, 4: 999}
+YEAR_WEIGHTS = {2006: 44, 2007: 53, 2008: 52, 2009: 51, 2010: 60, 2011: 63, 2012: 64, 2013: 91, 2014: 98, 2015: 127,
+                2016: 297}
+
+FIRST_NAMES = ['James', 'Mary', 'Chris', 'Zoe', 'Michael', 'Anna', 'David', 'Emma', 'Tom', 'Olivia', 'Ryan', 'Sofia',
+               'Mark', 'Grace', 'Hugh', 'Ava', 'Brad', 'Lucy', 'Jake', 'Mia', 'Noah', 'Ruby', 'Samuel', 'Isla',
+               'Daniel', 'Chloe', 'Ethan', 'Hannah', 'Leo', 'Nina', 'Oscar', 'Ella']
+LAST_NAMES = ['Smith', 'Pratt', 'Saldana', 'Cooper', 'Fassbender', 'Jackman', 'Bale', 'Pitt', 'Wahlberg', 'Stone',
+              'Reed', 'Hughes', 'Turner', 'Walker', 'Young', 'King', 'Wright', 'Scott', 'Green', 'Baker', 'Adams',
+              'Nelson', 'Carter', 'Mitchell', 'Roberts', 'Phillips', 'Evans', 'Collins', 'Stewart', 'Morris',
+              'Rogers', 'Murphy', 'Cook', 'Bell', 'Bailey', 'Rivera', 'Cooper', 'Howard', 'Ward', 'Torres']
+WORDS = ['a', 'the', 'of', 'and', 'to', 'in', 'his', 'her', 'young', 'man', 'woman', 'family', 'world', 'life',
+         'must', 'find', 'new', 'after', 'two', 'who', 'their', 'story', 'when', 'an', 'team', 'love', 'friends',
+         'secret', 'city', 'war', 'mysterious', 'past', 'home', 'journey', 'save', 'discovers', 'dangerous',
+         'group', 'small', 'town', 'father', 'mother', 'son', 'daughter', 'killer', 'school', 'night', 'future']
+
+MOVIE_HEADER = ['Rank', 'Title', 'Genre', 'Description', 'Director', 'Actors', 'Year', 'Runtime (Minutes)', 'Rating',
+                'Votes', 'Revenue (Millions)', 'Metascore']
+USER_HEADER = ['id', 'username', 'password']
+REVIEW_HEADER = ['id', 'author-id', 'article-id', 'comment-text', 'timestamp']
+
+
+class CatalogueModel:
+    """ Distributions from which synthetic movies are drawn.
+
+    Actor and director popularity follow a Zipf law over pools that grow with the size of the catalogue, as the
+    number of distinct actors (about two per movie) and directors (about 0.65 per movie) does in the sample.
+    Numeric columns are drawn from normal distributions, or log-normal ones for votes and revenue, given as
+    (mean, standard deviation) pairs; missing_revenue and missing_metascore are the fractions of 'N/A' values.
+    """
+
+    def __init__(self, genre_weights=None, genre_count_weights=None, cast_size_weights=None, year_weights=None,
+                 actors_per_movie=1.99, directors_per_movie=0.64, zipf_exponent=0.63, description_words=(28, 9),
+                 runtime=(113, 19), rating=(6.7, 0.95), log_votes=(11.2, 1.8), log_revenue=(3.3, 2.1),
+                 metascore=(59, 17), missing_revenue=0.128, missing_metascore=0.064, first_names=None,
+                 last_names=None, words=None):
+        self.genre_weights = genre_weights or GENRE_WEIGHTS
+        self.genre_count_weights = genre_count_weights or GENRE_COUNT_WEIGHTS
+        self.cast_size_weights = cast_size_weights or CAST_SIZE_WEIGHTS
+        self.year_weights = year_weights or YEAR_WEIGHTS
+        self.actors_per_movie = actors_per_movie
+        self.directors_per_movie = directors_per_movie
+        self.zipf_exponent = zipf_exponent
+        # Mean and standard deviation of the number of words in a description.
+        self.description_words = description_words
+        self.runtime = runtime
+        self.rating = rating
+        self.log_votes = log_votes
+        self.log_revenue = log_revenue
+        self.metascore = metascore
+        self.missing_revenue = missing_revenue
+        self.missing_metascore = missing_metascore
+        self.first_names = first_names or FIRST_NAMES
+        self.last_names = last_names or LAST_NAMES
+        self.words = words or WORDS
+
+    @classmethod
+    def learn(cls, csv_path: str) -> 'CatalogueModel':
+        """ Returns a model of the movies in csv_path, a file in the format of Data1000Movies.csv. """
+        genres, genre_counts, cast_sizes, years = Counter(), Counter(), Counter(), Counter()
+        actors, directors = Counter(), Counter()
+        first_names, last_names, words = Counter(), Counter(), Counter()
+        description_lengths, runtimes, ratings, log_votes, log_revenues, metascores = [], [], [], [], [], []
+        rows = 0
+
+        with open(csv_path, mode='r', encoding='utf-8-sig', newline='') as csv_file:
+            reader = csv.reader(csv_file)
+            next(reader)
+            for row in reader:
+                rows += 1
+                movie_genres = [genre.strip() for genre in row[2].split(',') if genre.strip() != '']
+                genres.update(movie_genres)
+                genre_counts[len(movie_genres)] += 1
+                cast = [actor.strip() for actor in row[5].split(',') if actor.strip() != '']
+                cast_sizes[len(cast)] += 1
+                actors.update(cast)
+                directors[row[4].strip()] += 1
+                for name in cast + [row[4].strip()]:
+                    parts = name.split()
+                    if len(parts) >= 2:
+                        first_names[parts[0]] += 1
+                        last_names[parts[-1]] += 1
+                description = row[3].split()
+                description_lengths.append(len(description))
+                words.update(word.strip('.,;:!?"').lower() for word in description)
+                years[int(row[6])] += 1
+                _append_number(runtimes, row[7], int)
+                _append_number(ratings, row[8], float)
+                _append_number(log_votes, row[9], lambda value: math.log(max(1, int(value))))
+                _append_number(log_revenues, row[10], lambda value: math.log(max(0.01, float(value))))
+                _append_number(metascores, row[11], int)
+
+        if rows == 0:
+            raise ValueError(f'{csv_path} has no movies')
+        words.pop('', None)
+        return cls(genre_weights=dict(genres), genre_count_weights=dict(genre_counts),
+                   cast_size_weights=dict(cast_sizes), year_weights=dict(years),
+                   actors_per_movie=len(actors) / rows, directors_per_movie=len(directors) / rows,
+                   zipf_exponent=zipf_exponent(list(actors.values())),
+                   description_words=_mean_and_deviation(description_lengths), runtime=_mean_and_deviation(runtimes),
+                   rating=_mean_and_deviation(ratings), log_votes=_mean_and_deviation(log_votes),
+                   log_revenue=_mean_and_deviation(log_revenues), metascore=_mean_and_deviation(metascores),
+                   missing_revenue=1 - len(log_revenues) / rows, missing_metascore=1 - len(metascores) / rows,
+                   first_names=sorted(first_names), last_names=sorted(last_names), words=sorted(words))
+
+
+def zipf_exponent(frequencies: list) -> float:
+    """ Fits frequency = c / rank ** exponent to frequencies by least squares on the log-log plot. """
+    frequencies = sorted(frequencies, reverse=True)
+    if len(frequencies) < 2:
+        return 1.0
+    xs = [math.log(rank) for rank in range(1, len(frequencies) + 1)]
+    ys = [math.log(frequency) for frequency in frequencies]
+    x_mean, y_mean = statistics.mean(xs), statistics.mean(ys)
+    slope = (sum((x - x_mean) * (y - y_mean) for x, y in zip(xs, ys)) /
+             sum((x - x_mean) ** 2 for x in xs))
+    return max(0.01, -slope)
+
+
+def _append_number(values: list, field: str, number_type):
+    try:
+        values.append(number_type(field))
+    except ValueError:
+        # 'N/A'.
+        pass
+
+
+def _mean_and_deviation(values: list) -> tuple:
+    if len(values) == 0:
+        return 0, 0
+    return statistics.mean(values), statistics.pstdev(values)
+
+
+def synthetic_movies(count: int, seed: int = 0, model: CatalogueModel = None) -> Iterator[Movie]:
+    """ Yields count movies, with ids 1 to count, drawn deterministically from model using seed. """
+    model = model or CatalogueModel()
+    for row in synthetic_rows(count, seed, model):
+        yield row_to_movie(row)
+
+
+def synthetic_rows(count: int, seed: int = 0, model: CatalogueModel = None) -> Iterator[dict]:
+    """ Yields count movies as plain dicts (cheaper than Movie objects when they are only written out). """
+    model = model or CatalogueModel()
+    rng = random.Random(seed)
+
+    genres = list(model.genre_weights)
+    genre_weights = _cumulative(model.genre_weights.values())
+    genre_counts = list(model.genre_count_weights)
+    genre_count_weights = _cumulative(model.genre_count_weights.values())
+    cast_sizes = list(model.cast_size_weights)
+    cast_size_weights = _cumulative(model.cast_size_weights.values())
+    years = list(model.year_weights)
+    year_weights = _cumulative(model.year_weights.values())
+    actor_pool = max(1, int(count * model.actors_per_movie))
+    director_pool = max(1, int(count * model.directors_per_movie))
+    word_mean, word_deviation = model.description_words
+    words = model.words
+
+    for movie_id in range(1, count + 1):
+        genre_count = rng.choices(genre_counts, cum_weights=genre_count_weights)[0]
+        movie_genres = list()
+        while len(movie_genres) < min(genre_count, len(genres)):
+            genre = rng.choices(genres, cum_weights=genre_weights)[0]
+            if genre not in movie_genres:
+                movie_genres.append(genre)
+
+        cast_size = rng.choices(cast_sizes, cum_weights=cast_size_weights)[0]
+        cast = list()
+        while len(cast) < min(cast_size, actor_pool):
+            actor = person_name(zipf_rank(rng, actor_pool, model.zipf_exponent), model)
+            if actor not in cast:
+                cast.append(actor)
+
+        length = max(3, int(rng.gauss(word_mean, word_deviation)))
+        description = ' '.join(rng.choices(words, k=length)).capitalize() + '.'
+
+        yield {
+            'id': movie_id,
+            'title': title(rng, movie_id, words),
+            'genres': movie_genres,
+            'description': description,
+            'director': person_name(zipf_rank(rng, director_pool, model.zipf_exponent), model, director=True),
+            'actors': cast,
+            'year': rng.choices(years, cum_weights=year_weights)[0],
+            'runtime': max(1, int(rng.gauss(*model.runtime))),
+            'rating': round(min(10.0, max(1.0, rng.gauss(*model.rating))), 1),
+            'votes': max(1, int(math.exp(rng.gauss(*model.log_votes)))),
+            'revenue': (round(math.exp(rng.gauss(*model.log_revenue)), 2)
+                        if rng.random() >= model.missing_revenue else None),
+            'metascore': (min(100, max(0, int(rng.gauss(*model.metascore))))
+                          if rng.random() >= model.missing_metascore else None)
+        }
+
+
+def row_to_movie(row: dict) -> Movie:
+    movie = Movie(row['title'], row['year'])
+    movie.add_id(row['id'])
+    movie.description = row['description']
+    movie.set_director(Director(row['director']))
+    for genre in row['genres']:
+        movie.add_genre(Genre(genre))
+    for actor in row['actors']:
+        movie.add_actor(Actor(actor))
+    movie.runtime_minutes = row['runtime']
+    movie.rating = row['rating']
+    movie.votes = row['votes']
+    movie.revenue_millions = row['revenue']
+    movie.metascore = row['metascore']
+    return movie
+
+
+def zipf_rank(rng: random.Random, population: int, exponent: float) -> int:
+    """ Draws a rank in [1, population] with probability proportional to 1 / rank ** exponent.
+
+    Uses the inverse of the continuous approximation of the distribution's CDF, so it needs no per-rank table and
+    works for populations of any size.
+    """
+    if exponent == 1:
+        rank = population ** rng.random()
+    else:
+        a = 1 - exponent
+        rank = ((population ** a - 1) * rng.random() + 1) ** (1 / a)
+    return min(population, max(1, int(rank)))
+
+
+def person_name(rank: int, model: CatalogueModel = None, director: bool = False) -> str:
+    # A distinct, deterministic name for each rank; directors and actors use separate name spaces.
+    first_names = model.first_names if model is not None else FIRST_NAMES
+    last_names = model.last_names if model is not None else LAST_NAMES
+    first = first_names[rank % len(first_names)]
+    last = last_names[(rank // len(first_names)) % len(last_names)]
+    generation = rank // (len(first_names) * len(last_names))
+    name = f'{first} {"D. " if director else ""}{last}'
+    return name if generation == 0 else f'{name} {generation + 1}'
+
+
+def title(rng: random.Random, movie_id: int, words=WORDS) -> str:
+    # The id makes titles unique, as the repository orders movies by title.
+    return ' '.join(word.capitalize() for word in rng.choices(words, k=rng.randint(1, 4))) + f' {movie_id}'
+
+
+def _cumulative(weights) -> list:
+    total, cumulative = 0, list()
+    for weight in weights:
+        total += weight
+        cumulative.append(total)
+    return cumulative
+
+
+# ============================================
+# Writing catalogues, users and reviews
+# ============================================
+
+def write_movies_csv(path: str, count: int, seed: int = 0, model: CatalogueModel = None) -> int:
+    """ Writes count synthetic movies to path in the format of Data1000Movies.csv, one row at a time. """
+    with open(path, mode='w', encoding='utf-8', newline='') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(MOVIE_HEADER)
+        for row in synthetic_rows(count, seed, model):
+            writer.writerow([
+                row['id'], row['title'], ','.join(row['genres']), row['description'], row['director'],
+                ', '.join(row['actors']), row['year'], row['runtime'], row['rating'], row['votes'],
+                'N/A' if row['revenue'] is None else row['revenue'],
+                'N/A' if row['metascore'] is None else row['metascore']
+            ])
+    return count
+
+
+def write_users_csv(path: str, count: int, seed: int = 0) -> int:
+    """ Writes count users to path in the format of tests/data/users.csv, with passwords the app accepts. """
+    rng = random.Random(seed)
+    alphabet = 'abcdefghijkmnopqrstuvwxyzABCDEFGHJKLMNPQRSTUVWXYZ23456789'
+    with open(path, mode='w', encoding='utf-8', newline='') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(USER_HEADER)
+        for user_id in range(1, count + 1):
+            password = 'Aa1' + ''.join(rng.choice(alphabet) for _ in range(9))
+            writer.writerow([user_id, f'user{user_id}', password])
+    return count
+
+
+def write_reviews_csv(path: str, count: int, movie_count: int, user_count: int, seed: int = 0,
+                      model: CatalogueModel = None, start: float = 1577836800.0) -> int:
+    """ Writes count reviews to path in the format of tests/data/comments.csv, in timestamp order.
+
+    The column named article-id holds the reviewed movie's id. Both the movies reviewed and the users writing
+    reviews follow the model's Zipf law, so a few movies and users account for many of the reviews.
+    """
+    model = model or CatalogueModel()
+    rng = random.Random(seed)
+    timestamp = start
+    with open(path, mode='w', encoding='utf-8', newline='') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(REVIEW_HEADER)
+        for review_id in range(1, count + 1):
+            timestamp += rng.expovariate(1 / 60)
+            text = ' '.join(rng.choices(model.words, k=rng.randint(3, 30))).capitalize() + '.'
+            writer.writerow([
+                review_id,
+                zipf_rank(rng, user_count, model.zipf_exponent),
+                zipf_rank(rng, movie_count, model.zipf_exponent),
+                text,
+                datetime.fromtimestamp(int(timestamp)).strftime('%Y-%m-%d %H:%M:%S')
+            ])
+    return count
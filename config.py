@@ -15,3 +15,55 @@ class Config:
 
     SECRET_KEY = environ.get('SECRET_KEY')
 
+    # Directory holding the journal of users and reviews. Users and reviews are only kept in memory when unset.
+    JOURNAL_PATH = environ.get('JOURNAL_PATH')
+    JOURNAL_COMPACT_AFTER = environ.get('JOURNAL_COMPACT_AFTER')
+
+    # Memory-mapped catalogue file shared by all worker processes. Movies are held in each process when unset.
+    CATALOGUE_PATH = environ.get('CATALOGUE_PATH')
+
+    # Seconds between checks of the data file for changes, which are applied without restarting. Off when unset.
+    CATALOGUE_RELOAD_INTERVAL = environ.get('CATALOGUE_RELOAD_INTERVAL')
+
+    # Directory of files of new movies, added after the data file, and seconds between checks for new files and rows.
+    INGEST_DIRECTORY = environ.get('INGEST_DIRECTORY')
+    INGEST_INTERVAL = environ.get('INGEST_INTERVAL')
+
+    # Count movies by genre, year and director at startup, and as movies change, for /api/analytics. Off by default:
+    # building the counts reads every movie at startup.
+    CATALOGUE_ANALYTICS = environ.get('CATALOGUE_ANALYTICS', 'False') == 'True'
+
+    # Count the reviews of each movie over the last TRENDING_WINDOW_HOURS for the TRENDING_SIZE trending movies.
+    TRENDING_MOVIES = environ.get('TRENDING_MOVIES', 'True') == 'True'
+    TRENDING_WINDOW_HOURS = environ.get('TRENDING_WINDOW_HOURS')
+    TRENDING_SIZE = environ.get('TRENDING_SIZE')
+
+    # Number of the latest reviews kept for /api/reviews.
+    REVIEW_FEED_SIZE = environ.get('REVIEW_FEED_SIZE')
+
+    # Start answering health checks before the catalogue has loaded, loading it in the background.
+    LAZY_STARTUP = environ.get('LAZY_STARTUP', 'False') == 'True'
+
+    # Comma-separated usernames of the users allowed to use the /admin endpoints.
+    ADMIN_USERS = environ.get('ADMIN_USERS')
+
+    # Cache the results of catalogue queries across requests, bounded by number of entries and bytes, and optionally
+    # expiring after a number of seconds. On by default only with CATALOGUE_PATH, whose queries read the mapped file;
+    # the in-memory repository's indexes are read directly.
+    QUERY_CACHE = environ.get('QUERY_CACHE', 'True' if CATALOGUE_PATH else 'False') == 'True'
+    QUERY_CACHE_MAX_ENTRIES = environ.get('QUERY_CACHE_MAX_ENTRIES')
+    QUERY_CACHE_MAX_BYTES = environ.get('QUERY_CACHE_MAX_BYTES')
+    QUERY_CACHE_TTL = environ.get('QUERY_CACHE_TTL')
+
+    # Memoize repository reads for the duration of each request. Off by default.
+    REQUEST_MEMO = environ.get('REQUEST_MEMO', 'False') == 'True'
+
+    # Measure every repository call, per method, and report the measurements through /metrics.
+    REPOSITORY_INSTRUMENTATION = environ.get('REPOSITORY_INSTRUMENTATION', 'False') == 'True'
+
+    # Profile this fraction of requests, and requests slower than PROFILE_SLOW_REQUEST_SECONDS, writing the profiles
+    # to PROFILE_DIRECTORY (keeping the latest PROFILE_KEEP). Profiling is off when neither is set.
+    PROFILE_SAMPLE_RATE = environ.get('PROFILE_SAMPLE_RATE')
+    PROFILE_SLOW_REQUEST_SECONDS = environ.get('PROFILE_SLOW_REQUEST_SECONDS')
+    PROFILE_DIRECTORY = environ.get('PROFILE_DIRECTORY', 'profiles')
+    PROFILE_KEEP = environ.get('PROFILE_KEEP')
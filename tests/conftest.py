@@ -1,4 +1,6 @@
 import os
+import shutil
+
 import pytest
 
 from watch_movies import create_app
@@ -6,8 +8,7 @@ from watch_movies.adapters import memory_repository
 from watch_movies.adapters.memory_repository import MemoryRepository
 
 
-TEST_DATA_PATH = os.path.join('C:', os.sep, 'Users', 'victoria', 'Desktop',
-                              'COMPSCI-235-04_COVID_web_app', 'tests', 'data')
+TEST_DATA_PATH = os.path.join(os.path.dirname(__file__), 'data')
 #TEST_DATA_PATH = os.path.join('C:', os.sep, 'Users', 'iwar006', 'Documents', 'Python dev', 'COVID-19', 'tests', 'data')
 
 
@@ -18,6 +19,22 @@ def in_memory_repo():
     return repo
 
 
+@pytest.fixture
+def memory_repo_factory():
+    # For tests that need several independently populated repositories, e.g. to check what survives a restart.
+    def make_repo():
+        repo = MemoryRepository()
+        memory_repository.populate(TEST_DATA_PATH, repo)
+        return repo
+    return make_repo
+
+
+@pytest.fixture
+def data_copy(tmp_path):
+    # A copy of the test data directory, for tests that change the data files.
+    return shutil.copytree(TEST_DATA_PATH, str(tmp_path / 'data'))
+
+
 @pytest.fixture
 def client():
     my_app = create_app({
@@ -29,6 +46,18 @@ def client():
     return my_app.test_client()
 
 
+@pytest.fixture
+def app_factory():
+    # For tests that need an app configured differently from client's.
+    def make_app(**config):
+        return create_app(dict({
+            'TESTING': True,
+            'TEST_DATA_PATH': TEST_DATA_PATH,
+            'WTF_CSRF_ENABLED': False
+        }, **config))
+    return make_app
+
+
 class AuthenticationManager:
     def __init__(self, client):
         self._client = client
@@ -1,12 +1,21 @@
+import csv
+import gzip
+import io
+import json
+import os
+import re
+
 import pytest
 
 from flask import session
 
+import watch_movies.adapters.repository as repo
+
 from watch_movies.authentication.services import AuthenticationException
 from watch_movies.movie_lib import services as movie_library_services
 from watch_movies.authentication import services as auth_services
 from watch_movies.movie_lib.services import NonExistentMovieException
-from watch_movies.domain.model import Movie, Genre, Director, Actor, Review, User
+from watch_movies.domain.model import Movie, Genre, Director, Actor, Review, User, make_review
 
 
 def test_register(client):
@@ -152,3 +161,297 @@ def test_movies_with_genre(client):
     assert b'Guardians of the Galaxy' in response.data
     assert b'Suicide Squad' in response.data
 """
+
+
+def test_browse_movies(client):
+    response = client.get('/movies_by_id?id=2')
+    assert response.status_code == 200
+    assert b'Prometheus' in response.data
+
+    response = client.get('/movies_by_genre?genre=Action')
+    assert response.status_code == 200
+    assert b'Action Movies' in response.data
+
+
+def test_metrics(client):
+    client.get('/').close()
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert b'http_requests_total{endpoint="home_bp.home",method="GET",status="200"} 1' in response.data
+    assert b'http_request_duration_seconds_count{endpoint="home_bp.home",method="GET"} 1' in response.data
+    assert b'template_render_duration_seconds_count{template="home/home.html"} 1' in response.data
+
+
+def test_health_and_readiness(client):
+    assert client.get('/health').json == {'status': 'ok'}
+
+    response = client.get('/ready')
+    assert response.status_code == 200
+    phases = [phase['phase'] for phase in response.json['phases']]
+    assert 'read data file' in phases and 'build indexes' in phases
+
+
+def test_lazy_startup_serves_once_loaded(app_factory):
+    app = app_factory(LAZY_STARTUP=True)
+    client = app.test_client()
+    assert client.get('/health').status_code == 200
+
+    assert app.extensions['startup'].wait_until_ready(10)
+    assert client.get('/ready').status_code == 200
+    assert client.get('/movies_by_id?id=2').status_code == 200
+
+
+def test_lazy_startup_reports_a_failed_load(app_factory, tmp_path):
+    app = app_factory(LAZY_STARTUP=True, TEST_DATA_PATH=str(tmp_path / 'missing'))
+    client = app.test_client()
+
+    report = app.extensions['startup']
+    assert not report.wait_until_ready(10) and report.error is not None
+    assert client.get('/ready').status_code == 503
+    assert client.get('/movies_by_id?id=2').status_code == 500
+    result = app.test_cli_runner().invoke(args=['memory-report'])
+    assert result.exit_code != 0 and 'Loading the application failed' in result.output
+
+
+def test_memory_report_is_for_admins_only(app_factory):
+    client = app_factory(ADMIN_USERS='Admin').test_client()
+    assert client.get('/admin/memory').status_code == 302
+
+    with client.session_transaction() as session:
+        session['username'] = 'fmercury'
+    assert client.get('/admin/memory').status_code == 403
+
+    # The admin's name can't be registered, and is only trusted once it has an account.
+    with client.session_transaction() as session:
+        session['username'] = 'admin'
+    assert client.get('/admin/memory').status_code == 403
+    with pytest.raises(auth_services.NameNotUniqueException):
+        auth_services.add_user('ADMIN', 'mvNNbc1eLA$i', repo.repo_instance, {'admin'})
+    repo.repo_instance.add_user(User('admin', 'mvNNbc1eLA$i'))
+    response = client.get('/admin/memory?sample=10')
+    assert response.status_code == 200
+    assert response.json['collections']['movies']['items'] > 0
+    assert response.json['tracemalloc'] == {'tracing': False}
+
+
+def test_admin_can_reload_catalogue(app_factory, data_copy):
+    app = app_factory(TEST_DATA_PATH=data_copy, CATALOGUE_RELOAD_INTERVAL='3600', ADMIN_USERS='admin',
+                      WTF_CSRF_ENABLED=True)
+    client = app.test_client()
+    repo.repo_instance.add_user(User('admin', 'mvNNbc1eLA$i'))
+    with client.session_transaction() as session:
+        session['username'] = 'admin'
+
+    with open(os.path.join(data_copy, 'Data1000Movies.csv'), 'a', encoding='utf-8') as data_file:
+        data_file.write('1001,Sequel,Sport,A new movie.,James Gunn,Chris Pratt,2030,100,6.5,10,,\n')
+    assert client.post('/admin/catalogue/reload').status_code == 400
+    token = client.get('/admin/csrf_token').json['csrf_token']
+    response = client.post('/admin/catalogue/reload', data={'csrf_token': token})
+    assert response.json['added'] == 1 and response.json['changed'] == 0 and response.json['removed'] == 0
+    assert b'Sequel' in client.get('/movies_by_id?id=1001').data
+
+
+def test_api_returns_movies_in_batches_with_sparse_fields(client):
+    response = client.get('/api/movies?ids=2,1,2000&fields=id,title,director')
+    assert response.status_code == 200
+    assert response.json == {
+        'movies': [{'id': 2, 'title': 'Prometheus', 'director': 'Ridley Scott'},
+                   {'id': 1, 'title': 'Guardians of the Galaxy', 'director': 'James Gunn'}],
+        'missing': [2000]
+    }
+
+    movie = client.get('/api/movies/1').json
+    assert movie['actors'][0] == 'Chris Pratt' and movie['rating'] == 8.1 and 'reviews' not in movie
+    assert client.get('/api/movies/2000').status_code == 404
+    assert client.get('/api/movies?ids=1&fields=title,budget').status_code == 400
+    assert client.get('/api/movies?ids=' + ','.join(map(str, range(1, 200)))).status_code == 400
+
+
+def test_api_browses_movies_by_entity_and_lists_reviews(client):
+    first = client.get('/api/actors/Chris Pratt/movies?limit=2&fields=id').json
+    assert first['total'] > 2 and len(first['movies']) == 2 and first['next_cursor'] == 2
+    second = client.get(f'/api/actors/Chris Pratt/movies?limit=2&fields=id&cursor={first["next_cursor"]}').json
+    assert first['movies'][1]['id'] < second['movies'][0]['id']
+    assert client.get('/api/genres/Sport/movies?fields=genres').json['movies'][0]['genres'].count('Sport') == 1
+    assert client.get('/api/directors/James Gunn/movies?limit=0').status_code == 400
+
+    assert client.get('/api/movies/1/reviews').json == {'movie_id': 1, 'total': 0, 'reviews': [],
+                                                        'next_cursor': None}
+    repo.repo_instance.add_user(User('fmercury', 'mvNNbc1eLA$i'))
+    movie_library_services.add_review(1, 'Great!', 'fmercury', repo.repo_instance)
+    [review] = client.get('/api/movies/1/reviews').json['reviews']
+    assert review['username'] == 'fmercury' and review['review_text'] == 'Great!'
+    assert client.get('/api/movies/1?fields=reviews').json['reviews'] == [review]
+
+
+def test_exports_stream_a_consistent_snapshot(client):
+    repo.repo_instance.add_user(User('fmercury', 'mvNNbc1eLA$i'))
+    movie_library_services.add_review(1, 'Great!', 'fmercury', repo.repo_instance)
+
+    response = client.get('/api/export/movies', buffered=False)
+    movies = [json.loads(line) for line in response.get_data().splitlines()]
+    assert len(movies) == 1000 and movies[0]['title'] == repo.repo_instance.get_first_movie().title
+
+    response = client.get('/api/export/reviews?format=csv', headers={'Accept-Encoding': 'gzip'}, buffered=False)
+    assert response.headers['Content-Encoding'] == 'gzip'
+    chunks = response.iter_encoded()
+    first = next(chunks)
+    # Reviews added once the export has started aren't part of it.
+    movie_library_services.add_review(2, 'Later', 'fmercury', repo.repo_instance)
+    rows = list(csv.reader(io.StringIO(gzip.decompress(first + b''.join(chunks)).decode('utf-8'))))
+    assert rows[0] == ['username', 'movie_id', 'review_text', 'timestamp']
+    assert [row[:3] for row in rows[1:]] == [['fmercury', '1', 'Great!']]
+    response.close()
+
+    assert client.get('/api/export/users').status_code == 400
+
+
+def test_movies_ingested_without_names_are_rejected(app_factory, tmp_path):
+    (tmp_path / 'daily.jsonl').write_text(json.dumps({'Rank': 2001, 'Title': 'No Genre', 'Year': 2020}) + '\n')
+    client = app_factory(INGEST_DIRECTORY=str(tmp_path)).test_client()
+    assert client.get('/api/movies?ids=2001').json['missing'] == [2001]
+
+    response = client.get('/api/export/movies?format=csv')
+    assert response.status_code == 200
+    assert len(list(csv.reader(io.StringIO(response.get_data(as_text=True))))) == 1001
+
+
+def test_export_command_writes_gzipped_file(app_factory, tmp_path):
+    output = tmp_path / 'movies.ndjson.gz'
+    result = app_factory().test_cli_runner().invoke(args=['export', 'movies', '--output', str(output)])
+    assert result.exit_code == 0, result.output
+    assert len(gzip.decompress(output.read_bytes()).splitlines()) == 1000
+
+
+def test_bulk_import_is_kept_by_the_journal(app_factory, data_copy, tmp_path):
+    journal_path = str(tmp_path / 'journal')
+    result = app_factory(JOURNAL_PATH=journal_path).test_cli_runner().invoke(args=[
+        'bulk-import', '--users', os.path.join(data_copy, 'users.csv'),
+        '--reviews', os.path.join(data_copy, 'comments.csv'), '--processes', '1'])
+    assert result.exit_code == 0, result.output
+    assert 'users: 2 imported' in result.output and 'reviews: 2 imported' in result.output
+    repo.repo_instance.journal.close()
+
+    app_factory(JOURNAL_PATH=journal_path)
+    assert [review.review_text for review in repo.repo_instance.get_movie(1).reviews] == [
+        'Oh no, COVID-19 has hit New Zealand', 'Yeah Freddie, bad news']
+
+
+def test_repository_reads_are_memoized_per_request(app_factory):
+    app = app_factory()
+    app.debug = True
+    assert 'X-Repository-Memo' not in app.test_client().get('/movies_by_id?id=2').headers
+
+    app = app_factory(REQUEST_MEMO=True)
+    app.debug = True
+    client = app.test_client()
+    assert client.get('/movies_by_id?id=2').headers['X-Repository-Memo'] == 'hits=0, misses=10'
+    assert 'repository_memo_misses_total 10' in client.get('/metrics').get_data(as_text=True)
+
+
+def test_query_search(client):
+    response = client.post('/search', data={'select': 'Query', 'search': 'actor:"Chris Pratt" galaxy'})
+    assert response.headers['Location'].endswith('/search/query?q=actor:%22Chris+Pratt%22+galaxy')
+
+    assert client.get('/search/query?q=genre:Action&cursor=abc').status_code == 200
+    assert client.get('/search/query?q=genre:Action&cursor=-3').status_code == 200
+    response = client.get('/search/query?q=genre:Action year:2014 rating:8..')
+    assert b'Guardians of the Galaxy' in response.data
+
+    plan = client.get('/search/query?q=actor:"Chris Pratt" galaxy&explain=1').json
+    assert plan['results'] == 1
+    assert [step['operation'] for step in plan['steps']] == ['lookup', 'lookup', 'intersect']
+
+    assert client.get('/search/query?q=description:space&explain=1').status_code == 400
+    response = client.get('/search/query?q=studio:Marvel')
+    assert response.headers['Location'].endswith('/search')
+
+
+def test_api_analytics(app_factory):
+    assert app_factory().test_client().get('/api/analytics?by=genre').status_code == 404
+    client = app_factory(CATALOGUE_ANALYTICS=True).test_client()
+    response = client.get('/api/analytics?by=genre,year&genre=Action&sort=year')
+    assert response.status_code == 200
+    assert response.json['rows'][0] == {'genre': 'Action', 'year': 2006, 'movies': 11, 'rating': 6.88,
+                                        'revenue_millions': 1664.01}
+
+    top = client.get('/api/analytics?by=director&sort=movies&limit=2').json['rows']
+    assert [row['director'] for row in top] == ['Ridley Scott', 'Michael Bay']
+
+    assert client.get('/api/analytics?by=studio').status_code == 400
+    assert client.get('/api/analytics?by=year&year=recent').status_code == 400
+
+
+def test_trending_movies(client):
+    assert client.get('/api/trending').json['movies'] == []
+
+    user = User('fmercury', 'mvNNbc1eLA$i')
+    repo.repo_instance.add_user(user)
+    repo.repo_instance.add_review(make_review(repo.repo_instance.get_movie(2), 'Nice movie', user))
+    response = client.get('/api/trending?fields=id,title')
+    assert response.json['movies'] == [{'id': 2, 'title': 'Prometheus', 'recent_reviews': 1}]
+    assert b'Trending now' in client.get('/').data
+
+    assert client.get('/api/trending?limit=1000').status_code == 400
+
+
+def test_api_pages_recent_reviews_and_user_histories(client):
+    user = User('fmercury', 'mvNNbc1eLA$i')
+    repo.repo_instance.add_user(user)
+    for movie_id in (1, 2, 3):
+        repo.repo_instance.add_review(make_review(repo.repo_instance.get_movie(movie_id), 'Nice movie', user))
+
+    first = client.get('/api/reviews?limit=2').json
+    assert [review['movie_id'] for review in first['reviews']] == [3, 2]
+    second = client.get(f'/api/reviews?limit=2&cursor={first["next_cursor"]}').json
+    assert [review['movie_id'] for review in second['reviews']] == [1]
+
+    history = client.get('/api/users/FMercury/reviews').json
+    assert history['username'] == 'fmercury' and len(history['reviews']) == 3
+    assert history['next_cursor'] is None
+
+    assert client.get('/api/users/nobody/reviews').status_code == 404
+    assert client.get('/api/reviews?cursor=yesterday').status_code == 400
+    assert client.get('/api/reviews?cursor=2026-10-19T12:00:00%2B00:00_1').status_code == 400
+
+
+def test_watchlist_and_watch_history(client):
+    user = User('fmercury', 'mvNNbc1eLA$i')
+    repo.repo_instance.add_user(user)
+    with client.session_transaction() as client_session:
+        client_session['username'] = user.username
+
+    assert client.get('/watchlist/add?movie=1').status_code == 405
+    response = client.post('/watchlist/add', data={'movie': [1, 2, 9999]}, headers={'Referer': 'https://evil.example/'})
+    assert response.status_code == 302 and response.headers['Location'].endswith('/watchlist')
+    assert [movie.id for movie in user.watchlist] == [1, 2]
+    page = client.get('/movies_by_genre?genre=Action').get_data(as_text=True)
+    assert 'action="/watchlist/remove"' in page and '+ My List' in page
+    response = client.post('/watchlist/remove', data={'movie': 1}, headers={'Referer': '/movies_by_genre?genre=Action'})
+    assert response.headers['Location'].endswith('/movies_by_genre?genre=Action')
+    assert b'Your watchlist (1 movies)' in client.get('/watchlist').data
+
+    client.post('/watch', data={'movie': 2})
+    client.post('/watch', data={'movie': 2})
+    history = client.get('/watch_history').get_data(as_text=True)
+    assert 'Watched (1 movies)' in history and '1 movies watched 2 times, for' in history
+    assert client.post('/watch', data={'movie': 9999}).status_code == 404
+
+    with client.session_transaction() as client_session:
+        client_session.clear()
+    assert client.get('/watchlist').status_code == 302
+
+
+def test_watchlist_forms_require_a_csrf_token(app_factory):
+    client = app_factory(WTF_CSRF_ENABLED=True).test_client()
+    repo.repo_instance.add_user(User('fmercury', 'mvNNbc1eLA$i'))
+    with client.session_transaction() as client_session:
+        client_session['username'] = 'fmercury'
+
+    assert client.post('/watchlist/add', data={'movie': 1}).status_code == 400
+    page = client.get('/movies_by_genre?genre=Action').get_data(as_text=True)
+    token = re.search(r'name="csrf_token" value="([^"]+)"', page).group(1)
+    assert client.post('/watchlist/add', data={'movie': 1, 'csrf_token': token}).status_code == 302
+    assert repo.repo_instance.get_user('fmercury').is_in_watchlist(1)
+
@@ -0,0 +1,58 @@
+from benchmarks.bench_repository import UNCOVERED_METHODS, compare, run
+from benchmarks.generate_catalogue import generate
+from benchmarks.load_test import (DEFAULT_DATA_PATH, CatalogueSample, InProcessClient, RequestMix, check_budgets,
+                                  in_process_app, parse_budget, read_request_log, run_load)
+from benchmarks.synthetic import CatalogueModel, synthetic_movies
+from watch_movies.adapters.memory_repository import MemoryRepository, populate
+
+
+def test_synthetic_movies_are_reproducible():
+    first = [(movie.id, movie.title, movie.director, movie.actors) for movie in synthetic_movies(50, seed=7)]
+    second = [(movie.id, movie.title, movie.director, movie.actors) for movie in synthetic_movies(50, seed=7)]
+    assert first == second
+    assert [movie_id for movie_id, _, _, _ in first] == list(range(1, 51))
+
+
+def test_benchmark_covers_every_repository_method():
+    assert UNCOVERED_METHODS == []
+
+    results = run([200], 'memory', memory=False, min_batch_time=0.001, log=lambda line: None)
+    cases = results['results']['200']
+    assert cases['get_movie']['ops_per_sec'] > 0
+    assert 'seconds' in cases['populate']
+
+    slower = {'metadata': {}, 'results': {'200': {'get_movie': {'ops_per_sec': cases['get_movie']['ops_per_sec'] / 2}}}}
+    assert compare(results, slower)[0].startswith('REGRESSION 200 get_movie')
+
+
+def test_generated_catalogue_loads_and_is_reproducible(tmp_path):
+    generate(str(tmp_path / 'first'), 300, users=20, reviews=100, seed=3, log=lambda line: None)
+    generate(str(tmp_path / 'second'), 300, users=20, reviews=100, seed=3, log=lambda line: None)
+    for name in ('Data1000Movies.csv', 'users.csv', 'comments.csv'):
+        assert (tmp_path / 'first' / name).read_bytes() == (tmp_path / 'second' / name).read_bytes()
+
+    repo = MemoryRepository()
+    populate(str(tmp_path / 'first'), repo)
+    assert repo.get_number_of_movies() == 300
+
+    model = CatalogueModel.learn(str(tmp_path / 'first' / 'Data1000Movies.csv'))
+    assert max(model.genre_weights, key=model.genre_weights.get) == 'Drama'
+
+
+def test_load_test_reports_latency_per_route_and_checks_budgets(tmp_path):
+    app = in_process_app(DEFAULT_DATA_PATH)
+    mix = RequestMix(CatalogueSample(DEFAULT_DATA_PATH), {'home': 1, 'movie': 1, 'review': 1})
+    results = run_load(lambda: InProcessClient(app), mix, concurrency=2, limit=30)
+    summary = results.summary()
+    assert sum(route['requests'] for route in summary.values()) == 30
+    assert all(route['errors'] == 0 for route in summary.values())
+    assert summary['review']['statuses'] == {'302': summary['review']['requests']}
+
+    assert check_budgets(summary, [parse_budget('*:p99=60s')]) == []
+    assert check_budgets(summary, [parse_budget('home:max=0')])[0].startswith('home max')
+
+    log = tmp_path / 'access.log'
+    log.write_text('127.0.0.1 - - [19/Oct/2020 10:00:00] "GET /movies_by_id?id=3 HTTP/1.1" 200 -\n'
+                   '{"method": "POST", "path": "/search", "data": {"search": "Drama", "select": "Genre"}}\n')
+    assert [(request.route, request.method) for request in read_request_log(str(log), mix)] == \
+        [('movie', 'GET'), ('search', 'POST')]
@@ -0,0 +1,49 @@
+import os
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from watch_movies.adapters.bulk_import import PasswordHasher, import_reviews, import_users
+
+
+def test_import_users_and_reviews(in_memory_repo, data_copy):
+    users_path = os.path.join(data_copy, 'users.csv')
+    with open(users_path, 'a') as users_file:
+        users_file.write(f'\n3,prehashed,{generate_password_hash("Secret123")}\n')
+        users_file.write('4,thorke,duplicate\n')
+
+    with PasswordHasher(processes=2) as hasher:
+        report, usernames = import_users(users_path, in_memory_repo, hasher, batch_size=2)
+    assert (report.imported, report.skipped, report.hashed) == (3, 1, 2)
+    assert check_password_hash(in_memory_repo.get_user('fmercury').password, 'mvNNbc1eLA$i')
+    assert check_password_hash(in_memory_repo.get_user('prehashed').password, 'Secret123')
+
+    report = import_reviews(os.path.join(data_copy, 'comments.csv'), in_memory_repo, usernames)
+    assert (report.imported, report.skipped) == (2, 0)
+    movie = in_memory_repo.get_movie(1)
+    assert [review.user.username for review in movie.reviews] == ['fmercury', 'thorke']
+    assert in_memory_repo.get_user('thorke').reviews == [movie.reviews[1]]
+    assert len(in_memory_repo.get_reviews()) == 2
+
+    # Importing again changes nothing.
+    report = import_reviews(os.path.join(data_copy, 'comments.csv'), in_memory_repo, usernames)
+    assert (report.imported, report.skipped) == (0, 2)
+
+
+def test_import_normalises_usernames_and_skips_repeated_rows(in_memory_repo, data_copy):
+    users_path = os.path.join(data_copy, 'users.csv')
+    with open(users_path, 'a') as users_file:
+        users_file.write('\n3, Freya ,Secret123\n')
+        users_file.write('4,FMercury,duplicate\n')
+    comments_path = os.path.join(data_copy, 'comments.csv')
+    with open(comments_path, 'a') as comments_file:
+        comments_file.write('3,3,1,Great film,2020-03-01 10:00:00\n')
+        comments_file.write('4,3,1,Great film,2020-03-01 10:00:00\n')
+
+    with PasswordHasher(processes=1) as hasher:
+        report, usernames = import_users(users_path, in_memory_repo, hasher)
+    assert (report.imported, report.skipped) == (3, 1)
+    assert usernames['3'] == 'freya' and usernames['4'] == 'fmercury'
+
+    report = import_reviews(comments_path, in_memory_repo, usernames)
+    assert (report.imported, report.skipped) == (3, 1)
+    assert in_memory_repo.get_user('freya').reviews[0].review_text == 'Great film'
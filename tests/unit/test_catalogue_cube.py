@@ -0,0 +1,45 @@
+import pytest
+
+from watch_movies.adapters.catalogue_cube import CatalogueCube, CatalogueCubeException
+from watch_movies.domain.model import Director, Genre, Movie
+
+
+def test_cube_counts_the_catalogue_by_every_combination_of_dimensions(in_memory_repo):
+    cube = CatalogueCube()
+    in_memory_repo.add_observer(cube)
+
+    assert cube.query([]) == [{'movies': 1000, 'rating': 6.72, 'revenue_millions': 72337.96}]
+    genres = cube.query(['genre'])
+    assert sum(row['movies'] for row in genres) == sum(len(in_memory_repo.get_movie_ids_for_genre(row['genre']))
+                                                      for row in genres)
+    assert cube.query(['director'], sort='movies', limit=1)[0]['director'] == 'Ridley Scott'
+
+    action_by_year = cube.query(['year'], {'genre': 'Action'}, sort='year')
+    assert [row['year'] for row in action_by_year] == list(range(2006, 2017))
+    assert sum(row['movies'] for row in action_by_year) == len(in_memory_repo.get_movie_ids_for_genre('Action'))
+
+    with pytest.raises(CatalogueCubeException):
+        cube.query(['studio'])
+
+
+def test_cube_follows_added_changed_and_removed_movies(in_memory_repo):
+    cube = CatalogueCube()
+    in_memory_repo.add_observer(cube)
+    james_gunn = cube.query(['director'], {'director': 'James Gunn'})[0]['movies']
+
+    movie = Movie('Sequel', 2030)
+    movie.add_id(1001)
+    movie.add_genre(Genre('Sport'))
+    movie.set_director(Director('James Gunn'))
+    movie.rating = 9.0
+    in_memory_repo.add_movie(movie)
+    assert cube.query(['genre', 'year'], {'director': 'James Gunn'}, sort='year')[-1] == {
+        'genre': 'Sport', 'year': 2030, 'movies': 1, 'rating': 9.0, 'revenue_millions': None}
+
+    changed = Movie('Sequel', 2031)
+    changed.add_id(1001)
+    changed.add_genre(Genre('Sport'))
+    in_memory_repo.update_movies(changed=[changed], removed_ids=[1])
+    assert cube.query(['year'], {'genre': 'Sport'}, sort='year')[-1]['year'] == 2031
+    assert [row['movies'] for row in cube.query(['director'], {'director': 'James Gunn'})] == [james_gunn - 1]
+    assert cube.query([])[0]['movies'] == 1000
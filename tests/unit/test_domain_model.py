@@ -94,3 +94,30 @@ def test_make_reviews_establishes_relationships(movie, user):
 
     # Check that the review knows about the movie.
     assert review.movie is movie
+
+
+def test_user_watchlist_and_watch_history(movie, user):
+    movie.add_id(1)
+    other = Movie('Frozen', 2013)
+    other.add_id(2)
+    other.runtime_minutes = 102
+
+    assert user.add_to_watchlist(movie) and user.add_to_watchlist(other)
+    assert not user.add_to_watchlist(movie)
+    assert user.watchlist == [movie, other] and user.is_in_watchlist(2)
+    assert user.remove_from_watchlist(1) and not user.remove_from_watchlist(1)
+    assert not user.is_in_watchlist(1)
+
+    # A movie without a runtime is still watched.
+    user.watch_movie(movie)
+    user.watch_movie(other)
+    user.watch_movie(movie)
+    assert user.watched_movies == [other, movie]
+    assert user.times_watched(1) == 2 and user.has_watched(2)
+    assert user.time_spent_watching_movies_minutes == 102
+
+    other.add_genre(Genre('Animation'))
+    user.watch_movie(other, 2)
+    assert user.watch_history_page(0, 1) == [other] and user.watch_history_page(1, 5) == [movie]
+    assert user.number_of_watched_movies == 2 and user.total_times_watched == 5
+    assert user.top_genres(3) == ['Animation'] and user.watchlist_page(0, 5) == [other]
@@ -0,0 +1,41 @@
+import json
+
+from watch_movies.adapters.ingest import Ingester
+from watch_movies.adapters.movie_columns import Equals
+
+HEADER = 'Rank,Title,Genre,Description,Director,Actors,Year,Runtime (Minutes),Rating,Votes,Revenue (Millions),' \
+         'Metascore\n'
+
+
+def test_ingest_reads_only_new_rows_and_skips_invalid_ones(in_memory_repo, tmp_path):
+    ingester = Ingester(in_memory_repo, str(tmp_path))
+    feed = tmp_path / 'feed.csv'
+    feed.write_text(HEADER +
+                    '1001,Sequel,"Action,Sport",A new movie.,James Gunn,"Chris Pratt, Newcomer",2030,100,6.5,10,,\n'
+                    '1,Duplicate,Action,,Someone,Someone,2030,,,,,\n'
+                    '1002,Too Old,Action,,Someone,Someone,1850,,,,,\n'
+                    '1005,No Names,,,,,2030,,,,,\n'
+                    '1003,Partial,Action')
+    report = ingester.run()
+    assert report.added == 1 and report.files == {'feed.csv': 1}
+    assert [(rejection['line'], rejection['reason']) for rejection in report.rejections] == [
+        (3, 'There is already a movie with id 1'), (4, 'Year 1850 is before 1900'),
+        (5, 'Missing Genre, Director, Actors')]
+    assert in_memory_repo.get_movie_ids_for_actor('Newcomer') == [1001]
+    assert in_memory_repo.get_movie_ids_matching(Equals('year', 2030)) == [1001]
+
+    # The partial line is read once it is complete; nothing before it is read again.
+    with open(feed, 'a') as feed_file:
+        feed_file.write(',,Someone,Someone,2031,,,,,\n')
+    (tmp_path / 'daily.jsonl').write_text(json.dumps({
+        'Rank': 1004, 'Title': 'Streamed', 'Genre': ['Drama'], 'Actors': ['Newcomer'], 'Director': 'Someone',
+        'Year': 2031, 'Rating': 7.5}) + '\n{not json\n')
+    report = ingester.run()
+    assert report.added == 2 and report.files == {'feed.csv': 1, 'daily.jsonl': 1}
+    assert report.rejections[0]['line'] == 2 and report.rejections[0]['reason'].startswith('Invalid JSON')
+    assert in_memory_repo.get_movie_ids_for_actor('Newcomer') == [1001, 1004]
+    assert in_memory_repo.get_movie(1003).title == 'Partial'
+    assert in_memory_repo.get_number_of_movies() == 1003
+    assert ingester.manifest.as_dict()['feed.csv']['lines'] == 6
+
+    assert ingester.run().added == 0
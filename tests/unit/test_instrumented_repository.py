@@ -0,0 +1,37 @@
+from watch_movies.adapters.instrumented_repository import InstrumentedRepository
+from watch_movies.adapters.repository import AbstractRepository
+
+
+def test_instrumented_repository_forwards_calls(in_memory_repo):
+    repo = InstrumentedRepository(in_memory_repo)
+
+    assert isinstance(repo, AbstractRepository)
+    assert repo.get_movie(1) is in_memory_repo.get_movie(1)
+    assert repo.get_movie_ids_for_actor('Chris Pratt') == in_memory_repo.get_movie_ids_for_actor('Chris Pratt')
+    # Attributes beyond the repository interface come from the wrapped repository.
+    assert repo.snapshot is in_memory_repo.snapshot
+
+
+def test_instrumented_repository_records_calls_and_result_sizes(in_memory_repo):
+    repo = InstrumentedRepository(in_memory_repo)
+    repo.get_movie(1)
+    repo.get_movie(2)
+    repo.get_movies_by_ids([2, 5, 6])
+
+    summary = repo.summary()
+    assert summary['get_movie']['calls'] == 2
+    assert summary['get_movies_by_ids']['result_size'][0.5] == 3
+    assert 'get_user' not in summary
+
+
+def test_instrumented_repository_tallies_calls_per_request(in_memory_repo):
+    repo = InstrumentedRepository(in_memory_repo)
+    repo.get_movie(1)
+
+    repo.begin_request()
+    repo.get_movie(2)
+    repo.get_user('thorke')
+    calls = repo.end_request()
+
+    assert calls['get_movie'][0] == 1
+    assert calls['get_user'][0] == 1
@@ -0,0 +1,110 @@
+import os
+
+import pytest
+
+from watch_movies.adapters.journal import Journal, JournalException
+from watch_movies.adapters.memory_repository import load_journal
+from watch_movies.domain.model import User, make_review
+
+
+@pytest.fixture
+def new_repo(memory_repo_factory):
+    def make_journaled_repo(journal_path, compact_after=10000):
+        repo = memory_repo_factory()
+        journal = Journal(journal_path, compact_after)
+        load_journal(journal, repo)
+        return repo, journal
+    return make_journaled_repo
+
+
+def add_user_and_review(repo):
+    user = User('fmercury', 'abcd1A23')
+    repo.add_user(user)
+    review = make_review(repo.get_movie(2), 'Love it!!', user)
+    repo.add_review(review)
+    return review
+
+
+def test_journal_restores_users_and_reviews(new_repo, tmp_path):
+    repo, journal = new_repo(str(tmp_path))
+    review = add_user_and_review(repo)
+    journal.close()
+
+    restored, journal = new_repo(str(tmp_path))
+    journal.close()
+
+    assert restored.get_user('fmercury').password == 'abcd1A23'
+    assert len(restored.get_reviews()) == 1
+    restored_review = restored.get_reviews()[0]
+    assert restored_review.review_text == 'Love it!!'
+    assert restored_review.timestamp == review.timestamp
+    assert restored_review in restored.get_movie(2).reviews
+    assert restored_review in restored.get_user('fmercury').reviews
+
+
+def test_journal_reports_failed_writes(new_repo, tmp_path, monkeypatch):
+    repo, journal = new_repo(str(tmp_path))
+
+    def disk_full(fd):
+        raise OSError(28, 'No space left on device')
+    monkeypatch.setattr(os, 'fsync', disk_full)
+
+    repo.add_user(User('fmercury', 'abcd1A23'))
+    with pytest.raises(JournalException):
+        journal.flush()
+    assert isinstance(journal.error, OSError)
+    with pytest.raises(JournalException):
+        repo.add_user(User('gmichael', 'abcd1A23'))
+    journal.close()
+
+
+def test_journal_ignores_torn_final_record(new_repo, tmp_path):
+    repo, journal = new_repo(str(tmp_path))
+    add_user_and_review(repo)
+    journal.close()
+
+    with open(os.path.join(str(tmp_path), Journal.LOG_FILE), 'ab') as log:
+        log.write(b'0000abcd {"type":"us')
+
+    restored, journal = new_repo(str(tmp_path))
+    restored.add_user(User('gmichael', 'abcd1A23'))
+    journal.close()
+
+    restored, journal = new_repo(str(tmp_path))
+    journal.close()
+    assert restored.get_user('gmichael') is not None
+    assert len(restored.get_reviews()) == 1
+
+
+def test_journal_compaction_does_not_duplicate_state(new_repo, tmp_path):
+    repo, journal = new_repo(str(tmp_path), compact_after=2)
+    add_user_and_review(repo)
+    repo.add_user(User('gmichael', 'abcd1A23'))
+    journal.flush()
+    journal.close()
+
+    assert os.path.exists(os.path.join(str(tmp_path), Journal.SNAPSHOT_FILE))
+
+    restored, journal = new_repo(str(tmp_path))
+    journal.close()
+    assert restored.get_user('gmichael') is not None
+    assert len(restored.get_reviews()) == 1
+
+
+def test_journal_restores_watchlists_and_watch_history(new_repo, tmp_path):
+    repo, journal = new_repo(str(tmp_path), compact_after=5)
+    user = User('fmercury', 'abcd1A23')
+    repo.add_user(user)
+    repo.add_to_watchlist(user, repo.get_movies_by_ids([1, 2, 3]))
+    repo.remove_from_watchlist(user, [2])
+    for movie_id in (4, 5, 4):
+        repo.add_watched_movie(user, repo.get_movie(movie_id))
+    journal.close()
+
+    restored, journal = new_repo(str(tmp_path))
+    journal.close()
+    restored_user = restored.get_user('fmercury')
+    assert [movie.id for movie in restored_user.watchlist] == [1, 3]
+    assert [movie.id for movie in restored_user.watched_movies] == [5, 4]
+    assert restored_user.times_watched(4) == 2
+    assert restored_user.time_spent_watching_movies_minutes == user.time_spent_watching_movies_minutes
@@ -0,0 +1,58 @@
+import sys
+
+from watch_movies.adapters.sizing import deep_size
+from watch_movies.domain.model import Movie, User, make_review
+from watch_movies.monitoring.memory import AllocationTracker, estimate_collection, list_lengths, repository_memory_report
+
+
+def test_deep_size_counts_shared_objects_once_and_stops_at_entities():
+    name = 'x' * 1000
+    assert deep_size([name, name]) == sys.getsizeof([name, name]) + sys.getsizeof(name)
+
+    movie = Movie('Up', 2009)
+    assert deep_size([movie]) == sys.getsizeof([movie])
+    assert deep_size(movie) > sys.getsizeof(movie)
+
+
+def test_sampled_estimate_is_close_to_exact_size():
+    items = [{'title': 'title %d' % i, 'votes': i} for i in range(5000)]
+    exact = estimate_collection(items, sample_size=len(items))
+    sampled = estimate_collection(items, sample_size=500)
+    assert not exact['sampled'] and sampled['sampled']
+    assert abs(sampled['bytes'] - exact['bytes']) < exact['bytes'] * 0.05
+
+
+def test_list_lengths_measures_a_sample():
+    lists = [[0] * (i % 10) for i in range(5000)]
+    exact = list_lengths(lists, len, sample_size=len(lists))
+    sampled = list_lengths(lists, len, sample_size=500)
+    assert not exact['sampled'] and exact['total'] == sum(map(len, lists)) and exact['max'] == 9
+    assert sampled['sampled'] and sampled['objects'] == 5000 and abs(sampled['mean'] - 4.5) < 0.5
+
+
+def test_report_covers_collections_and_growing_lists(in_memory_repo):
+    user = User('fmercury', 'mvNNbc1eLA$i')
+    in_memory_repo.add_user(user)
+    for movie_id in (1, 1, 2):
+        in_memory_repo.add_review(make_review(in_memory_repo.get_movie(movie_id), 'Good', user))
+
+    report = repository_memory_report(in_memory_repo, sample_size=100)
+    collections = report['collections']
+    assert collections['movies']['items'] == in_memory_repo.get_number_of_movies()
+    assert collections['movies']['sampled']
+    assert collections['users']['items'] == 1 and collections['reviews']['items'] == 3
+    assert all(collections[name]['bytes'] > 0 for name in ('movies', 'movies_index', 'genre_ids', 'columns'))
+    assert report['lists']['user_reviews'] == {'objects': 1, 'total': 3, 'mean': 3, 'max': 3, 'sampled': False}
+    assert report['lists']['movie_reviews']['objects'] == in_memory_repo.get_number_of_movies()
+
+
+def test_allocation_tracker_reports_growth():
+    tracker = AllocationTracker()
+    tracker.start()
+    try:
+        retained = ['%08d' % i for i in range(20000)]
+        top = tracker.diff(5)
+        assert top[0]['size_diff'] > 0 and __file__ in top[0]['location']
+        assert retained
+    finally:
+        tracker.stop()
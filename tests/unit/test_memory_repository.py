@@ -1,7 +1,13 @@
+import os
+
 import pytest
 
 from watch_movies.domain.model import User, Director, Genre, Movie, Actor, Review, User, make_review
+from watch_movies.adapters.catalogue_reloader import CatalogueReloader
+from watch_movies.adapters.memory_repository import MemoryRepository, read_movies
+from watch_movies.adapters.movie_columns import Between, Equals
 from watch_movies.adapters.repository import RepositoryException
+from watch_movies.adapters.shared_catalogue import SharedCatalogue, SharedCatalogueRepository, write_catalogue
 
 
 def test_repository_can_add_a_user(in_memory_repo):
@@ -96,36 +102,30 @@ def test_repository_returns_an_empty_list_for_non_existent_ids(in_memory_repo):
 
     assert len(movies) == 0
 
-"""
 def test_repository_returns_movie_ids_for_existing_actor(in_memory_repo):
     movie_ids = in_memory_repo.get_movie_ids_for_actor('Chris Pratt')
 
     assert movie_ids == [1, 10, 39, 86, 385, 407, 697]
-"""
 
 def test_repository_returns_an_empty_list_for_non_existent_actor(in_memory_repo):
     movie_ids = in_memory_repo.get_movie_ids_for_actor('United States')
 
     assert len(movie_ids) == 0
 
-"""
 def test_repository_returns_movie_ids_for_existing_director(in_memory_repo):
     movie_ids = in_memory_repo.get_movie_ids_for_director('Adam McKay')
 
     assert movie_ids == [143, 361, 470, 936]
-"""
 
 def test_repository_returns_an_empty_list_for_non_existent_director(in_memory_repo):
     movie_ids = in_memory_repo.get_movie_ids_for_director('United States')
 
     assert len(movie_ids) == 0
 
-"""
 def test_repository_returns_movie_ids_for_existing_genre(in_memory_repo):
     movie_ids = in_memory_repo.get_movie_ids_for_genre('Sport')
 
     assert movie_ids == [195, 311, 338, 368, 378, 382, 494, 549, 575, 585, 587, 594, 597, 831, 850, 897, 936, 975]
-"""
 
 def test_repository_returns_an_empty_list_for_non_existent_genre(in_memory_repo):
     movie_ids = in_memory_repo.get_movie_ids_for_genre('United States')
@@ -217,3 +217,177 @@ def test_repository_can_retrieve_comments(in_memory_repo):
     review = make_review(movie, "Love it!!",user)
     in_memory_repo.add_review(review)
     assert len(in_memory_repo.get_reviews()) == 1
+
+
+def test_repository_snapshot_is_not_affected_by_later_writes(in_memory_repo):
+    snapshot = in_memory_repo.snapshot
+    movie = Movie("TXXT", 2020)
+    movie.add_id(1001)
+    movie.add_actor(Actor("Chris Pratt"))
+    in_memory_repo.add_movie(movie)
+
+    assert len(snapshot.movies) == 1000
+    assert 1001 not in snapshot.actor_ids['Chris Pratt']
+    assert in_memory_repo.version > snapshot.version
+    assert in_memory_repo.get_number_of_movies() == 1001
+    assert in_memory_repo.get_movie_ids_for_actor('Chris Pratt')[-1] == 1001
+
+
+def test_repository_snapshot_does_not_see_later_reviews(in_memory_repo):
+    user = User('thorke', 'abcd1A23')
+    in_memory_repo.add_user(user)
+    snapshot = in_memory_repo.snapshot
+    in_memory_repo.add_review(make_review(in_memory_repo.get_movie(2), "Love it!!", user))
+
+    assert len(in_memory_repo.get_reviews_in(snapshot)) == 0
+    assert len(in_memory_repo.get_reviews()) == 1
+
+
+def test_shared_catalogue_repository_matches_memory_repository(in_memory_repo, tmp_path):
+    path = str(tmp_path / 'catalogue.bin')
+    write_catalogue(list(in_memory_repo.snapshot.movies), path)
+    catalogue = SharedCatalogue(path)
+    shared_repo = SharedCatalogueRepository(catalogue)
+
+    assert shared_repo.get_number_of_movies() == 1000
+    assert shared_repo.get_movie_ids_for_actor('Chris Pratt') == in_memory_repo.get_movie_ids_for_actor('Chris Pratt')
+    assert shared_repo.get_movie_ids_for_genre('Sport') == in_memory_repo.get_movie_ids_for_genre('Sport')
+    assert shared_repo.get_movie_ids_for_title_word('The') == in_memory_repo.get_movie_ids_for_title_word('The')
+    assert shared_repo.get_movie_ids_for_director('United States') == []
+    assert shared_repo.get_first_movie() == in_memory_repo.get_first_movie()
+    assert list(shared_repo.iter_movies_in(shared_repo.snapshot)) == list(in_memory_repo.snapshot.movies)
+
+    movie = shared_repo.get_movie(1)
+    assert movie.title == "Guardians of the Galaxy"
+    assert movie.actors == [Actor("Chris Pratt"), Actor("Vin Diesel"), Actor("Bradley Cooper"), Actor("Zoe Saldana")]
+    assert movie.director == Director("James Gunn")
+    assert shared_repo.get_movie(1) is movie
+    assert shared_repo.get_movie(1008) is None
+
+    catalogue.close()
+
+
+def test_shared_catalogue_evicts_unreviewed_movies_only(in_memory_repo, tmp_path):
+    path = str(tmp_path / 'catalogue.bin')
+    write_catalogue(list(in_memory_repo.snapshot.movies), path)
+    catalogue = SharedCatalogue(path, cache_size=2)
+    shared_repo = SharedCatalogueRepository(catalogue)
+
+    reviewed = shared_repo.get_movie(1)
+    shared_repo.add_review(make_review(reviewed, "Love it!!", User('fmercury', '8734gfe2058v')))
+    first = shared_repo.get_movie(2)
+    for movie_id in range(3, 10):
+        shared_repo.get_movie(movie_id)
+
+    assert len(catalogue.materialized_movies()) == 3
+    assert shared_repo.get_movie(1) is reviewed and len(reviewed.reviews) == 1
+    assert shared_repo.get_movie(2) is not first and shared_repo.get_movie(2) == first
+
+    # A review of an object evicted since it was read moves to the object kept for the movie.
+    user = User('gmichael', '8734gfe2058v')
+    current = shared_repo.get_movie(2)
+    shared_repo.add_review(make_review(current, "Great", user))
+    stale_review = make_review(first, "Good", user)
+    shared_repo.add_review(stale_review)
+    assert shared_repo.get_movie(2) is current and stale_review.movie is current
+    assert [review.review_text for review in current.reviews] == ["Great", "Good"] and first.reviews == []
+
+    catalogue.close()
+
+
+def test_repository_returns_movie_ids_matching_predicate(in_memory_repo):
+    movie_ids = in_memory_repo.get_movie_ids_matching(Equals('year', 2014) & Between('rating', 8.1))
+
+    assert 1 in movie_ids
+    for movie in in_memory_repo.get_movies_by_ids(movie_ids):
+        assert movie.release_year == 2014 and movie.rating >= 8.1
+
+
+def test_repository_predicate_does_not_match_missing_values(in_memory_repo):
+    with_revenue = in_memory_repo.get_movie_ids_matching(Between('revenue', 0))
+    without_revenue = in_memory_repo.get_movie_ids_matching(~Between('revenue', 0))
+
+    assert len(with_revenue) + len(without_revenue) == 1000
+    assert len(without_revenue) == 128
+
+
+def test_repository_restricts_predicate_to_given_ids(in_memory_repo):
+    drama_ids = in_memory_repo.get_movie_ids_for_genre('Drama')
+    movie_ids = in_memory_repo.get_movie_ids_matching(Between('rating', 8), drama_ids)
+
+    assert movie_ids == [movie_id for movie_id in in_memory_repo.get_movie_ids_matching(Between('rating', 8))
+                         if movie_id in drama_ids]
+
+
+def test_repository_predicate_skips_given_ids_of_removed_movies(in_memory_repo):
+    # E.g. a query's posting lists read before a reload removed one of their movies.
+    drama_ids = in_memory_repo.get_movie_ids_for_genre('Drama')
+    in_memory_repo.update_movies(removed_ids=[drama_ids[0]])
+
+    movie_ids = in_memory_repo.get_movie_ids_matching(Between('rating', 0), drama_ids + [5000])
+    assert movie_ids == [movie_id for movie_id in drama_ids[1:] if in_memory_repo.get_movie(movie_id).rating >= 0]
+
+
+def test_repository_returns_movie_ids_for_title_word(in_memory_repo):
+    assert in_memory_repo.get_movie_ids_for_title_word('Galaxy') == [1]
+    assert 1 in in_memory_repo.get_movie_ids_for_title_word('the')
+    assert in_memory_repo.get_movie_ids_for_title_word('Gal') == []
+
+
+def test_reloader_applies_only_changed_rows_and_keeps_reviews(data_copy):
+    path = os.path.join(data_copy, 'Data1000Movies.csv')
+    lines = open(path, encoding='utf-8-sig').read().splitlines()
+    repo = MemoryRepository()
+    repo.add_movies(read_movies(data_copy))
+    reloader = CatalogueReloader(repo, path)
+    assert reloader.check() is None
+
+    user = User('fmercury', '8734gfe2058v')
+    review = make_review(repo.get_movie(1), "Love it!!", user)
+    repo.add_review(review)
+    before = repo.snapshot
+
+    lines[1] = lines[1].replace('Guardians of the Galaxy', 'Guardians of the Galaxy Redux').replace(',8.1,', ',9.5,')
+    del lines[2]
+    lines.append('1001,Sequel,Sport,A new movie.,James Gunn,"Chris Pratt, Newcomer",2030,100,6.5,10,,')
+    with open(path, 'w', encoding='utf-8') as data_file:
+        data_file.write('\n'.join(lines) + '\n')
+
+    diff = reloader.check(force=True)
+    assert [movie.id for movie in diff.changed] == [1]
+    assert diff.removed_ids == [2] and [movie.id for movie in diff.added] == [1001]
+
+    movie = repo.get_movie(1)
+    assert movie.title == 'Guardians of the Galaxy Redux' and movie.reviews == [review]
+    assert review.movie is movie
+    assert repo.get_movie(2) is None
+    assert repo.get_number_of_movies() == 1000
+    assert repo.get_movie_ids_for_actor('Newcomer') == [1001]
+    assert repo.get_movie_ids_for_title_word('redux') == [1] and repo.get_movie_ids_for_title_word('sequel') == [1001]
+    assert 2 not in repo.get_movie_ids_for_actor('Noomi Rapace')
+    assert repo.get_movie_ids_matching(Between('rating', 9.4)) == [1]
+    assert repo.get_movie_ids_matching(Equals('year', 2030)) == [1001]
+    assert repo.movie_index(movie) == list(repo.snapshot.movies).index(movie)
+
+    # Readers of the previous version still see it.
+    assert before.movies_index[1].title == 'Guardians of the Galaxy' and 2 in before.movies_index
+    assert before.columns.select(Between('rating', 9.4)) == []
+
+
+def test_reloader_skips_rows_whose_ids_are_already_used(data_copy):
+    path = os.path.join(data_copy, 'Data1000Movies.csv')
+    repo = MemoryRepository()
+    repo.add_movies(read_movies(data_copy))
+    reloader = CatalogueReloader(repo, path)
+    ingested = Movie('Ingested', 2030)
+    ingested.add_id(1001)
+    repo.add_movies([ingested])
+
+    with open(path, 'a', encoding='utf-8') as data_file:
+        data_file.write('1001,Sequel,Sport,A new movie.,James Gunn,"Chris Pratt, Newcomer",2030,100,6.5,10,,\n'
+                        '1002,Another,Sport,A new movie.,James Gunn,Newcomer,2030,100,6.5,10,,\n')
+
+    for _ in range(2):
+        diff = reloader.check(force=True)
+        assert diff.conflicting_ids == [1001]
+        assert repo.get_movie(1001) is ingested and repo.get_movie(1002).title == 'Another'
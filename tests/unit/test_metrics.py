@@ -0,0 +1,14 @@
+import threading
+
+from watch_movies.monitoring.metrics import MetricsRegistry
+
+
+def test_shards_of_finished_threads_are_retired_without_scraping():
+    registry = MetricsRegistry()
+    for _ in range(50):
+        thread = threading.Thread(target=registry.increment, args=('requests_total',))
+        thread.start()
+        thread.join()
+
+    assert len(registry._shards) <= 1
+    assert registry.collect().counters[('requests_total', ())] == 50
@@ -0,0 +1,53 @@
+import json
+import os
+import pstats
+import time
+
+from watch_movies.monitoring.profiling import ProfilingMiddleware
+
+
+def slow_app(environ, start_response):
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    deadline = time.perf_counter() + float(environ.get('QUERY_STRING') or 0)
+    while time.perf_counter() < deadline:
+        pass
+    return [b'done']
+
+
+def call(app, query=''):
+    body = app({'REQUEST_METHOD': 'GET', 'PATH_INFO': '/slow', 'QUERY_STRING': query}, lambda status, headers, exc_info=None: None)
+    content = b''.join(body)
+    body.close()
+    return content
+
+
+def profiles(directory):
+    return [json.load(open(os.path.join(directory, name))) for name in sorted(os.listdir(directory))
+            if name.endswith('.json')]
+
+
+def test_only_slow_requests_are_captured(tmp_path):
+    app = ProfilingMiddleware(slow_app, str(tmp_path), sample_rate=0.0, slow_seconds=0.05)
+    assert call(app) == b'done'
+    assert profiles(tmp_path) == []
+
+    call(app, '0.2')
+    [profile] = profiles(tmp_path)
+    assert profile['reason'] == 'slow'
+    assert profile['duration'] >= 0.2
+    assert profile['response_size'] == 4
+    assert profile['samples'] > 0
+    stacks = (tmp_path / profile['files'][1]).read_text()
+    assert 'test_profiling:slow_app' in stacks
+
+
+def test_sampled_requests_are_profiled_and_rotated(tmp_path):
+    app = ProfilingMiddleware(slow_app, str(tmp_path), sample_rate=1.0, keep=2)
+    for _ in range(3):
+        call(app, '0.01')
+
+    captured = profiles(tmp_path)
+    assert len(captured) == 2
+    assert captured[0]['reason'] == 'sampled'
+    stats = pstats.Stats(str(tmp_path / captured[0]['files'][1]))
+    assert any(function[2] == 'slow_app' for function in stats.stats)
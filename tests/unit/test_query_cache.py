@@ -0,0 +1,82 @@
+import threading
+
+from watch_movies.adapters.movie_columns import Between
+from watch_movies.adapters.query_cache import QueryCache, QueryCacheRepository
+from watch_movies.domain.model import Actor, Movie, User, make_review
+
+
+def test_catalogue_queries_are_cached_until_the_catalogue_changes(in_memory_repo):
+    cache = QueryCache()
+    repo = QueryCacheRepository(in_memory_repo, cache)
+
+    ids = repo.get_movie_ids_for_actor('Chris Pratt')
+    ids.append(-1)
+    assert repo.get_movie_ids_for_actor('Chris Pratt') == in_memory_repo.get_movie_ids_for_actor('Chris Pratt')
+    assert repo.get_movie_ids_matching(Between('rating', 9)) == repo.get_movie_ids_matching(Between('rating', 9))
+    assert repo.get_movie_ids_matching(Between('rating', 8)) != repo.get_movie_ids_matching(Between('rating', 9))
+    assert (cache.hits, cache.misses) == (3, 3)
+
+    # Users and reviews don't change the catalogue.
+    user = User('fmercury', 'mvNNbc1eLA$i')
+    repo.add_user(user)
+    repo.add_review(make_review(repo.get_movie(1), 'Great!', user))
+    repo.get_movie_ids_for_actor('Chris Pratt')
+    assert cache.hits == 4
+
+    movie = Movie('Passengers 2', 2026)
+    movie.add_id(5000)
+    movie.add_actor(Actor('Chris Pratt'))
+    repo.add_movie(movie)
+    assert repo.get_movie_ids_for_actor('Chris Pratt')[-1] == 5000
+    assert cache.misses == 4
+
+
+def test_least_recently_used_results_are_evicted():
+    cache = QueryCache(max_entries=2)
+    for key in ('a', 'b', 'a', 'c'):
+        cache.get_or_compute(key, 0, lambda: [key])
+    assert cache.evictions == 1
+    assert cache.get_or_compute('a', 0, lambda: None) == ['a']
+    assert cache.get_or_compute('b', 0, lambda: None) is None
+
+    small = QueryCache(max_bytes=1000)
+    small.get_or_compute('large', 0, lambda: list(range(1000)))
+    assert small.entries == 0
+    small.get_or_compute('a', 0, lambda: list(range(10)))
+    assert 0 < small.bytes <= 1000
+
+
+def test_results_expire_after_the_ttl():
+    now = [0.0]
+    cache = QueryCache(ttl=10, clock=lambda: now[0])
+    cache.get_or_compute('a', 0, lambda: 1)
+    now[0] = 9
+    assert cache.get_or_compute('a', 0, lambda: 2) == 1
+    now[0] = 11
+    assert cache.get_or_compute('a', 0, lambda: 2) == 2
+
+
+def test_concurrent_misses_compute_once():
+    cache = QueryCache()
+    started, release = threading.Event(), threading.Event()
+    calls, results = list(), list()
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait()
+        return [42]
+
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute('a', 0, compute)))
+               for _ in range(8)]
+    threads[0].start()
+    started.wait()
+    for thread in threads[1:]:
+        thread.start()
+    while cache.coalesced < 7:
+        pass
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert results == [[42]] * 8
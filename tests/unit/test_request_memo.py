@@ -0,0 +1,28 @@
+from watch_movies.adapters.movie_columns import Between
+from watch_movies.adapters.request_memo import RequestMemo, RequestMemoRepository
+from watch_movies.domain.model import User, make_review
+
+
+def test_reads_are_memoized_until_a_write(in_memory_repo):
+    memo = RequestMemo()
+    repo = RequestMemoRepository(in_memory_repo, lambda: memo)
+
+    ids = repo.get_movie_ids_for_actor('Chris Pratt')
+    ids.append(-1)
+    assert repo.get_movie_ids_for_actor('Chris Pratt') == in_memory_repo.get_movie_ids_for_actor('Chris Pratt')
+    assert repo.get_movie(1) is repo.get_movie(1)
+    assert (memo.hits, memo.misses) == (2, 2)
+
+    # Arguments that aren't values are only the same argument when they are the same object.
+    assert repo.get_movie_ids_matching(Between('rating', 9)) != repo.get_movie_ids_matching(Between('rating', 8))
+
+    user = User('fmercury', 'mvNNbc1eLA$i')
+    repo.add_user(user)
+    assert repo.get_user('fmercury') is user
+    repo.add_review(make_review(repo.get_movie(1), 'Great!', user))
+    assert len(repo.get_reviews()) == 1
+
+
+def test_calls_outside_requests_are_not_memoized(in_memory_repo):
+    repo = RequestMemoRepository(in_memory_repo, lambda: None)
+    assert repo.get_movie_ids_for_genre('Sport') == in_memory_repo.get_movie_ids_for_genre('Sport')
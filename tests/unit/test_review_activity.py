@@ -0,0 +1,48 @@
+from datetime import datetime
+
+from watch_movies.adapters.review_activity import ReviewActivity
+from watch_movies.domain.model import User, make_review
+
+
+def test_feed_keeps_the_latest_reviews_in_timestamp_order(in_memory_repo):
+    activity = ReviewActivity(feed_size=3)
+    in_memory_repo.add_observer(activity)
+    user = User('fmercury', 'mvNNbc1eLA$i')
+    in_memory_repo.add_user(user)
+
+    def review(minute):
+        movie = in_memory_repo.get_movie(minute + 1)
+        return make_review(movie, f'Minute {minute}', user, datetime(2026, 10, 19, 12, minute))
+
+    for minute in (1, 2, 4, 5):
+        in_memory_repo.add_review(review(minute))
+    # Replayed out of order: inserted in its place, or dropped when older than the whole feed.
+    in_memory_repo.add_reviews([review(3), review(0)])
+
+    reviews, cursor = activity.recent_reviews(None, 2)
+    assert [review.review_text for review in reviews] == ['Minute 5', 'Minute 4']
+    reviews, cursor = activity.recent_reviews(cursor, 2)
+    assert [review.review_text for review in reviews] == ['Minute 3']
+    assert cursor is None
+
+
+def test_user_history_pages_are_stable_as_reviews_arrive(in_memory_repo):
+    activity = ReviewActivity()
+    in_memory_repo.add_observer(activity)
+    user, other = User('fmercury', 'mvNNbc1eLA$i'), User('thorke', 'cLQ^C#oFXloS')
+    for u in (user, other):
+        in_memory_repo.add_user(u)
+    same_time = datetime(2026, 10, 19, 12)
+    in_memory_repo.add_reviews([make_review(in_memory_repo.get_movie(movie_id), str(movie_id), user, same_time)
+                                for movie_id in range(1, 6)])
+    in_memory_repo.add_review(make_review(in_memory_repo.get_movie(6), '6', other, same_time))
+
+    reviews, cursor = activity.user_reviews('fmercury', None, 2)
+    assert [review.review_text for review in reviews] == ['5', '4']
+    in_memory_repo.add_review(make_review(in_memory_repo.get_movie(7), '7', user))
+    pages = list()
+    while cursor is not None:
+        reviews, cursor = activity.user_reviews('fmercury', cursor, 2)
+        pages.append([review.review_text for review in reviews])
+    assert pages == [['3', '2'], ['1']]
+    assert activity.user_reviews('nobody', None, 2) == ([], None)
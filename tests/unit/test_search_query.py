@@ -0,0 +1,50 @@
+import pytest
+
+from watch_movies.search.query import QueryException, parse_query, run_query
+
+
+def test_parse_query():
+    terms = parse_query('actor:"Chris Pratt" genre:Action year:2010..2016 -genre:Horror "galaxy" rating:8..')
+    assert [repr(term) for term in terms] == ['actor:"Chris Pratt"', 'genre:Action', 'year:2010..2016',
+                                              '-genre:Horror', 'title:"galaxy"', 'rating:8..']
+    assert terms[2].value == (2010, 2016)
+    assert terms[3].negated
+
+    for query in ('', 'actor:"Chris Pratt', 'studio:Marvel', 'year:recent', 'rating:..'):
+        with pytest.raises(QueryException):
+            parse_query(query)
+
+
+def test_query_intersects_posting_lists_from_the_shortest(in_memory_repo):
+    result = run_query(parse_query('actor:"Chris Pratt" genre:action year:2010..2016 -genre:Horror "galaxy"'),
+                       in_memory_repo)
+    assert result.movie_ids == [1]
+    lookups = [step.rows for step in result.steps if step.operation == 'lookup']
+    assert len(lookups) == 3
+    intersections = [step.detail for step in result.steps if step.operation == 'intersect']
+    assert intersections[0] == '1 with 7 ids'
+    # Only one movie is left to check the year of.
+    assert [step.operation for step in result.steps][-2:] == ['check', 'exclude']
+
+
+def test_query_stops_at_an_empty_posting_list(in_memory_repo):
+    result = run_query(parse_query('director:Nobody genre:Drama rating:5..'), in_memory_repo)
+    assert result.movie_ids == []
+    assert [step.operation for step in result.steps] == ['lookup']
+
+
+def test_query_filters_columns_and_checks_text_last(in_memory_repo):
+    result = run_query(parse_query('genre:Drama description:war rating:7..'), in_memory_repo)
+    assert [step.operation for step in result.steps] == ['lookup', 'filter', 'text']
+    assert len(result.movie_ids) > 0
+    for movie in in_memory_repo.get_movies_by_ids(result.movie_ids):
+        assert 'war' in movie.description.lower() and movie.rating >= 7
+
+    phrase = run_query(parse_query('"guardians of the galaxy"'), in_memory_repo)
+    assert phrase.movie_ids == [1]
+    assert run_query(parse_query('"galaxy the of guardians"'), in_memory_repo).movie_ids == []
+
+
+def test_query_needs_an_indexed_term(in_memory_repo):
+    with pytest.raises(QueryException):
+        run_query(parse_query('description:space -genre:Horror'), in_memory_repo)
@@ -0,0 +1,43 @@
+from datetime import datetime
+
+from watch_movies.adapters.trending import TrendingMovies
+from watch_movies.domain.model import User, make_review
+
+
+def test_trending_movies_are_the_most_reviewed_over_the_window(in_memory_repo):
+    now = [datetime(2026, 10, 19, 12).timestamp()]
+    trending = TrendingMovies(window_hours=3, size=2, clock=lambda: now[0])
+    in_memory_repo.add_observer(trending)
+    user = User('fmercury', 'mvNNbc1eLA$i')
+    in_memory_repo.add_user(user)
+
+    def review(movie_id, hour):
+        movie = in_memory_repo.get_movie(movie_id)
+        return make_review(movie, 'Seen it', user, datetime(2026, 10, 19, hour, 30))
+
+    in_memory_repo.add_reviews([review(1, 10), review(1, 10), review(2, 11), review(3, 12), review(3, 12)])
+    # Older than the window.
+    in_memory_repo.add_review(review(4, 8))
+    in_memory_repo.add_review(review(4, 8))
+    in_memory_repo.add_review(review(4, 8))
+    assert trending.top() == [(1, 2), (3, 2)]
+    in_memory_repo.add_review(review(2, 12))
+    in_memory_repo.add_review(review(2, 12))
+    assert trending.top() == [(2, 3), (1, 2)]
+    assert trending.top(1) == [(2, 3)]
+
+    # The reviews of 10:30 leave the window at 13:00.
+    now[0] = datetime(2026, 10, 19, 13, 5).timestamp()
+    assert trending.top() == [(2, 3), (3, 2)]
+    now[0] = datetime(2026, 10, 20).timestamp()
+    assert trending.top() == []
+
+
+def test_observer_counts_the_reviews_already_added(in_memory_repo):
+    user = User('fmercury', 'mvNNbc1eLA$i')
+    in_memory_repo.add_user(user)
+    in_memory_repo.add_review(make_review(in_memory_repo.get_movie(5), 'Seen it', user))
+
+    trending = TrendingMovies()
+    in_memory_repo.add_observer(trending)
+    assert trending.top() == [(5, 1)]
@@ -1,15 +1,39 @@
 """Initialize Flask app."""
 
+import time
+
+_import_start = time.perf_counter()
+
+import atexit
+import json
 import os
 
+import click
 from flask import Flask
+from flask_wtf.csrf import generate_csrf
 
 import watch_movies.adapters.repository as repo
-from watch_movies.adapters.memory_repository import MemoryRepository, populate
+from watch_movies.adapters.bulk_import import BATCH_SIZE, PasswordHasher, import_reviews, import_users
+from watch_movies.adapters.catalogue_cube import CatalogueCube
+from watch_movies.adapters.catalogue_reloader import CatalogueReloader
+from watch_movies.adapters.ingest import Ingester
+from watch_movies.adapters.journal import Journal
+from watch_movies.adapters.memory_repository import MemoryRepository, read_movies, load_journal
+from watch_movies.adapters.query_cache import init_query_cache
+from watch_movies.adapters.request_memo import init_request_memo
+from watch_movies.adapters.review_activity import FEED_SIZE, ReviewActivity
+from watch_movies.adapters.shared_catalogue import SharedCatalogue, SharedCatalogueRepository, build_catalogue
+from watch_movies.adapters.trending import SIZE, WINDOW_HOURS, TrendingMovies
+from watch_movies.monitoring.memory import SAMPLE_SIZE, format_memory_report, repository_memory_report
+from watch_movies.monitoring.startup import StartupReport, load_in_background, load_validators, \
+    wait_until_ready_or_exit
+
+_import_seconds = time.perf_counter() - _import_start
 
 
 def create_app(test_config=None):
     """Construct the core application."""
+    report = StartupReport(_import_seconds)
 
     # Create the Flask app object.
     app = Flask(__name__)
@@ -23,26 +47,183 @@ def create_app(test_config=None):
         app.config.from_mapping(test_config)
         data_path = app.config['TEST_DATA_PATH']
 
-    # Create the MemoryRepository implementation for a memory-based repository.
-    repo.repo_instance = MemoryRepository()
-    populate(data_path, repo.repo_instance)
+    app.extensions['startup'] = report
+    lazy_startup = app.config.get('LAZY_STARTUP')
+
+    catalogue_path = app.config.get('CATALOGUE_PATH')
+    if catalogue_path:
+        # Read movies from the shared catalogue file, building it from the data files on first use.
+        with report.phase('open catalogue'):
+            if not os.path.exists(catalogue_path):
+                build_catalogue(data_path, catalogue_path)
+            repository = SharedCatalogueRepository(SharedCatalogue(catalogue_path))
+    else:
+        # Create the MemoryRepository implementation for a memory-based repository; it's populated by load() below.
+        repository = MemoryRepository()
+    repo.repo_instance = repository
+
+    def load():
+        if not catalogue_path:
+            with report.phase('read data file'):
+                movies = read_movies(data_path)
+            with report.phase('build indexes'):
+                repository.add_movies(movies)
+
+            # Pick up changes to the data file without restarting, when configured.
+            reload_interval = app.config.get('CATALOGUE_RELOAD_INTERVAL')
+            if reload_interval:
+                registry = app.extensions['metrics']
+                registry.describe('catalogue_reloads_total', 'counter', 'Changes to the data file applied.')
+                registry.describe('catalogue_reload_duration_seconds', 'histogram',
+                                  'Time taken to diff the data file and apply the changes.')
+                app.extensions['catalogue_reloader'] = CatalogueReloader(
+                    repository, os.path.join(data_path, 'Data1000Movies.csv'), float(reload_interval), app.logger,
+                    registry)
+
+            # Add the movies of the files in the ingest directory, then of files and rows added to it later.
+            ingest_directory = app.config.get('INGEST_DIRECTORY')
+            if ingest_directory:
+                registry = app.extensions['metrics']
+                registry.describe('ingested_movies_total', 'counter', 'Movies added from the ingest directory.')
+                registry.describe('ingest_rejected_rows_total', 'counter', 'Invalid rows in the ingest directory.')
+                interval = app.config.get('INGEST_INTERVAL')
+                ingester = Ingester(repository, ingest_directory, interval=float(interval) if interval else None,
+                                    logger=app.logger, registry=registry)
+                with report.phase('ingest new rows'):
+                    ingester.run()
+                app.extensions['ingester'] = ingester
+
+        # Count movies by genre, year and director for the analytics endpoint, and keep the counts up to date.
+        if app.config.get('CATALOGUE_ANALYTICS'):
+            with report.phase('build analytics'):
+                cube = CatalogueCube()
+                repository.add_observer(cube)
+            app.extensions['catalogue_cube'] = cube
+
+        # Count the recent reviews of each movie for the trending movies, including those replayed below.
+        if app.config.get('TRENDING_MOVIES'):
+            trending = TrendingMovies(float(app.config.get('TRENDING_WINDOW_HOURS') or WINDOW_HOURS),
+                                      int(app.config.get('TRENDING_SIZE') or SIZE))
+            repository.add_observer(trending)
+            app.extensions['trending_movies'] = trending
+
+        # Index the latest reviews and each user's reviews, including those replayed below, for paging through them.
+        review_activity = ReviewActivity(int(app.config.get('REVIEW_FEED_SIZE') or FEED_SIZE))
+        repository.add_observer(review_activity)
+        app.extensions['review_activity'] = review_activity
+
+        # Restore users and reviews recorded by the journal, and journal new ones, when a journal is configured.
+        journal_path = app.config.get('JOURNAL_PATH')
+        if journal_path:
+            with report.phase('replay journal'):
+                journal = Journal(journal_path, int(app.config.get('JOURNAL_COMPACT_AFTER') or 10000),
+                                  app.logger)
+                load_journal(journal, repository)
+                atexit.register(journal.close)
 
     # Build the application - these steps require an application context.
     with app.app_context():
+        # Let templates add the CSRF token to forms that aren't rendered from a FlaskForm, e.g. the watchlist buttons.
+        app.jinja_env.globals['csrf_token'] = generate_csrf
+
         # Register blueprints.
-        from .home import home
+        with report.phase('import home'):
+            from .home import home
         app.register_blueprint(home.home_blueprint)
 
-        from .movie_lib import movie_lib
+        with report.phase('import movie_lib'):
+            from .movie_lib import movie_lib
         app.register_blueprint(movie_lib.movie_library_blueprint)
 
-        from .authentication import authentication
+        with report.phase('import authentication'):
+            from .authentication import authentication
         app.register_blueprint(authentication.authentication_blueprint)
 
-        from .utilities import utilities
+        with report.phase('import utilities'):
+            from .utilities import utilities
         app.register_blueprint(utilities.utilities_blueprint)
 
-        from .search import search
+        with report.phase('import search'):
+            from .search import search
         app.register_blueprint(search.search_blueprint)
 
+        with report.phase('import api'):
+            from .api import api
+        app.register_blueprint(api.api_blueprint)
+
+        # Instrument requests and expose the measurements at /metrics.
+        with report.phase('import monitoring'):
+            from .monitoring import monitoring, profiling
+        monitoring.init_app(app)
+        if app.config.get('REPOSITORY_INSTRUMENTATION'):
+            monitoring.instrument_repository(app)
+
+        # Cache catalogue queries across requests, inside the request memo and around the instrumentation, so that
+        # only the queries computed by the repository are measured.
+        if app.config.get('QUERY_CACHE'):
+            init_query_cache(app)
+
+        # Memoize repository reads within each request. Wrapped around the instrumentation, so that only the calls
+        # that reach the repository are measured.
+        if app.config.get('REQUEST_MEMO'):
+            init_request_memo(app)
+
+        # Profile sampled and slow requests, when configured.
+        profiling.init_profiling(app)
+
+    @app.cli.command('startup-report')
+    def startup_report():
+        """Print how long each phase of starting the application took."""
+        ready = report.wait_until_ready()
+        print(report.format())
+        if not ready:
+            raise click.ClickException('Loading the application failed')
+
+    @app.cli.command('memory-report')
+    @click.option('--sample', default=SAMPLE_SIZE, help='Number of items measured in each large collection.')
+    @click.option('--json', 'as_json', is_flag=True, help='Print the report as JSON.')
+    def memory_report(sample, as_json):
+        """Print the estimated memory held by each repository collection and index."""
+        wait_until_ready_or_exit(report)
+        memory = repository_memory_report(repo.repo_instance, sample)
+        print(json.dumps(memory, indent=2) if as_json else format_memory_report(memory))
+
+    @app.cli.command('bulk-import')
+    @click.option('--users', 'users_path', type=click.Path(exists=True, dir_okay=False),
+                  help='CSV file of users: id, username, password.')
+    @click.option('--reviews', 'reviews_path', type=click.Path(exists=True, dir_okay=False),
+                  help='CSV file of reviews: id, author id, movie id, text, timestamp.')
+    @click.option('--processes', type=int, default=None, help='Processes hashing passwords (default: one per CPU).')
+    @click.option('--batch-size', type=int, default=BATCH_SIZE)
+    def bulk_import(users_path, reviews_path, processes, batch_size):
+        """Import users and their reviews, recording them in the journal."""
+        wait_until_ready_or_exit(report)
+        if not app.config.get('JOURNAL_PATH'):
+            print('Warning: JOURNAL_PATH is not set, so the imported users and reviews will not be kept.')
+        if users_path is None:
+            raise click.UsageError('--users is required: reviews name their authors by the ids of the users file.')
+        with PasswordHasher(processes) as hasher:
+            users_report, usernames = import_users(users_path, repo.repo_instance, hasher, batch_size)
+        print(users_report.format())
+        if reviews_path:
+            print(import_reviews(reviews_path, repo.repo_instance, usernames, batch_size).format())
+
+    @app.before_request
+    def start_catalogue_updates():
+        # Started from the process serving requests: a thread started before prefork's fork() wouldn't survive it.
+        for name in ('catalogue_reloader', 'ingester'):
+            updater = app.extensions.get(name)
+            if updater is not None:
+                updater.start()
+
+    if lazy_startup:
+        # Answer health checks straight away, and everything else once the catalogue has loaded. The form
+        # validators' libraries are imported when first used.
+        load_in_background(app, report, load)
+    else:
+        load()
+        load_validators(report)
+        report.mark_ready()
+        app.logger.info(report.format())
+
     return app
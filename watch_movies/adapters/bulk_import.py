@@ -0,0 +1,144 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from werkzeug.security import generate_password_hash
+
+from watch_movies.adapters.memory_repository import read_csv_file
+from watch_movies.adapters.repository import AbstractRepository
+from watch_movies.domain.model import User, make_review
+
+
+# Users and reviews are hashed, linked and added to the repository this many at a time.
+BATCH_SIZE = 1000
+
+# Prefixes of the password hashes werkzeug generates; passwords starting with one are imported as they are.
+HASH_METHODS = ('pbkdf2:', 'scrypt:')
+
+
+class ImportReport:
+    """ The number of records imported and skipped by a bulk import, and how long it took. """
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.imported = 0
+        self.skipped = 0
+        self.hashed = 0
+        self.seconds = 0.0
+
+    @property
+    def per_second(self) -> float:
+        return self.imported / self.seconds if self.seconds > 0 else 0.0
+
+    def format(self) -> str:
+        hashed = f', {self.hashed} passwords hashed' if self.kind == 'users' else ''
+        return (f'{self.kind}: {self.imported} imported, {self.skipped} skipped{hashed} in {self.seconds:.2f}s '
+                f'({self.per_second:.0f}/s)')
+
+
+def batches(rows: Iterable, size: int) -> Iterator[list]:
+    rows = iter(rows)
+    batch = list(islice(rows, size))
+    while len(batch) > 0:
+        yield batch
+        batch = list(islice(rows, size))
+
+
+def is_password_hash(password: str) -> bool:
+    return password.startswith(HASH_METHODS) and password.count('$') == 2
+
+
+class PasswordHasher:
+    """ Hashes passwords across a pool of worker processes, or in this process when processes is 1.
+
+    Hashing is deliberately slow (tens of milliseconds per password), so it is what limits an import of many users;
+    the other steps are cheap.
+    """
+
+    def __init__(self, processes: int = None):
+        self._processes = processes or os.cpu_count() or 1
+        self._pool = ProcessPoolExecutor(self._processes) if self._processes > 1 else None
+
+    def hash(self, passwords: List[str]) -> List[str]:
+        if self._pool is None:
+            return [generate_password_hash(password) for password in passwords]
+        # Several passwords per task, so that tasks outweigh the cost of sending them to a worker.
+        chunk_size = max(1, len(passwords) // (self._processes * 4))
+        return list(self._pool.map(generate_password_hash, passwords, chunksize=chunk_size))
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def import_users(path: str, repo: AbstractRepository, hasher: PasswordHasher,
+                 batch_size: int = BATCH_SIZE) -> Tuple[ImportReport, Dict[str, str]]:
+    """ Adds the users of a users.csv file (id, username, password) to repo, a batch at a time.
+
+    Plain passwords are hashed by hasher; passwords that are already werkzeug hashes are kept. Users whose username
+    is taken are skipped. Returns the report, and the username of each user id of the file, for import_reviews().
+    """
+    report = ImportReport('users')
+    start = time.perf_counter()
+    usernames = dict()
+    for batch in batches(read_csv_file(path), batch_size):
+        new_rows = list()
+        new_usernames = set()
+        for user_id, username, password in batch:
+            # Usernames are stored stripped and lower-cased (see User), so look them up the same way.
+            username = username.strip().lower()
+            usernames[user_id] = username
+            if repo.get_user(username) is not None or username in new_usernames:
+                report.skipped += 1
+            else:
+                new_rows.append((user_id, username, password))
+                new_usernames.add(username)
+
+        plain = [password for _, _, password in new_rows if not is_password_hash(password)]
+        hashes = iter(hasher.hash(plain))
+        report.hashed += len(plain)
+        users = [User(username, password if is_password_hash(password) else next(hashes))
+                 for _, username, password in new_rows]
+        repo.add_users(users)
+        report.imported += len(users)
+    report.seconds = time.perf_counter() - start
+    return report, usernames
+
+
+def import_reviews(path: str, repo: AbstractRepository, usernames: Dict[str, str],
+                   batch_size: int = BATCH_SIZE) -> ImportReport:
+    """ Adds the reviews of a comments.csv file (id, author id, movie id, text, timestamp) to repo, a batch at a time.
+
+    usernames maps the author ids to usernames (see import_users()). Reviews of unknown users or movies, and reviews
+    already in repo, are skipped, so an import can be run again.
+    """
+    report = ImportReport('reviews')
+    start = time.perf_counter()
+    # Keys of the reviews in repo, built once rather than scanning a movie's reviews for every row.
+    known = {(review.user.username, review.movie.id, review.timestamp, review.review_text)
+             for review in repo.get_reviews()}
+    for batch in batches(read_csv_file(path), batch_size):
+        reviews = list()
+        for _, author_id, movie_id, text, timestamp in batch:
+            user = repo.get_user(usernames.get(author_id))
+            movie = repo.get_movie(int(movie_id))
+            timestamp = datetime.fromisoformat(timestamp)
+            key = None if user is None or movie is None else (user.username, movie.id, timestamp, text)
+            if key is None or key in known:
+                report.skipped += 1
+                continue
+            known.add(key)
+            reviews.append(make_review(movie, text, user, timestamp))
+        repo.add_reviews(reviews)
+        report.imported += len(reviews)
+    report.seconds = time.perf_counter() - start
+    return report
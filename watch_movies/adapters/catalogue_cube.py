@@ -0,0 +1,154 @@
+import heapq
+import threading
+from itertools import chain, combinations, product
+from typing import Dict, List, Tuple
+
+from watch_movies.adapters.memory_repository import RepositoryObserver
+from watch_movies.domain.model import Movie
+
+
+# The dimensions movies are counted by, and how to read the values of each from a Movie. A movie counts once for
+# each of its genres; a movie without genres or a director counts under None.
+DIMENSIONS = {
+    'genre': lambda movie: [genre.genre_name for genre in movie.genres] or [None],
+    'year': lambda movie: [movie.release_year],
+    'director': lambda movie: [movie.director.director_full_name if movie.director is not None else None]
+}
+
+# Orders a query can sort its rows by, descending, besides its dimensions; and the value of each for a cell.
+SORTS = {
+    'movies': lambda cell: cell[0],
+    'rating': lambda cell: cell[1] / cell[2] if cell[2] > 0 else float('-inf'),
+    'revenue_millions': lambda cell: cell[3] if cell[4] > 0 else float('-inf')
+}
+
+
+class CatalogueCubeException(Exception):
+    pass
+
+
+class CatalogueCube(RepositoryObserver):
+    """ Counts and sums of the catalogue, by every combination of genre, year and director.
+
+    Each combination of dimensions (genre; genre and year; ...; and none, the whole catalogue) is a group of cells
+    keyed by the dimensions' values, so a dashboard reads one group instead of aggregating the movies. The cells of
+    a group are partitioned by the value of its first dimension, so that filtering on that dimension (a genre, or a
+    year when there's no genre) reads one partition. Cells are updated as movies are added and removed, touching
+    the few cells of those movies, and dropped when their last movie is removed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Groups are keyed by the positions of their dimensions in DIMENSIONS.
+        self._groups: Dict[Tuple[int, ...], Dict[object, Dict[tuple, list]]] = {
+            dimensions: dict() for size in range(len(DIMENSIONS) + 1)
+            for dimensions in combinations(range(len(DIMENSIONS)), size)}
+
+    def movies_added(self, movies: List[Movie]):
+        with self._lock:
+            for movie in movies:
+                self._count(movie, 1)
+
+    def movies_removed(self, movies: List[Movie]):
+        with self._lock:
+            for movie in movies:
+                self._count(movie, -1)
+
+    def _count(self, movie: Movie, sign: int):
+        values = [read(movie) for read in DIMENSIONS.values()]
+        rating, revenue = movie.rating, movie.revenue_millions
+        for dimensions, partitions in self._groups.items():
+            for key in product(*[values[index] for index in dimensions]):
+                leading = key[0] if len(key) > 0 else None
+                cells = partitions.get(leading)
+                if cells is None:
+                    cells = partitions[leading] = dict()
+                cell = cells.get(key)
+                if cell is None:
+                    # The number of movies, and the sum and number of the known ratings and revenues.
+                    cell = cells[key] = [0, 0.0, 0, 0.0, 0]
+                cell[0] += sign
+                if cell[0] == 0:
+                    del cells[key]
+                    if len(cells) == 0:
+                        del partitions[leading]
+                    continue
+                if rating is not None:
+                    cell[1] += sign * rating
+                    cell[2] += sign
+                if revenue is not None:
+                    cell[3] += sign * revenue
+                    cell[4] += sign
+
+    def query(self, dimensions: List[str], filters: Dict[str, object] = None, sort: str = 'movies',
+              limit: int = None) -> List[dict]:
+        """ Returns a row for each combination of values of dimensions, with the number of movies, their average
+        rating and their total revenue.
+
+        filters restricts the movies to those with the given value of other dimensions. Rows are sorted by sort (a
+        dimension, ascending, or one of SORTS, descending) and the first limit are returned. The cost is
+        proportional to the number of cells of the group read, not to the number of movies.
+        """
+        filters = filters or dict()
+        for name in list(dimensions) + list(filters):
+            if name not in DIMENSIONS:
+                raise CatalogueCubeException(f'Unknown dimension {name!r}; use {", ".join(DIMENSIONS)}')
+        if sort not in SORTS and sort not in dimensions:
+            raise CatalogueCubeException(f'Rows can be sorted by {", ".join(list(dimensions) + list(SORTS))}')
+
+        names = list(DIMENSIONS)
+        group = tuple(index for index, name in enumerate(names) if name in dimensions or name in filters)
+        group_names = [names[index] for index in group]
+        positions = [group_names.index(name) for name in dimensions]
+        matches = [(group_names.index(name), value) for name, value in filters.items()]
+        order = SORTS.get(sort)
+
+        with self._lock:
+            partitions = self._groups[group]
+            leading = [value for position, value in matches if position == 0]
+            if len(leading) > 0:
+                partitions = [partitions.get(leading[0], {})]
+                matches = [(position, value) for position, value in matches if position != 0]
+            else:
+                partitions = partitions.values()
+            cells = chain.from_iterable(partition.items() for partition in partitions)
+
+            if len(filters) == 0 and order is not None:
+                # Each cell is a row: only the rows returned are copied, and the group isn't rolled up.
+                if limit is not None:
+                    items = heapq.nlargest(limit, cells, key=lambda item: order(item[1]))
+                else:
+                    items = sorted(cells, key=lambda item: order(item[1]), reverse=True)
+                return [_row(dimensions, tuple(key[position] for position in positions), cell)
+                        for key, cell in items]
+            # Copied under the lock, since writers update cells in place.
+            cells = [(key, tuple(cell)) for key, cell in cells
+                     if all(key[position] == value for position, value in matches)]
+
+        # Roll the cells up to the requested dimensions, in the order requested; only filtered groups have several
+        # cells per row.
+        rolled_up = dict()
+        for key, cell in cells:
+            key = tuple(key[position] for position in positions)
+            total = rolled_up.get(key)
+            rolled_up[key] = cell if total is None else tuple(a + b for a, b in zip(total, cell))
+
+        if order is not None:
+            if limit is not None:
+                items = heapq.nlargest(limit, rolled_up.items(), key=lambda item: order(item[1]))
+            else:
+                items = sorted(rolled_up.items(), key=lambda item: order(item[1]), reverse=True)
+        else:
+            position = list(dimensions).index(sort)
+            items = sorted(rolled_up.items(), key=lambda item: (item[0][position] is None, item[0][position]))
+            items = items[:limit] if limit is not None else items
+        return [_row(dimensions, key, cell) for key, cell in items]
+
+
+def _row(dimensions: List[str], key: tuple, cell: tuple) -> dict:
+    movies, rating_sum, rated, revenue_sum, with_revenue = cell
+    row = dict(zip(dimensions, key))
+    row['movies'] = movies
+    row['rating'] = round(rating_sum / rated, 2) if rated > 0 else None
+    row['revenue_millions'] = round(revenue_sum, 2) if with_revenue > 0 else None
+    return row
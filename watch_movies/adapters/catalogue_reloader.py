@@ -0,0 +1,136 @@
+import os
+import threading
+import time
+from typing import Dict, List
+
+from watch_movies.adapters.memory_repository import MemoryRepository, movie_from_row, read_csv_file
+from watch_movies.adapters.repository import AbstractRepository
+from watch_movies.domain.model import Movie
+
+
+class CatalogueDiff:
+    """ The movies added, changed and removed between two versions of the data file. """
+
+    def __init__(self, added: List[Movie], changed: List[Movie], removed_ids: List[int], fingerprints: dict,
+                 conflicting_ids: List[int] = ()):
+        self.added = added
+        self.changed = changed
+        self.removed_ids = removed_ids
+        # Ids of new rows left out because the repository already has a movie with the id, e.g. an ingested one.
+        self.conflicting_ids = list(conflicting_ids)
+        # Fingerprint of every row of the new version, by movie id.
+        self.fingerprints = fingerprints
+
+    def __len__(self):
+        return len(self.added) + len(self.changed) + len(self.removed_ids)
+
+    def __repr__(self):
+        return f'<CatalogueDiff added={len(self.added)} changed={len(self.changed)} removed={len(self.removed_ids)}>'
+
+
+def row_fingerprints(path: str) -> Dict[int, int]:
+    # A hash of each row of the data file, by movie id, to tell the rows that change between versions.
+    return {int(row[0]): hash(tuple(row)) for row in read_csv_file(path)}
+
+
+def diff_catalogue(path: str, fingerprints: Dict[int, int], repository: AbstractRepository = None) -> CatalogueDiff:
+    """ Compares the data file at path with the version whose rows had the given fingerprints.
+
+    Every row is hashed, but only the rows that were added or changed are parsed into movies. When a repository is
+    given, new rows whose id it already uses (movies added by other means, such as ingestion) are left out of the
+    diff and reported as conflicting; they get no fingerprint, so they are tried again at the next reload.
+    """
+    added, changed, conflicting_ids = list(), list(), list()
+    new_fingerprints = dict()
+    for row in read_csv_file(path):
+        movie_id = int(row[0])
+        fingerprint = hash(tuple(row))
+        previous = fingerprints.get(movie_id)
+        if previous is None and repository is not None and repository.get_movie(movie_id) is not None:
+            conflicting_ids.append(movie_id)
+            continue
+        new_fingerprints[movie_id] = fingerprint
+        if previous is None:
+            added.append(movie_from_row(row))
+        elif previous != fingerprint:
+            changed.append(movie_from_row(row))
+    removed_ids = [movie_id for movie_id in fingerprints if movie_id not in new_fingerprints]
+    return CatalogueDiff(added, changed, removed_ids, new_fingerprints, conflicting_ids)
+
+
+class CatalogueReloader:
+    """ Applies changes to the movie data file to a running repository, without restarting.
+
+    check() compares the file's modification time and size with those last seen, and when they differ diffs the
+    file against the rows last loaded and publishes the added, changed and removed movies as one new version of the
+    repository (see MemoryRepository.update_movies()). Requests in progress finish on the version they started
+    with, and reviews of changed movies are kept. start() runs check() every interval seconds in a background
+    thread of the current process.
+    """
+
+    def __init__(self, repository: MemoryRepository, path: str, interval: float = None, logger=None,
+                 registry=None):
+        self._repository = repository
+        self._path = path
+        self._interval = interval
+        self._logger = logger
+        self._registry = registry
+        self._lock = threading.Lock()
+        self._stat = self._read_stat()
+        self._fingerprints = row_fingerprints(path)
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def _read_stat(self):
+        stat = os.stat(self._path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def check(self, force: bool = False) -> CatalogueDiff:
+        """ Reloads the data file if it changed since last loaded, or if force is set. Returns the changes applied,
+        or None when the file hadn't changed.
+        """
+        with self._lock:
+            stat = self._read_stat()
+            if not force and stat == self._stat:
+                return None
+            start = time.perf_counter()
+            diff = diff_catalogue(self._path, self._fingerprints, self._repository)
+            self._repository.update_movies(diff.added, diff.changed, diff.removed_ids)
+            self._fingerprints = diff.fingerprints
+            self._stat = stat
+        seconds = time.perf_counter() - start
+        if self._logger is not None:
+            self._logger.info(f'Reloaded {self._path} in {seconds * 1000:.1f}ms: {len(diff.added)} added, '
+                              f'{len(diff.changed)} changed, {len(diff.removed_ids)} removed')
+            if diff.conflicting_ids:
+                self._logger.warning(f'Skipped rows of {self._path} whose ids are already used by other movies: '
+                                     f'{diff.conflicting_ids}')
+        if self._registry is not None:
+            self._registry.increment('catalogue_reloads_total')
+            self._registry.observe('catalogue_reload_duration_seconds', seconds)
+        return diff
+
+    def start(self):
+        # Starts polling in this process; threads don't survive fork(), so each worker process starts its own.
+        if self._interval is None:
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='catalogue-reloader', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _run(self):
+        while not self._stopped.wait(self._interval):
+            try:
+                self.check()
+            except Exception:
+                # A half-written file fails to parse; it is read again at the next check.
+                if self._logger is not None:
+                    self._logger.exception(f'Reloading {self._path} failed')
@@ -0,0 +1,228 @@
+import csv
+import json
+import os
+import threading
+import time
+from typing import List
+
+from watch_movies.adapters.memory_repository import MemoryRepository, movie_from_row
+
+
+# Columns of the movie data files, in order. JSON lines files use them as keys.
+COLUMNS = ('Rank', 'Title', 'Genre', 'Description', 'Director', 'Actors', 'Year', 'Runtime (Minutes)', 'Rating',
+           'Votes', 'Revenue (Millions)', 'Metascore')
+
+# Most rejected rows kept for the report; the rest are only counted.
+MAX_REJECTIONS = 100
+
+
+class IngestException(Exception):
+    pass
+
+
+class IngestReport:
+    """ The outcome of one ingest run: the files read, the movies added and the rows rejected, with their reasons. """
+
+    def __init__(self):
+        self.files = dict()
+        self.added = 0
+        self.rejected = 0
+        self.rejections = list()
+        self.seconds = 0.0
+
+    def reject(self, file_name: str, line: int, reason: str):
+        self.rejected += 1
+        if len(self.rejections) < MAX_REJECTIONS:
+            self.rejections.append({'file': file_name, 'line': line, 'reason': reason})
+
+    def as_dict(self) -> dict:
+        return {'files': self.files, 'added': self.added, 'rejected': self.rejected, 'rejections': self.rejections,
+                'seconds': self.seconds}
+
+
+class IngestManifest:
+    """ For each file ingested, the byte offset up to which it has been read and the number of lines before it.
+
+    Files are only ever appended to: the next run reads each known file from its offset, and new files from the
+    start. Only complete lines are consumed, so a line still being written is read by a later run.
+    """
+
+    def __init__(self, entries: dict = None):
+        self._entries = entries if entries is not None else dict()
+
+    def offset(self, file_name: str) -> int:
+        return self._entries.get(file_name, {}).get('offset', 0)
+
+    def lines(self, file_name: str) -> int:
+        return self._entries.get(file_name, {}).get('lines', 0)
+
+    def advance(self, file_name: str, offset: int, lines: int):
+        self._entries[file_name] = {'offset': offset, 'lines': lines}
+
+    def as_dict(self) -> dict:
+        return {name: dict(entry) for name, entry in self._entries.items()}
+
+
+def read_new_lines(path: str, offset: int):
+    """ Returns the complete lines of the file at path from offset, and the offset just after the last of them. """
+    with open(path, 'rb') as data_file:
+        data_file.seek(offset)
+        data = data_file.read()
+    end = data.rfind(b'\n') + 1
+    return data[:end].decode('utf-8-sig' if offset == 0 else 'utf-8').splitlines(), offset + end
+
+
+def csv_rows(lines: List[str], first_line: int, has_header: bool):
+    # Yields the line number and fields of each row of lines. Quoted fields may not span lines.
+    for number, fields in enumerate(csv.reader(lines), start=first_line):
+        if has_header and number == first_line or len(fields) == 0:
+            continue
+        yield number, [field.strip() for field in fields]
+
+
+def json_rows(lines: List[str], first_line: int):
+    # Yields the line number and fields of each JSON object of lines, or the error that prevents reading it.
+    for number, line in enumerate(lines, start=first_line):
+        if line.strip() == '':
+            continue
+        try:
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError('not an object')
+        except ValueError as e:
+            yield number, IngestException(f'Invalid JSON: {e}')
+            continue
+        fields = list()
+        for column in COLUMNS:
+            value = record.get(column, '')
+            if isinstance(value, list):
+                value = ','.join(str(item) for item in value)
+            fields.append('' if value is None else str(value).strip())
+        yield number, fields
+
+
+def validate_row(fields: List[str]):
+    """ Returns the movie described by the fields of a data file row, or raises IngestException. """
+    if len(fields) != len(COLUMNS):
+        raise IngestException(f'Expected {len(COLUMNS)} fields, found {len(fields)}')
+    try:
+        movie_id = int(fields[0])
+        year = int(fields[6])
+    except ValueError:
+        raise IngestException('Rank and Year must be whole numbers')
+    if movie_id <= 0:
+        raise IngestException('Rank must be positive')
+    missing = [COLUMNS[index] for index in (2, 4, 5) if fields[index].strip(' ,') == '']
+    if len(missing) > 0:
+        raise IngestException(f'Missing {", ".join(missing)}')
+    movie = movie_from_row(fields)
+    if movie.title is None:
+        raise IngestException('Title is missing')
+    if movie.release_year is None:
+        raise IngestException(f'Year {year} is before 1900')
+    return movie
+
+
+class Ingester:
+    """ Adds the movies of new data files, and of rows appended to files already read, to a repository.
+
+    Files in directory ending in .csv (with the header of Data1000Movies.csv) or .jsonl (one object per line, keyed
+    by the same column names) are read in name order from the offsets recorded by the manifest. Valid rows whose
+    movie id isn't already used are added with a single call to add_movies(), which publishes them and their index
+    entries as one new version, so ingesting is safe while requests are served. Invalid rows are reported and
+    skipped.
+    """
+
+    def __init__(self, repository: MemoryRepository, directory: str, manifest: IngestManifest = None,
+                 interval: float = None, logger=None, registry=None):
+        self._repository = repository
+        self._directory = directory
+        self._manifest = manifest if manifest is not None else IngestManifest()
+        self._interval = interval
+        self._logger = logger
+        self._registry = registry
+        self._lock = threading.Lock()
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    @property
+    def manifest(self) -> IngestManifest:
+        return self._manifest
+
+    def run(self) -> IngestReport:
+        with self._lock:
+            start = time.perf_counter()
+            report = IngestReport()
+            movies = list()
+            advanced = list()
+            ids = set()
+            for file_name in sorted(os.listdir(self._directory)):
+                if not file_name.endswith(('.csv', '.jsonl')):
+                    continue
+                path = os.path.join(self._directory, file_name)
+                offset = self._manifest.offset(file_name)
+                if os.path.getsize(path) < offset:
+                    report.reject(file_name, 0, 'File is shorter than when last read; it was not ingested again')
+                    continue
+                lines, end = read_new_lines(path, offset)
+                if len(lines) == 0:
+                    continue
+
+                first_line = self._manifest.lines(file_name) + 1
+                if file_name.endswith('.csv'):
+                    rows = csv_rows(lines, first_line, has_header=offset == 0)
+                else:
+                    rows = json_rows(lines, first_line)
+                added = 0
+                for number, fields in rows:
+                    try:
+                        if isinstance(fields, IngestException):
+                            raise fields
+                        movie = validate_row(fields)
+                        if movie.id in ids or self._repository.get_movie(movie.id) is not None:
+                            raise IngestException(f'There is already a movie with id {movie.id}')
+                    except IngestException as e:
+                        report.reject(file_name, number, str(e))
+                        continue
+                    ids.add(movie.id)
+                    movies.append(movie)
+                    added += 1
+                report.files[file_name] = added
+                advanced.append((file_name, end, first_line - 1 + len(lines)))
+
+            self._repository.add_movies(movies)
+            # Recorded once the movies are published, so a failure leaves the rows to be read again.
+            for file_name, end, lines in advanced:
+                self._manifest.advance(file_name, end, lines)
+            report.added = len(movies)
+            report.seconds = time.perf_counter() - start
+
+        if self._logger is not None and (report.added > 0 or report.rejected > 0):
+            self._logger.info(f'Ingested {report.added} movies from {self._directory} in '
+                              f'{report.seconds * 1000:.1f}ms, rejecting {report.rejected} rows')
+        if self._registry is not None:
+            self._registry.increment('ingested_movies_total', amount=report.added)
+            self._registry.increment('ingest_rejected_rows_total', amount=report.rejected)
+        return report
+
+    def start(self):
+        # Starts polling in this process; threads don't survive fork(), so each worker process starts its own.
+        if self._interval is None:
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name='ingester', daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _run(self):
+        while not self._stopped.wait(self._interval):
+            try:
+                self.run()
+            except Exception:
+                if self._logger is not None:
+                    self._logger.exception(f'Ingesting from {self._directory} failed')
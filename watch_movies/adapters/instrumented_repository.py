@@ -0,0 +1,110 @@
+import threading
+import time
+from collections import deque
+
+from watch_movies.adapters.repository import AbstractRepository
+from watch_movies.adapters.repository_proxy import RepositoryProxy, REPOSITORY_METHODS
+from watch_movies.monitoring.metrics import MetricsRegistry
+
+
+# Number of recent calls per method kept for estimating latency and result size percentiles.
+SAMPLE_SIZE = 1024
+QUANTILES = (0.5, 0.9, 0.95, 0.99)
+
+
+class InstrumentedRepository(RepositoryProxy):
+    """ Wraps any repository and records, per method, the number of calls, their latency and their result sizes.
+
+    Counts and totals are recorded in a MetricsRegistry, without locks. Percentiles are estimated from the most
+    recent SAMPLE_SIZE calls of each method. Calls made by the current thread since begin_request() are also
+    tallied, to show how many repository calls a single request makes (e.g. to spot N+1 patterns in views).
+    """
+
+    def __init__(self, repository: AbstractRepository, registry: MetricsRegistry = None):
+        super().__init__(repository)
+        self._registry = registry if registry is not None else MetricsRegistry()
+        self._registry.describe('repository_calls_total', 'counter', 'Repository calls, by method.')
+        self._registry.describe('repository_call_duration_seconds_total', 'counter',
+                                'Total time spent in repository calls, by method.')
+        self._registry.describe('repository_results_total', 'counter',
+                                'Total number of items returned by repository calls, by method.')
+        # deque.append is atomic, so samples can be recorded from any thread without a lock.
+        self._latencies = {name: deque(maxlen=SAMPLE_SIZE) for name in REPOSITORY_METHODS}
+        self._result_sizes = {name: deque(maxlen=SAMPLE_SIZE) for name in REPOSITORY_METHODS}
+        self._request_calls = threading.local()
+
+    @property
+    def registry(self) -> MetricsRegistry:
+        return self._registry
+
+    def _call(self, name: str, args: tuple, kwargs: dict):
+        start = time.perf_counter()
+        result = super()._call(name, args, kwargs)
+        duration = time.perf_counter() - start
+
+        labels = (('method', name),)
+        self._registry.increment('repository_calls_total', labels)
+        self._registry.increment('repository_call_duration_seconds_total', labels, duration)
+        self._latencies[name].append(duration)
+        try:
+            size = len(result)
+        except TypeError:
+            size = 0 if result is None else 1
+        self._registry.increment('repository_results_total', labels, size)
+        self._result_sizes[name].append(size)
+
+        calls = getattr(self._request_calls, 'calls', None)
+        if calls is not None:
+            tally = calls.setdefault(name, [0, 0.0])
+            tally[0] += 1
+            tally[1] += duration
+        return result
+
+    def begin_request(self):
+        # Start tallying the calls made by the current thread.
+        self._request_calls.calls = dict()
+
+    def end_request(self) -> dict:
+        """ Stops tallying, and returns {method: (number of calls, total seconds)} for the current thread. """
+        calls = getattr(self._request_calls, 'calls', None) or dict()
+        self._request_calls.calls = None
+        return {name: tuple(tally) for name, tally in calls.items()}
+
+    def summary(self) -> dict:
+        """ Returns {method: {'calls': ..., 'latency': {quantile: seconds}, 'result_size': {quantile: size}}}. """
+        total = self._registry.collect()
+        summary = dict()
+        for name in REPOSITORY_METHODS:
+            calls = total.counters.get(('repository_calls_total', (('method', name),)), 0)
+            if calls == 0:
+                continue
+            summary[name] = {
+                'calls': calls,
+                'latency': _quantiles(list(self._latencies[name])),
+                'result_size': _quantiles(list(self._result_sizes[name]))
+            }
+        return summary
+
+    def render_prometheus(self) -> str:
+        """ Returns the latency and result size percentiles as Prometheus summaries (counts are in the registry). """
+        lines = ['# TYPE repository_call_duration_seconds summary']
+        size_lines = ['# TYPE repository_result_size summary']
+        for name, method_summary in self.summary().items():
+            for quantile, value in method_summary['latency'].items():
+                lines.append(f'repository_call_duration_seconds{{method="{name}",quantile="{quantile}"}} {value!r}')
+            for quantile, value in method_summary['result_size'].items():
+                size_lines.append(f'repository_result_size{{method="{name}",quantile="{quantile}"}} {value}')
+        return '\n'.join(lines + size_lines) + '\n'
+
+
+def format_request_calls(calls: dict) -> str:
+    # e.g. 'get_movie=2/0.041ms, get_user=1/0.003ms', busiest method first.
+    ordered = sorted(calls.items(), key=lambda item: -item[1][0])
+    return ', '.join(f'{name}={count}/{seconds * 1000:.3f}ms' for name, (count, seconds) in ordered)
+
+
+def _quantiles(samples: list) -> dict:
+    if len(samples) == 0:
+        return dict()
+    samples.sort()
+    return {quantile: samples[min(len(samples) - 1, int(quantile * len(samples)))] for quantile in QUANTILES}
@@ -0,0 +1,272 @@
+import json
+import os
+import queue
+import threading
+import zlib
+from datetime import datetime
+
+from watch_movies.domain.model import Review, User
+
+
+class JournalException(Exception):
+    pass
+
+
+# Marker queued by close() to stop the writer thread.
+_STOP = object()
+
+
+class Journal:
+    """ Append-only, checksummed log of the user, review, watchlist and watch mutations made to a repository.
+
+    append() only hands the record to a background writer thread. The writer takes every record queued since its
+    previous pass, writes them together and fsyncs once for the whole group (group commit), so the cost of the disk
+    is shared between concurrent writers and never paid on the request path. Once compact_after records have been
+    written the log is folded into a snapshot of the full state, supplied by the snapshot_source given to start().
+
+    If writing fails (e.g. the disk is full), the writer logs the error and writes nothing more, since records
+    written after a torn one would be lost at replay; append() and flush() then raise JournalException.
+    """
+
+    LOG_FILE = 'journal.log'
+    SNAPSHOT_FILE = 'snapshot.log'
+
+    def __init__(self, directory: str, compact_after: int = 10000, logger=None):
+        self._directory = directory
+        self._logger = logger
+        self._error = None
+        self._log_path = os.path.join(directory, Journal.LOG_FILE)
+        self._snapshot_path = os.path.join(directory, Journal.SNAPSHOT_FILE)
+        self._compact_after = compact_after
+        self._written_since_compaction = 0
+        self._snapshot_source = None
+        self._queue = queue.Queue()
+        self._file = None
+        self._writer = None
+
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def directory(self) -> str:
+        return self._directory
+
+    @property
+    def error(self):
+        # The error that stopped the writer, if any.
+        return self._error
+
+    def replay(self):
+        """ Yields the records of the last snapshot followed by those of the log, oldest first.
+
+        A log that ends in a partially written or corrupt record (e.g. after a crash mid-write) is truncated to its
+        last good record, so that subsequent appends follow valid data.
+        """
+        if self._writer is not None:
+            raise JournalException('Journal cannot be replayed once started')
+
+        if os.path.exists(self._snapshot_path):
+            for record, _ in _read_records(self._snapshot_path):
+                yield record
+
+        good_offset = 0
+        if os.path.exists(self._log_path):
+            for record, good_offset in _read_records(self._log_path):
+                yield record
+
+            if good_offset < os.path.getsize(self._log_path):
+                with open(self._log_path, 'r+b') as log:
+                    log.truncate(good_offset)
+                    os.fsync(log.fileno())
+
+    def start(self, snapshot_source=None):
+        """ Opens the log for appending and starts the writer thread.
+
+        snapshot_source is a callable returning an iterable of records that describe the complete current state; it
+        is used for compaction, which is disabled when it is None.
+        """
+        if self._writer is not None:
+            raise JournalException('Journal already started')
+
+        self._snapshot_source = snapshot_source
+        self._file = open(self._log_path, 'ab')
+        self._writer = threading.Thread(target=self._run, name='journal-writer', daemon=True)
+        self._writer.start()
+
+    def append(self, record: dict):
+        """ Queues a record for the writer thread; the record is durable once a later flush() returns. """
+        if self._writer is None:
+            raise JournalException('Journal must be started before appending')
+        self._raise_if_failed()
+        self._queue.put(record)
+
+    def flush(self):
+        """ Blocks until every record appended before this call has been written and fsynced. """
+        if self._writer is None or not self._writer.is_alive():
+            self._raise_if_failed()
+            return
+        written = threading.Event()
+        self._queue.put(written)
+        written.wait()
+        self._raise_if_failed()
+
+    def _raise_if_failed(self):
+        if self._error is not None:
+            raise JournalException(f'Writing the journal failed: {self._error}') from self._error
+
+    def close(self):
+        if self._writer is None:
+            return
+        if self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join()
+        self._file.close()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            # Block for the first item, then take everything else that queued up while the last group was fsynced.
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            records = list()
+            waiters = list()
+            for item in batch:
+                if item is _STOP:
+                    stopping = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    records.append(item)
+
+            if self._error is None:
+                try:
+                    self._write(records)
+                except Exception as e:
+                    # Keep draining the queue, releasing flush()es, but write nothing more.
+                    self._error = e
+                    if self._logger is not None:
+                        self._logger.exception(f'Writing the journal in {self._directory} failed; no further '
+                                               f'records will be written')
+
+            for waiter in waiters:
+                waiter.set()
+
+    def _write(self, records: list):
+        if len(records) > 0:
+            self._file.write(b''.join(_encode(record) for record in records))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._written_since_compaction += len(records)
+
+        if self._snapshot_source is not None and self._written_since_compaction >= self._compact_after:
+            self.compact()
+
+    def compact(self):
+        """ Writes the state given by the snapshot source to a new snapshot and empties the log.
+
+        Only the writer thread appends to the log, so when this runs on the writer thread every logged record is
+        already reflected in the state. Mutations made while the snapshot is being taken may appear in both the
+        snapshot and the next log entries; replay is idempotent so the duplicates are harmless.
+        """
+        temporary_path = self._snapshot_path + '.tmp'
+        with open(temporary_path, 'wb') as snapshot:
+            for record in self._snapshot_source():
+                snapshot.write(_encode(record))
+            snapshot.flush()
+            os.fsync(snapshot.fileno())
+        os.replace(temporary_path, self._snapshot_path)
+        _fsync_directory(self._directory)
+
+        self._file.truncate(0)
+        os.fsync(self._file.fileno())
+        self._written_since_compaction = 0
+
+
+# ==========================================
+# Functions to convert entities to records
+# ==========================================
+
+def user_to_record(user: User):
+    return {
+        'type': 'user',
+        'username': user.username,
+        'password': user.password
+    }
+
+
+def review_to_record(review: Review):
+    return {
+        'type': 'review',
+        'username': review.user.username,
+        'movie_id': review.movie.id,
+        'review_text': review.review_text,
+        'timestamp': review.timestamp.isoformat()
+    }
+
+
+def watchlist_to_record(user: User, movie_id: int, action: str):
+    # action is 'add' or 'remove'.
+    return {
+        'type': 'watchlist',
+        'username': user.username,
+        'movie_id': movie_id,
+        'action': action
+    }
+
+
+def watched_to_record(user: User, movie_id: int):
+    # The number of times the user has watched the movie so far, rather than one more time, so replay is idempotent.
+    return {
+        'type': 'watched',
+        'username': user.username,
+        'movie_id': movie_id,
+        'times': user.times_watched(movie_id)
+    }
+
+
+def record_timestamp(record: dict) -> datetime:
+    return datetime.fromisoformat(record['timestamp'])
+
+
+# ==========================================
+# Record encoding
+# ==========================================
+
+def _encode(record: dict) -> bytes:
+    # Each record is one line: the CRC32 of the JSON payload in hex, a space, then the payload.
+    payload = json.dumps(record, separators=(',', ':')).encode('utf-8')
+    return b'%08x %s\n' % (zlib.crc32(payload), payload)
+
+
+def _read_records(path: str):
+    """ Yields (record, end offset) for each valid record in path, stopping at the first torn or corrupt line. """
+    offset = 0
+    with open(path, 'rb') as infile:
+        for line in infile:
+            if not line.endswith(b'\n'):
+                return
+            checksum, _, payload = line[:-1].partition(b' ')
+            try:
+                if int(checksum, 16) != zlib.crc32(payload):
+                    return
+                record = json.loads(payload)
+            except ValueError:
+                return
+            offset += len(line)
+            yield record, offset
+
+
+def _fsync_directory(directory: str):
+    # Make the rename of the snapshot durable. Not every platform allows a directory to be opened.
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
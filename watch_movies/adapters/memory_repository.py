@@ -1,124 +1,299 @@
 import csv
 import os
-from typing import List
+import re
+import threading
+from itertools import islice
+from typing import Iterator, List
 
 from bisect import bisect, bisect_left, insort_left
 
 from werkzeug.security import generate_password_hash
 
+from watch_movies.adapters.journal import Journal, review_to_record, user_to_record, record_timestamp, \
+    watched_to_record, watchlist_to_record
+from watch_movies.adapters.movie_columns import MovieColumns, Predicate, Equals
 from watch_movies.adapters.repository import AbstractRepository, RepositoryException
-from watch_movies.domain.model import Director, Genre, Movie, Actor, Review, User
+from watch_movies.domain.model import Director, Genre, Movie, Actor, Review, User, make_review
+
+
+# A word of a title: a run of letters, digits and underscores.
+_WORD = re.compile(r'\w+')
+
+
+class RepositorySnapshot:
+    """ An immutable, consistent view of the contents of a MemoryRepository.
+
+    Writers never modify a published snapshot. They build the next version under the repository's write lock and
+    publish it with a single reference assignment, so a reader that takes one snapshot sees one consistent state for
+    as long as it holds it, without taking any lock. Collections that are only ever appended to (users and reviews)
+    are shared between versions; each snapshot records how many of their items it covers.
+    """
+
+    __slots__ = ('version', 'catalogue_version', 'movies', 'movies_index', 'actor_ids', 'genre_ids', 'director_ids',
+                 'title_word_ids', 'columns', 'genres', 'actors', 'directors', 'user_count', 'review_count',
+                 'catalogue')
+
+    def __init__(self, version=0, catalogue_version=0, movies=(), movies_index=None, actor_ids=None, genre_ids=None,
+                 director_ids=None, title_word_ids=None, columns=None, genres=(), actors=(), directors=(), user_count=0, review_count=0,
+                 catalogue=None):
+        self.version = version
+        # Incremented only by changes to the movies and genres, unlike version, which every write increments.
+        self.catalogue_version = catalogue_version
+        # Movies ordered by title, then release year.
+        self.movies = movies
+        self.movies_index = movies_index if movies_index is not None else dict()
+        # Posting lists: the ascending ids of the movies featuring each actor, genre and director name.
+        self.actor_ids = actor_ids if actor_ids is not None else dict()
+        self.genre_ids = genre_ids if genre_ids is not None else dict()
+        self.director_ids = director_ids if director_ids is not None else dict()
+        # The same for each lowercase word of the titles (see title_words()).
+        self.title_word_ids = title_word_ids if title_word_ids is not None else dict()
+        # Numeric attributes of the movies, in insertion order, for vectorized filtering.
+        self.columns = columns if columns is not None else MovieColumns()
+        self.genres = genres
+        self.actors = actors
+        self.directors = directors
+        self.user_count = user_count
+        self.review_count = review_count
+        # The SharedCatalogue the movies are read from, for a SharedCatalogueRepository; None otherwise.
+        self.catalogue = catalogue
+
+    def replace(self, **changes):
+        # Returns the next version of this snapshot, with the given fields replaced.
+        fields = {name: getattr(self, name) for name in RepositorySnapshot.__slots__}
+        fields.update(changes)
+        fields['version'] = self.version + 1
+        return RepositorySnapshot(**fields)
+
+    def replace_catalogue(self, **changes):
+        # As replace(), for changes to the catalogue.
+        return self.replace(catalogue_version=self.catalogue_version + 1, **changes)
+
+
+class RepositoryObserver:
+    """ Receives the changes to the catalogue and reviews of a MemoryRepository, e.g. to maintain an aggregate of them.
+
+    Calls are made in the order the changes are published, with the repository's write lock held, so they should
+    be quick. A changed movie is reported as removed, then added.
+    """
+
+    def movies_added(self, movies: List[Movie]):
+        pass
+
+    def movies_removed(self, movies: List[Movie]):
+        pass
+
+    def reviews_added(self, reviews: List[Review]):
+        pass
 
 
 class MemoryRepository(AbstractRepository):
-    # Movies ordered by year, not id. id is assumed unique.
+    # Movies ordered by title, not id. id is assumed unique.
 
     def __init__(self):
-        self._movies = list()
-        self._movies_index = dict()
-        self._genres = list()
+        self._snapshot = RepositorySnapshot()
+        self._write_lock = threading.Lock()
+        # Append-only; the current snapshot says how many users and reviews are visible.
         self._users = list()
+        self._users_index = dict()
         self._reviews = list()
-        self._directors = list()
-        self._actors = list()
+        self._journal = None
+        self._observers = list()
+
+    @property
+    def snapshot(self) -> RepositorySnapshot:
+        """ The current version of the repository, for callers that need several reads to agree with each other. """
+        return self._snapshot
+
+    @property
+    def version(self) -> int:
+        return self._snapshot.version
+
+    @property
+    def catalogue_version(self) -> int:
+        """ The version of the movies and genres, which user and review writes leave unchanged. """
+        return self._snapshot.catalogue_version
+
+    @property
+    def journal(self) -> Journal:
+        return self._journal
+
+    @journal.setter
+    def journal(self, journal: Journal):
+        # Writes append their records while holding the write lock, so the journal has them in the order they were
+        # applied; append() only queues the record.
+        self._journal = journal
+
+    def add_observer(self, observer: RepositoryObserver):
+        """ Reports the movies and reviews already in the repository to observer, then every later change. """
+        with self._write_lock:
+            observer.movies_added(list(self.iter_movies_in(self._snapshot)))
+            observer.reviews_added(self.get_reviews_in(self._snapshot))
+            self._observers.append(observer)
 
     def add_user(self, user: User):
-        self._users.append(user)
+        with self._write_lock:
+            self._users.append(user)
+            self._users_index.setdefault(user.username, user)
+            self._snapshot = self._snapshot.replace(user_count=len(self._users))
+            if self._journal is not None:
+                self._journal.append(user_to_record(user))
+
+    def add_users(self, users: List[User]):
+        # Publishes the batch as a single new version.
+        if len(users) == 0:
+            return
+        with self._write_lock:
+            self._users.extend(users)
+            for user in users:
+                self._users_index.setdefault(user.username, user)
+            self._snapshot = self._snapshot.replace(user_count=len(self._users))
+            if self._journal is not None:
+                for user in users:
+                    self._journal.append(user_to_record(user))
 
     def get_user(self, username) -> User:
-        for user in self._users:
-            if user.username == username:
-                return user
-        return None
+        return self._users_index.get(username)
 
     def add_movie(self, movie: Movie):
-        insort_left(self._movies, movie)
-        self._movies_index[movie.id] = movie
+        self.add_movies([movie])
+
+    def add_movies(self, movies: List[Movie]):
+        """ Adds movies to the repository, publishing them and their index entries as a single new version. """
+        if len(movies) == 0:
+            return
+
+        with self._write_lock:
+            current = self._snapshot
+
+            movies_index = dict(current.movies_index)
+            actor_ids = _PostingListsBuilder(current.actor_ids)
+            genre_ids = _PostingListsBuilder(current.genre_ids)
+            director_ids = _PostingListsBuilder(current.director_ids)
+            title_word_ids = _PostingListsBuilder(current.title_word_ids)
+            builders = (actor_ids, genre_ids, director_ids, title_word_ids)
+            for movie in movies:
+                movies_index[movie.id] = movie
+                for posting_lists, names in zip(builders, _posting_names(movie)):
+                    for name in names:
+                        posting_lists.add(name, movie.id)
+
+            self._snapshot = current.replace_catalogue(
+                movies=_ordered(current.movies, movies),
+                movies_index=movies_index,
+                actor_ids=actor_ids.build(),
+                genre_ids=genre_ids.build(),
+                director_ids=director_ids.build(),
+                title_word_ids=title_word_ids.build(),
+                columns=current.columns.appended(movies)
+            )
+            for observer in self._observers:
+                observer.movies_added(movies)
+
+    def update_movies(self, added: List[Movie] = (), changed: List[Movie] = (), removed_ids: List[int] = ()):
+        """ Adds, replaces and removes movies, publishing the result as a single new version.
+
+        A changed movie replaces the movie with the same id, and takes over its reviews. Readers holding the current
+        snapshot keep seeing the movies as they were. Apart from copying the published collections, the cost is
+        proportional to the number of movies added, changed and removed.
+        """
+        if len(added) + len(changed) + len(removed_ids) == 0:
+            return
+
+        with self._write_lock:
+            current = self._snapshot
+            movies_index = dict(current.movies_index)
+            actor_ids = _PostingListsBuilder(current.actor_ids)
+            genre_ids = _PostingListsBuilder(current.genre_ids)
+            director_ids = _PostingListsBuilder(current.director_ids)
+            title_word_ids = _PostingListsBuilder(current.title_word_ids)
+            builders = (actor_ids, genre_ids, director_ids, title_word_ids)
+
+            replaced = {movie.id: movie for movie in changed}
+            dropped_movies = list()
+            for movie_id in list(replaced) + list(removed_ids):
+                old = movies_index.pop(movie_id, None)
+                if old is None:
+                    raise RepositoryException(f'There is no movie with id {movie_id} to replace or remove')
+                dropped_movies.append(old)
+                for posting_lists, names in zip(builders, _posting_names(old)):
+                    for name in names:
+                        posting_lists.remove(name, movie_id)
+                if movie_id in replaced:
+                    for review in old.reviews:
+                        # The review now belongs to the replacement, so it must point at it.
+                        review.movie = replaced[movie_id]
+                        replaced[movie_id].add_review(review)
+            for movie in list(changed) + list(added):
+                if movie.id in movies_index:
+                    raise RepositoryException(f'There is already a movie with id {movie.id}')
+                movies_index[movie.id] = movie
+                for posting_lists, names in zip(builders, _posting_names(movie)):
+                    for name in names:
+                        posting_lists.add(name, movie.id)
+
+            dropped = set(replaced).union(removed_ids)
+            surviving = [movie for movie in current.movies if movie.id not in dropped]
+            self._snapshot = current.replace_catalogue(
+                movies=_ordered(surviving, list(changed) + list(added)),
+                movies_index=movies_index,
+                actor_ids=actor_ids.build(),
+                genre_ids=genre_ids.build(),
+                director_ids=director_ids.build(),
+                title_word_ids=title_word_ids.build(),
+                columns=current.columns.updated(changed, removed_ids).appended(added)
+            )
+            for observer in self._observers:
+                observer.movies_removed(dropped_movies)
+                observer.movies_added(list(changed) + list(added))
 
     def get_movie(self, id: int) -> Movie:
-        movie = None
-
-        try:
-            movie = self._movies_index[id]
-        except KeyError:
-            pass  # Ignore exception and return None.
-
-        return movie
+        return self._snapshot.movies_index.get(id)
 
     def get_movies_by_year(self, target_year: int) -> List[Movie]:
+        snapshot = self._snapshot
+        movie_ids = snapshot.columns.select(Equals('year', target_year))
+        return [snapshot.movies_index[id] for id in movie_ids]
 
-        matching_movies = list()
-        try:
-            for movie in self._movies:
-                if movie.release_year == target_year:
-                    matching_movies.append(movie)
-        except ValueError:
-            # No articles for specified date. Simply return an empty list.
-            pass
-        return matching_movies
+    def get_movie_ids_matching(self, predicate: Predicate, among: List[int] = None) -> List[int]:
+        return self._snapshot.columns.select(predicate, among)
 
     def get_number_of_movies(self):
-        return len(self._movies)
+        return len(self._snapshot.movies)
 
     def get_first_movie(self):
         movie = None
 
-        if len(self._movies) > 0:
-            movie = self._movies[0]
+        movies = self._snapshot.movies
+        if len(movies) > 0:
+            movie = movies[0]
         return movie
 
     def get_last_movie(self):
         movie = None
 
-        if len(self._movies) > 0:
-            movie = self._movies[-1]
+        movies = self._snapshot.movies
+        if len(movies) > 0:
+            movie = movies[-1]
         return movie
 
     def get_movies_by_ids(self, id_list):
-        # Strip out any ids in id_list that don't represent movie ids in the repository.
-        existing_ids = [ids for ids in id_list if ids in self._movies_index]
-
-
-        # Fetch the watch_movies.
-        movies = [self._movies_index[ids] for ids in existing_ids]
-        return movies
+        # Ids in id_list that don't represent movie ids in the repository are skipped.
+        movies_index = self._snapshot.movies_index
+        return [movies_index[id] for id in id_list if id in movies_index]
 
     def get_movie_ids_for_actor(self, actor_name: str):
-        # Linear search, to find the first occurrence of a Actor with the name actor_name.
-        actor = next((actor for actor in self._actors if actor.actor_full_name == actor_name), None)
-
-        # Retrieve the ids of watch_movies associated with the actor.
-        if actor is not None:
-            movie_ids = [movie.id for movie in self._movies if actor in movie.actors]
-        else:
-            # No Actor with name actor_name, so return an empty list.
-            movie_ids = list()
-        return movie_ids
+        # Retrieve the ids of watch_movies associated with the actor; an unknown actor has no movies.
+        return list(self._snapshot.actor_ids.get(actor_name, ()))
 
     def get_movie_ids_for_genre(self, genre_name: str):
-        # Linear search, to find the first occurrence of a genre with the name genre_name.
-        genre = next((genre for genre in self._genres if genre.genre_name == genre_name), None)
-
-        # Retrieve the ids of watch_movies associated with the genre.
-        if genre is not None:
-            movie_ids = [movie.id for movie in self._movies if genre in movie.genres]
-        else:
-            # No Actor with name actor_name, so return an empty list.
-            movie_ids = list()
-        return movie_ids
+        return list(self._snapshot.genre_ids.get(genre_name, ()))
 
     def get_movie_ids_for_director(self, director_name: str):
-        # Linear search, to find the first occurrence of a director with the name director_name.
-        director = next((director for director in self._directors if director.director_full_name == director_name),
-                        None)
+        return list(self._snapshot.director_ids.get(director_name, ()))
 
-        # Retrieve the ids of watch_movies associated with the director.
-        if director is not None:
-            movie_ids = [movie.id for movie in self._movies if director in movie.director]
-        else:
-            # No Actor with name director_name, so return an empty list.
-            movie_ids = list()
-        return movie_ids
+    def get_movie_ids_for_title_word(self, word: str):
+        return list(self._snapshot.title_word_ids.get(word.lower(), ()))
 
     def get_id_of_previous_movie(self, movie: Movie):
         previous_id = None
@@ -132,37 +307,163 @@ class MemoryRepository(AbstractRepository):
         next_id = None
         if movie is None:
             return None
-        elif movie.id < len(self._movies):
+        elif movie.id < len(self._snapshot.movies):
             next_id = movie.id + 1
         return next_id
 
     def add_genre(self, genre: Genre):
-        self._genres.append(genre)
+        with self._write_lock:
+            self._snapshot = self._snapshot.replace_catalogue(genres=self._snapshot.genres + (genre,))
 
     def get_genres(self) -> List[Genre]:
-        return self._genres
+        return list(self._snapshot.genres)
 
     def add_review(self, review: Review):
         super().add_review(review)
-        self._reviews.append(review)
+        with self._write_lock:
+            self._reviews.append(review)
+            self._snapshot = self._snapshot.replace(review_count=len(self._reviews))
+            for observer in self._observers:
+                observer.reviews_added([review])
+            if self._journal is not None:
+                self._journal.append(review_to_record(review))
+
+    def add_reviews(self, reviews: List[Review]):
+        # Publishes the batch as a single new version, once every review has been checked.
+        for review in reviews:
+            AbstractRepository.add_review(self, review)
+        if len(reviews) == 0:
+            return
+        with self._write_lock:
+            self._reviews.extend(reviews)
+            self._snapshot = self._snapshot.replace(review_count=len(self._reviews))
+            for observer in self._observers:
+                observer.reviews_added(list(reviews))
+            if self._journal is not None:
+                for review in reviews:
+                    self._journal.append(review_to_record(review))
+
+    def add_to_watchlist(self, user: User, movies: List[Movie]) -> int:
+        with self._write_lock:
+            added = [movie for movie in movies if user.add_to_watchlist(movie)]
+            if self._journal is not None:
+                for movie in added:
+                    self._journal.append(watchlist_to_record(user, movie.id, 'add'))
+        return len(added)
+
+    def remove_from_watchlist(self, user: User, movie_ids: List[int]) -> int:
+        with self._write_lock:
+            removed = [movie_id for movie_id in movie_ids if user.remove_from_watchlist(movie_id)]
+            if self._journal is not None:
+                for movie_id in removed:
+                    self._journal.append(watchlist_to_record(user, movie_id, 'remove'))
+        return len(removed)
+
+    def add_watched_movie(self, user: User, movie: Movie):
+        with self._write_lock:
+            user.watch_movie(movie)
+            if self._journal is not None:
+                self._journal.append(watched_to_record(user, movie.id))
 
     def get_reviews(self) -> List[Review]:
-        return self._reviews
+        return self.get_reviews_in(self._snapshot)
+
+    def get_reviews_in(self, snapshot: RepositorySnapshot) -> List[Review]:
+        # The reviews visible in snapshot.
+        return self._reviews[:snapshot.review_count]
+
+    def get_users_in(self, snapshot: RepositorySnapshot) -> List[User]:
+        # The users visible in snapshot.
+        return self._users[:snapshot.user_count]
+
+    def iter_movies_in(self, snapshot: RepositorySnapshot) -> Iterator[Movie]:
+        # The movies of snapshot in title order, without copying them into a list.
+        return iter(snapshot.movies)
+
+    def iter_reviews_in(self, snapshot: RepositorySnapshot) -> Iterator[Review]:
+        # The reviews visible in snapshot, without copying them into a list; reviews added meanwhile are left out.
+        return islice(self._reviews, snapshot.review_count)
 
     def get_director(self) -> List[Director]:
-        return self._directors
+        return list(self._snapshot.directors)
 
     def get_actors(self) -> List[Actor]:
-        return self._actors
+        return list(self._snapshot.actors)
 
     # Helper method to return movie index.
     def movie_index(self, movie: Movie):
-        index = bisect_left(self._movies, movie)
-        if index != len(self._movies) and self._movies[index].release_year == movie.release_year:
+        movies = self._snapshot.movies
+        index = bisect_left(movies, movie)
+        if index != len(movies) and movies[index].release_year == movie.release_year:
             return index
         raise ValueError
 
 
+def _ordered(movies, new_movies: List[Movie]) -> tuple:
+    # Merges new_movies into movies, a sequence ordered by title then release year. Finding where each new movie
+    # goes takes O(log n) comparisons, so the cost beyond copying references is proportional to the new movies.
+    merged = list()
+    start = 0
+    for movie in sorted(new_movies):
+        position = bisect_left(movies, movie, start)
+        merged.extend(movies[start:position])
+        merged.append(movie)
+        start = position
+    merged.extend(movies[start:])
+    return tuple(merged)
+
+
+def title_words(text: str) -> List[str]:
+    """ Returns the distinct lowercase words of text, in order, as indexed for titles. """
+    return list(dict.fromkeys(_WORD.findall(text.lower()))) if text else []
+
+
+def _posting_names(movie: Movie) -> tuple:
+    # The actor, genre and director names and the title words whose posting lists movie belongs to.
+    return ([actor.actor_full_name for actor in movie.actors],
+            [genre.genre_name for genre in movie.genres],
+            [movie.director.director_full_name] if movie.director is not None else [],
+            title_words(movie.title))
+
+
+class _PostingListsBuilder:
+    # Copy-on-write update of a published {name: ascending ids} mapping: only the lists that change are copied.
+
+    def __init__(self, published: dict):
+        self._published = published
+        self._changed = dict()
+
+    def add(self, name: str, movie_id: int):
+        ids = self._changed.get(name)
+        if ids is None:
+            ids = list(self._published.get(name, ()))
+            self._changed[name] = ids
+        if len(ids) == 0 or ids[-1] < movie_id:
+            ids.append(movie_id)
+        else:
+            insort_left(ids, movie_id)
+
+    def remove(self, name: str, movie_id: int):
+        ids = self._changed.get(name)
+        if ids is None:
+            ids = list(self._published.get(name, ()))
+            self._changed[name] = ids
+        index = bisect_left(ids, movie_id)
+        if index < len(ids) and ids[index] == movie_id:
+            del ids[index]
+
+    def build(self) -> dict:
+        if len(self._changed) == 0:
+            return self._published
+        posting_lists = dict(self._published)
+        for name, ids in self._changed.items():
+            if len(ids) > 0:
+                posting_lists[name] = tuple(ids)
+            else:
+                posting_lists.pop(name, None)
+        return posting_lists
+
+
 def read_csv_file(filename: str):
     with open(filename, encoding='utf-8-sig') as infile:
         reader = csv.reader(infile)
@@ -178,25 +479,105 @@ def read_csv_file(filename: str):
 
 
 def load_movies_and_infos(data_path: str, repo: MemoryRepository):
-    for row in read_csv_file(os.path.join(data_path, 'Data1000Movies.csv')):
-        movie = Movie(row[1], int(row[6]))
-        movie.add_id(int(row[0]))
-        movie.description = row[3]
+    # Add the movies to the repository in one batch.
+    repo.add_movies(read_movies(data_path))
 
+
+def read_movies(data_path: str) -> List[Movie]:
+    # The movies of the data file, in file order.
+    return [movie_from_row(row) for row in read_csv_file(os.path.join(data_path, 'Data1000Movies.csv'))]
+
+
+def movie_from_row(row: List[str]) -> Movie:
+    movie = Movie(row[1], int(row[6]))
+    movie.add_id(int(row[0]))
+    movie.description = row[3]
+
+    if row[4] != '':
         movie.set_director(Director(row[4]))
 
-        genre_lst = row[2].split(",")
-        for genre in genre_lst:
+    runtime_minutes = _optional_number(row[7], int)
+    if runtime_minutes is not None and runtime_minutes > 0:
+        movie.runtime_minutes = runtime_minutes
+    movie.rating = _optional_number(row[8], float)
+    movie.votes = _optional_number(row[9], int)
+    movie.revenue_millions = _optional_number(row[10], float)
+    movie.metascore = _optional_number(row[11], int)
+
+    # Empty names, e.g. of a movie without actors, are skipped rather than indexed.
+    genre_lst = row[2].split(",")
+    for genre in genre_lst:
+        if genre.strip() != '':
             movie.add_genre(Genre(genre.strip()))
 
-        actors_lst = row[5].split(",")
-        for actor in actors_lst:
+    actors_lst = row[5].split(",")
+    for actor in actors_lst:
+        if actor.strip() != '':
             movie.add_actor(Actor(actor.strip()))
 
-        # Add the movie to the repository.
-        repo.add_movie(movie)
+    return movie
+
+
+def _optional_number(value: str, number_type):
+    # Converts a CSV field to number_type, or None when it is missing or 'N/A'.
+    try:
+        return number_type(value)
+    except ValueError:
+        return None
 
 
 def populate(data_path: str, repo: MemoryRepository):
     # Load articles and tags into the repository.
     load_movies_and_infos(data_path, repo)
+
+
+def journal_records(repo: MemoryRepository):
+    # The complete user, review, watch history and watchlist state of repo, as journal records. Used to compact the
+    # journal.
+    snapshot = repo.snapshot
+    for user in repo.get_users_in(snapshot):
+        yield user_to_record(user)
+    for review in repo.get_reviews_in(snapshot):
+        yield review_to_record(review)
+    for user in repo.get_users_in(snapshot):
+        for movie in user.watched_movies:
+            yield watched_to_record(user, movie.id)
+        for movie in user.watchlist:
+            yield watchlist_to_record(user, movie.id, 'add')
+
+
+def load_journal(journal: Journal, repo: MemoryRepository):
+    # Replay the users, reviews, watches and watchlists recorded by the journal, then have repo record its subsequent
+    # mutations.
+    # Replay is idempotent: a compaction can leave the same mutation in both the snapshot and the log.
+    replayed_reviews = set()
+    for record in journal.replay():
+        if record['type'] == 'user':
+            if repo.get_user(record['username']) is None:
+                repo.add_user(User(record['username'], record['password']))
+
+        elif record['type'] == 'review':
+            key = (record['username'], record['movie_id'], record['review_text'], record['timestamp'])
+            movie = repo.get_movie(record['movie_id'])
+            user = repo.get_user(record['username'])
+            if key in replayed_reviews or movie is None or user is None:
+                # Skip duplicates, and reviews of movies that are no longer in the catalogue.
+                continue
+            replayed_reviews.add(key)
+            repo.add_review(make_review(movie, record['review_text'], user, record_timestamp(record)))
+
+        elif record['type'] in ('watchlist', 'watched'):
+            movie = repo.get_movie(record['movie_id'])
+            user = repo.get_user(record['username'])
+            if movie is None or user is None:
+                continue
+            if record['type'] == 'watched':
+                # Records hold the number of times watched so far, so a duplicate adds nothing.
+                user.watch_movie(movie, record['times'] - user.times_watched(movie.id))
+            elif record['action'] == 'add':
+                user.add_to_watchlist(movie)
+            else:
+                user.remove_from_watchlist(movie.id)
+
+    journal.start(lambda: journal_records(repo))
+    repo.journal = journal
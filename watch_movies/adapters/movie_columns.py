@@ -0,0 +1,249 @@
+from typing import List
+
+import numpy as np
+
+from watch_movies.domain.model import Movie
+
+
+# Numeric movie attributes held as columns, and how to read each from a Movie. Missing values are stored as NaN.
+COLUMNS = {
+    'year': lambda movie: movie.release_year,
+    'runtime': lambda movie: movie.runtime_minutes,
+    'rating': lambda movie: movie.rating,
+    'votes': lambda movie: movie.votes,
+    'revenue': lambda movie: movie.revenue_millions,
+    'metascore': lambda movie: movie.metascore
+}
+
+
+class MovieColumnsException(Exception):
+    pass
+
+
+class MovieColumns:
+    """ An immutable view of the numeric attributes of a catalogue, as NumPy arrays aligned by movie ordinal.
+
+    A movie's ordinal is its position in insertion order. Predicates are evaluated as vectorized masks over whole
+    columns, so a query costs a few passes over contiguous memory rather than a Python loop over Movie objects.
+
+    appended() returns a new view and leaves this one unchanged: rows are written past the end of this view's
+    length (reallocating when capacity runs out), so views held by readers never change underneath them. Only the
+    most recent view may be appended to.
+    """
+
+    def __init__(self, ids: np.ndarray = None, arrays: dict = None, length: int = None):
+        self._ids = ids if ids is not None else np.empty(0, dtype=np.int64)
+        self._arrays = arrays if arrays is not None else {name: np.empty(0) for name in COLUMNS}
+        self._length = length if length is not None else len(self._ids)
+        # True while ordinals are in ascending id order, in which case results need no sorting.
+        self._ids_ascending = bool(np.all(np.diff(self._ids[:self._length]) > 0))
+
+    def __len__(self):
+        return self._length
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self._ids[:self._length]
+
+    def column(self, name: str) -> np.ndarray:
+        if name not in self._arrays:
+            raise MovieColumnsException(f'Unknown movie column {name}')
+        return self._arrays[name][:self._length]
+
+    def appended(self, movies: List[Movie]):
+        length = self._length + len(movies)
+        ids = self._ids
+        arrays = self._arrays
+        if length > len(ids):
+            # Grow geometrically so that appending one movie at a time stays amortized O(1).
+            capacity = max(length, 2 * len(ids), 1024)
+            ids = _grown(ids, capacity, self._length)
+            arrays = {name: _grown(array, capacity, self._length) for name, array in arrays.items()}
+
+        ids[self._length:length] = [movie.id for movie in movies]
+        for name, read in COLUMNS.items():
+            arrays[name][self._length:length] = [_as_float(read(movie)) for movie in movies]
+
+        appended = MovieColumns.__new__(MovieColumns)
+        appended._ids = ids
+        appended._arrays = arrays
+        appended._length = length
+        new_ids = ids[self._length:length]
+        appended._ids_ascending = self._ids_ascending and bool(np.all(np.diff(new_ids) > 0)) and (
+            self._length == 0 or len(movies) == 0 or ids[self._length - 1] < new_ids[0])
+        return appended
+
+    def updated(self, changed: List[Movie], removed_ids: List[int] = ()):
+        """ Returns a new view in which the rows of changed movies are rewritten and those of removed_ids dropped.
+
+        Unlike appended(), this copies the columns, so any view may be updated.
+        """
+        if len(changed) + len(removed_ids) == 0:
+            return self
+        ids = self.ids.copy()
+        arrays = {name: self.column(name).copy() for name in self._arrays}
+        if len(changed) > 0:
+            ordinals = self._ordinals_of([movie.id for movie in changed])
+            for name, read in COLUMNS.items():
+                arrays[name][ordinals] = [_as_float(read(movie)) for movie in changed]
+        if len(removed_ids) > 0:
+            keep = np.ones(len(ids), dtype=bool)
+            keep[self._ordinals_of(removed_ids)] = False
+            ids = ids[keep]
+            arrays = {name: array[keep] for name, array in arrays.items()}
+        return MovieColumns(ids, arrays)
+
+    def _ordinals_of(self, movie_ids: List[int]) -> np.ndarray:
+        ordinals, known = self._lookup(movie_ids)
+        if not np.all(known):
+            raise MovieColumnsException('Unknown movie id among the updated movies')
+        return ordinals
+
+    def _lookup(self, movie_ids) -> tuple:
+        # The ordinal of each of movie_ids, and whether each is in the columns; unknown ids get an arbitrary ordinal.
+        ids = self.ids
+        order = None if self._ids_ascending else np.argsort(ids, kind='stable')
+        sorted_ids = ids if order is None else ids[order]
+        targets = np.asarray(movie_ids, dtype=ids.dtype)
+        if len(sorted_ids) == 0:
+            return np.zeros(len(targets), dtype=np.intp), np.zeros(len(targets), dtype=bool)
+        positions = np.minimum(np.searchsorted(sorted_ids, targets), len(sorted_ids) - 1)
+        known = sorted_ids[positions] == targets
+        return (positions if order is None else order[positions]), known
+
+    def select(self, predicate, among: List[int] = None) -> List[int]:
+        """ Returns the ascending ids of the movies that satisfy predicate, or of those among the ascending ids of
+        among, which is cheaper than intersecting the two lists when among is much shorter than the catalogue. Ids of
+        among that aren't in the columns, e.g. of movies removed since among was read, are left out.
+        """
+        mask = predicate.mask(self)
+        if among is not None:
+            among = np.fromiter(among, dtype=self._ids.dtype, count=len(among))
+            ordinals, known = self._lookup(among)
+            return among[known][mask[ordinals[known]]].tolist()
+        ids = self.ids[mask]
+        if not self._ids_ascending:
+            ids = np.sort(ids)
+        return ids.tolist()
+
+    def count(self, predicate) -> int:
+        return int(np.count_nonzero(predicate.mask(self)))
+
+
+def _grown(array: np.ndarray, capacity: int, length: int) -> np.ndarray:
+    grown = np.empty(capacity, dtype=array.dtype)
+    grown[:length] = array[:length]
+    return grown
+
+
+def _as_float(value) -> float:
+    return np.nan if value is None else float(value)
+
+
+# ============================================
+# Predicates over movie columns
+# ============================================
+
+class Predicate:
+    """ A condition on movie columns; combine predicates with &, | and ~. """
+
+    def mask(self, columns: MovieColumns) -> np.ndarray:
+        raise NotImplementedError
+
+    def __and__(self, other):
+        return And(self, other)
+
+    def __or__(self, other):
+        return Or(self, other)
+
+    def __invert__(self):
+        return Not(self)
+
+
+class Between(Predicate):
+    # low <= column <= high; either bound may be None. Movies missing the value never match.
+
+    def __init__(self, column: str, low=None, high=None):
+        self.column = column
+        self.low = low
+        self.high = high
+
+    def mask(self, columns: MovieColumns) -> np.ndarray:
+        values = columns.column(self.column)
+        mask = ~np.isnan(values)
+        if self.low is not None:
+            mask &= values >= self.low
+        if self.high is not None:
+            mask &= values <= self.high
+        return mask
+
+    def __repr__(self):
+        return f'Between({self.column!r}, {self.low!r}, {self.high!r})'
+
+
+class Equals(Predicate):
+
+    def __init__(self, column: str, value):
+        self.column = column
+        self.value = value
+
+    def mask(self, columns: MovieColumns) -> np.ndarray:
+        return columns.column(self.column) == self.value
+
+    def __repr__(self):
+        return f'Equals({self.column!r}, {self.value!r})'
+
+
+class OneOf(Predicate):
+
+    def __init__(self, column: str, values):
+        self.column = column
+        self.values = list(values)
+
+    def mask(self, columns: MovieColumns) -> np.ndarray:
+        return np.isin(columns.column(self.column), self.values)
+
+    def __repr__(self):
+        return f'OneOf({self.column!r}, {self.values!r})'
+
+
+class And(Predicate):
+
+    def __init__(self, *predicates: Predicate):
+        self.predicates = predicates
+
+    def mask(self, columns: MovieColumns) -> np.ndarray:
+        mask = self.predicates[0].mask(columns)
+        for predicate in self.predicates[1:]:
+            mask &= predicate.mask(columns)
+        return mask
+
+    def __repr__(self):
+        return 'And(' + ', '.join(repr(predicate) for predicate in self.predicates) + ')'
+
+
+class Or(Predicate):
+
+    def __init__(self, *predicates: Predicate):
+        self.predicates = predicates
+
+    def mask(self, columns: MovieColumns) -> np.ndarray:
+        mask = self.predicates[0].mask(columns)
+        for predicate in self.predicates[1:]:
+            mask |= predicate.mask(columns)
+        return mask
+
+    def __repr__(self):
+        return 'Or(' + ', '.join(repr(predicate) for predicate in self.predicates) + ')'
+
+
+class Not(Predicate):
+
+    def __init__(self, predicate: Predicate):
+        self.predicate = predicate
+
+    def mask(self, columns: MovieColumns) -> np.ndarray:
+        return ~self.predicate.mask(columns)
+
+    def __repr__(self):
+        return f'Not({self.predicate!r})'
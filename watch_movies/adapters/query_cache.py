@@ -0,0 +1,212 @@
+import threading
+import time
+from collections import OrderedDict
+
+import watch_movies.adapters.repository as repo
+from watch_movies.adapters.movie_columns import Predicate
+from watch_movies.adapters.repository import AbstractRepository
+from watch_movies.adapters.repository_proxy import RepositoryProxy
+from watch_movies.adapters.sizing import deep_size
+
+
+# Repository reads whose results depend only on the catalogue, and so stay valid until the catalogue changes. The
+# genre, actor and director lists aren't cached: returning a copy of a cached list costs as much as reading them.
+CACHED_METHODS = frozenset({'get_movie_ids_for_actor', 'get_movie_ids_for_genre', 'get_movie_ids_for_director',
+                            'get_movie_ids_for_title_word', 'get_movie_ids_matching', 'get_movies_by_year'})
+
+MAX_ENTRIES = 10000
+MAX_BYTES = 32 * 1024 * 1024
+
+_VALUE_TYPES = (int, str, float, bool, type(None))
+
+
+class _Entry:
+    __slots__ = ('result', 'version', 'size', 'expires')
+
+    def __init__(self, result, version, size: int, expires: float):
+        self.result = result
+        self.version = version
+        self.size = size
+        self.expires = expires
+
+
+class _Flight:
+    # A computation in progress, which callers asking for the same key wait for instead of repeating it.
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class QueryCache:
+    """ A thread-safe LRU cache of query results, bounded by number of entries and by their estimated size.
+
+    Each entry records the catalogue version it was computed at, and is only returned to callers asking at that
+    version, so results are never served stale after the catalogue changes; entries of older versions are evicted
+    as they reach the end of the LRU order. Entries also expire ttl seconds after they were stored, when ttl is set.
+
+    get_or_compute() computes a missing result once however many threads ask for it at the same time: the first
+    computes it, the others wait for its result.
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, max_bytes: int = MAX_BYTES, ttl: float = None,
+                 clock=time.monotonic):
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._flights = dict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def entries(self) -> int:
+        return len(self._entries)
+
+    @property
+    def bytes(self) -> int:
+        return self._bytes
+
+    def get_or_compute(self, key, version, compute):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.version == version and (self._ttl is None or entry.expires > self._clock()):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry.result
+                self._remove(key)
+            flight = self._flights.get((key, version))
+            leader = flight is None
+            if leader:
+                flight = self._flights[(key, version)] = _Flight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = compute()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[(key, version)]
+            flight.done.set()
+        self._store(key, version, flight.result)
+        return flight.result
+
+    def _store(self, key, version, result):
+        # Measured outside the lock; a result too large for the whole cache isn't kept.
+        size = deep_size(result)
+        if size > self._max_bytes:
+            return
+        expires = self._clock() + self._ttl if self._ttl is not None else float('inf')
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(result, version, size, expires)
+            self._bytes += size
+            while len(self._entries) > self._max_entries or self._bytes > self._max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        self._bytes -= self._entries.pop(key).size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+class QueryCacheRepository(RepositoryProxy):
+    """ Wraps any repository and caches the results of its catalogue queries (CACHED_METHODS) across requests.
+
+    Results are keyed by method and arguments, and are valid for the wrapped repository's catalogue_version (its
+    version, if it has none): adding, changing or removing movies starts a new version, while user and review writes
+    leave cached results in place. Calls with arguments that can't be keyed by value are passed through. List
+    results are copied when returned, so a caller changing one doesn't change the cached result.
+    """
+
+    def __init__(self, repository: AbstractRepository, cache: QueryCache):
+        super().__init__(repository)
+        self._cache = cache
+
+    @property
+    def cache(self) -> QueryCache:
+        return self._cache
+
+    def _call(self, name: str, args: tuple, kwargs: dict):
+        key = _key(name, args, kwargs) if name in CACHED_METHODS else None
+        if key is None:
+            return super()._call(name, args, kwargs)
+        repository = self._repository
+        version = getattr(repository, 'catalogue_version', None)
+        if version is None:
+            version = getattr(repository, 'version', None)
+        result = self._cache.get_or_compute(key, version, lambda: getattr(repository, name)(*args, **kwargs))
+        return list(result) if type(result) is list else result
+
+
+def _key(name: str, args: tuple, kwargs: dict):
+    # Returns a key identifying the call by value, or None when an argument can't be compared by value.
+    if not kwargs and all(type(value) is str for value in args):
+        # The common case, a lookup by name.
+        return (name,) + args
+    values = [name]
+    for value in list(args) + [item for pair in sorted(kwargs.items()) for item in pair]:
+        if isinstance(value, _VALUE_TYPES):
+            values.append((type(value), value))
+        elif isinstance(value, Predicate):
+            # Predicates describe their whole condition in their repr.
+            values.append((Predicate, repr(value)))
+        else:
+            return None
+    return tuple(values)
+
+
+def init_query_cache(app):
+    """ Wraps the repository to cache the results of catalogue queries across requests, as configured by
+    QUERY_CACHE_MAX_ENTRIES, QUERY_CACHE_MAX_BYTES and QUERY_CACHE_TTL. The cache's hits, misses, coalesced calls,
+    evictions, entries and size are reported through /metrics.
+    """
+    ttl = app.config.get('QUERY_CACHE_TTL')
+    cache = QueryCache(int(app.config.get('QUERY_CACHE_MAX_ENTRIES') or MAX_ENTRIES),
+                       int(app.config.get('QUERY_CACHE_MAX_BYTES') or MAX_BYTES),
+                       float(ttl) if ttl else None)
+    repo.repo_instance = QueryCacheRepository(repo.repo_instance, cache)
+    app.extensions['query_cache'] = cache
+
+    registry = app.extensions['metrics']
+    metrics = (('query_cache_hits_total', 'counter', 'Catalogue queries answered from the query cache.', 'hits'),
+               ('query_cache_misses_total', 'counter', 'Catalogue queries computed by the repository.', 'misses'),
+               ('query_cache_coalesced_total', 'counter',
+                'Catalogue queries that waited for the same query already being computed.', 'coalesced'),
+               ('query_cache_evictions_total', 'counter', 'Entries evicted from the full query cache.', 'evictions'),
+               ('query_cache_entries', 'gauge', 'Entries held by the query cache.', 'entries'),
+               ('query_cache_bytes', 'gauge', 'Estimated size of the query cache entries.', 'bytes'))
+
+    def collect() -> str:
+        text = ''
+        for name, metric_type, help_text, attribute in metrics:
+            text += f'# HELP {name} {help_text}\n# TYPE {name} {metric_type}\n{name} {getattr(cache, attribute)}\n'
+        return text
+
+    registry.add_collector(collect)
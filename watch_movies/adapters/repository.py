@@ -19,6 +19,14 @@ class AbstractRepository(abc.ABC):
         """" Adds a User to the repository. """
         raise NotImplementedError
 
+    def add_users(self, users: List[User]):
+        """ Adds a batch of users to the repository.
+
+        Implementations that can store a batch more cheaply than one user at a time should override this.
+        """
+        for user in users:
+            self.add_user(user)
+
     @abc.abstractmethod
     def get_user(self, username) -> User:
         """ Returns the User named username from the repository.
@@ -32,6 +40,14 @@ class AbstractRepository(abc.ABC):
         """ Adds a movie to the repository. """
         raise NotImplementedError
 
+    def add_movies(self, movies: List[Movie]):
+        """ Adds a batch of movies to the repository.
+
+        Implementations that can index a batch more cheaply than one movie at a time should override this.
+        """
+        for movie in movies:
+            self.add_movie(movie)
+
     @abc.abstractmethod
     def get_movie(self, id: int) -> Movie:
         """ Returns movie with id from the repository.
@@ -47,6 +63,16 @@ class AbstractRepository(abc.ABC):
         """
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def get_movie_ids_matching(self, predicate, among: List[int] = None) -> List[int]:
+        """ Returns the ascending ids of the movies whose numeric attributes satisfy predicate.
+
+        predicate is built from the classes in watch_movies.adapters.movie_columns, e.g.
+        Between('year', 2010, 2016) & Between('rating', 7.5). When among (ascending ids of movies in the repository)
+        is given, only those movies are considered. If no movies match, this method returns an empty list.
+        """
+        raise NotImplementedError
+
     @abc.abstractmethod
     def get_number_of_movies(self):
         """ Returns the number of watch_movies in the repository. """
@@ -96,6 +122,13 @@ class AbstractRepository(abc.ABC):
         """
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def get_movie_ids_for_title_word(self, word: str):
+        """ Returns the ascending ids of the movies whose title contains word, compared case-insensitively.
+        If no title contains word, this method returns an empty list.
+        """
+        raise NotImplementedError
+
     @abc.abstractmethod
     def get_id_of_previous_movie(self, movie: Movie):
         """ Returns the id of an Article that immediately precedes article.
@@ -131,11 +164,35 @@ class AbstractRepository(abc.ABC):
         If the review doesn't have bidirectional links with an movie and a User, this method raises a
         RepositoryException and doesn't update the repository.
         """
-        if review.user is None or review not in review.user.reviews:
+        # Searched from the end, where make_review() has just attached the review.
+        if review.user is None or review not in reversed(review.user.reviews):
             raise RepositoryException('Review not correctly attached to a User')
-        if review.movie is None or review not in review.movie.reviews:
+        if review.movie is None or review not in reversed(review.movie.reviews):
             raise RepositoryException('Review not correctly attached to a Movie')
 
+    def add_reviews(self, reviews: List[Review]):
+        """ Adds a batch of reviews to the repository.
+
+        Implementations that can store a batch more cheaply than one review at a time should override this.
+        """
+        for review in reviews:
+            self.add_review(review)
+
+    def add_to_watchlist(self, user: User, movies: List[Movie]) -> int:
+        """ Adds movies to the user's watchlist, skipping those already in it, and returns the number added.
+
+        Implementations that record users' changes should override this.
+        """
+        return sum(user.add_to_watchlist(movie) for movie in movies)
+
+    def remove_from_watchlist(self, user: User, movie_ids: List[int]) -> int:
+        """ Removes the movies with the given ids from the user's watchlist, and returns the number removed. """
+        return sum(user.remove_from_watchlist(movie_id) for movie_id in movie_ids)
+
+    def add_watched_movie(self, user: User, movie: Movie):
+        """ Records that the user has watched movie, once more. """
+        user.watch_movie(movie)
+
     @abc.abstractmethod
     def get_reviews(self):
         """ Returns the reviews stored in the repository. """
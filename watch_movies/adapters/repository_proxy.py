@@ -0,0 +1,47 @@
+from watch_movies.adapters.repository import AbstractRepository
+
+
+# The public methods of the repository interface, including non-abstract ones such as add_movies.
+REPOSITORY_METHODS = sorted(name for name, value in vars(AbstractRepository).items()
+                            if callable(value) and not name.startswith('_'))
+
+
+class RepositoryProxy(AbstractRepository):
+    """ A repository that forwards every call to a wrapped repository.
+
+    Subclasses add behaviour around the calls, e.g. measuring or caching them, by overriding _call(). Attributes that
+    aren't part of AbstractRepository (such as MemoryRepository.snapshot) are read from the wrapped repository, so a
+    proxy can stand in for the repository it wraps.
+    """
+
+    def __init__(self, repository: AbstractRepository):
+        self._repository = repository
+
+    @property
+    def repository(self) -> AbstractRepository:
+        return self._repository
+
+    def _call(self, name: str, args: tuple, kwargs: dict):
+        return getattr(self._repository, name)(*args, **kwargs)
+
+    def __getattr__(self, name):
+        # Only called for attributes not found on the proxy itself.
+        if name == '_repository':
+            raise AttributeError(name)
+        return getattr(self._repository, name)
+
+
+def _forwarding_method(name: str):
+    def method(self, *args, **kwargs):
+        return self._call(name, args, kwargs)
+
+    method.__name__ = name
+    method.__doc__ = getattr(AbstractRepository, name).__doc__
+    return method
+
+
+for _name in REPOSITORY_METHODS:
+    setattr(RepositoryProxy, _name, _forwarding_method(_name))
+
+# Every abstract method now has a forwarding implementation.
+RepositoryProxy.__abstractmethods__ = frozenset()
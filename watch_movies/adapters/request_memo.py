@@ -0,0 +1,99 @@
+from typing import Callable
+
+from flask import g, has_request_context
+
+import watch_movies.adapters.repository as repo
+from watch_movies.adapters.repository import AbstractRepository
+from watch_movies.adapters.repository_proxy import RepositoryProxy
+
+
+# Arguments of these types are compared by value in memo keys; any other argument (a Movie, a predicate) is only
+# the same argument if it is the same object.
+_VALUE_TYPES = (int, str, float, bool, type(None))
+
+
+class RequestMemo:
+    # The results memoized for one request, and how often they were reused.
+
+    __slots__ = ('results', 'version', 'hits', 'misses')
+
+    def __init__(self):
+        self.results = dict()
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+
+
+class RequestMemoRepository(RepositoryProxy):
+    """ Wraps any repository and memoizes its read methods (those named get_...) for the duration of a request.
+
+    scope() returns the RequestMemo of the request in progress, or None outside of requests, when calls are passed
+    straight through. Any other method called within the request (a write, such as add_review) clears the request's
+    memo, as does a change of the repository's version made elsewhere, so a request always reads its own writes.
+    List results are copied when reused, so a caller changing one doesn't change what the next caller gets.
+    """
+
+    def __init__(self, repository: AbstractRepository, scope: Callable[[], RequestMemo]):
+        super().__init__(repository)
+        self._scope = scope
+
+    def _call(self, name: str, args: tuple, kwargs: dict):
+        memo = self._scope()
+        if memo is None:
+            return super()._call(name, args, kwargs)
+        if not name.startswith('get_'):
+            memo.results.clear()
+            return super()._call(name, args, kwargs)
+
+        version = getattr(self._repository, 'version', None)
+        if version != memo.version:
+            memo.results.clear()
+            memo.version = version
+        key = (name, _key(args), _key(tuple(sorted(kwargs.items()))))
+        entry = memo.results.get(key)
+        if entry is None:
+            memo.misses += 1
+            # The arguments are kept with the result, so that objects keyed by id() stay alive for the request.
+            entry = memo.results[key] = (super()._call(name, args, kwargs), args, kwargs)
+        else:
+            memo.hits += 1
+        result = entry[0]
+        return list(result) if isinstance(result, list) else result
+
+
+def _key(value):
+    if isinstance(value, _VALUE_TYPES):
+        return value
+    if isinstance(value, (tuple, list)):
+        return type(value), tuple(_key(item) for item in value)
+    return type(value), id(value)
+
+
+def _request_memo():
+    if not has_request_context():
+        return None
+    memo = g.get('repository_memo')
+    if memo is None:
+        memo = g.repository_memo = RequestMemo()
+    return memo
+
+
+def init_request_memo(app):
+    """ Wraps the repository to memoize its read methods within each request.
+
+    The hits and misses are counted in /metrics and, in debug mode, in each response's X-Repository-Memo header.
+    """
+    repo.repo_instance = RequestMemoRepository(repo.repo_instance, _request_memo)
+    registry = app.extensions['metrics']
+    registry.describe('repository_memo_hits_total', 'counter', 'Repository calls answered from the request memo.')
+    registry.describe('repository_memo_misses_total', 'counter', 'Repository read calls made by requests.')
+
+    @app.after_request
+    def count_memo_hits(response):
+        memo = g.get('repository_memo')
+        if memo is not None:
+            registry.increment('repository_memo_hits_total', amount=memo.hits)
+            registry.increment('repository_memo_misses_total', amount=memo.misses)
+            if app.debug:
+                response.headers['X-Repository-Memo'] = f'hits={memo.hits}, misses={memo.misses}'
+        return response
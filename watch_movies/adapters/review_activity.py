@@ -0,0 +1,86 @@
+import threading
+from bisect import bisect_left, insort
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from watch_movies.adapters.memory_repository import RepositoryObserver
+from watch_movies.domain.model import Review
+
+
+FEED_SIZE = 1000
+
+# A position in a list of reviews: the timestamp of a review, and the order it was added in among reviews with the
+# same timestamp.
+Cursor = Tuple[datetime, int]
+
+
+class ReviewActivity(RepositoryObserver):
+    """ The reviews most recently written on the site, and every review of each user, newest first.
+
+    Reviews are kept as (timestamp, sequence, review) entries ordered by timestamp, sequence being the order reviews
+    were added in, which tells apart reviews written at the same time. The site-wide feed keeps the feed_size
+    latest reviews in a ring buffer, which forgets the oldest as new ones arrive; each user's history keeps all of
+    their reviews. Reviews normally arrive in timestamp order and are appended; a review replayed or imported out
+    of order is inserted in its place.
+
+    Pages are read backwards from a cursor, the (timestamp, sequence) of the last review of the previous page, found
+    by binary search: a page costs O(log n + page size), however long the feed or history.
+    """
+
+    def __init__(self, feed_size: int = FEED_SIZE):
+        self._lock = threading.Lock()
+        self._sequence = 0
+        self._feed = deque(maxlen=feed_size)
+        self._histories: Dict[str, list] = dict()
+
+    @property
+    def feed_size(self) -> int:
+        return self._feed.maxlen
+
+    def reviews_added(self, reviews: List[Review]):
+        with self._lock:
+            for review in reviews:
+                self._sequence += 1
+                entry = (review.timestamp, self._sequence, review)
+                self._add_to_feed(entry)
+                if review.user is not None:
+                    history = self._histories.get(review.user.username)
+                    if history is None:
+                        history = self._histories[review.user.username] = list()
+                    if len(history) == 0 or history[-1][:2] < entry[:2]:
+                        history.append(entry)
+                    else:
+                        insort(history, entry)
+
+    def _add_to_feed(self, entry: tuple):
+        feed = self._feed
+        if len(feed) == 0 or feed[-1][:2] < entry[:2]:
+            feed.append(entry)
+            return
+        if len(feed) == feed.maxlen:
+            if entry[:2] < feed[0][:2]:
+                # Older than the whole feed.
+                return
+            feed.popleft()
+        feed.insert(bisect_left(feed, entry[:2]), entry)
+
+    def recent_reviews(self, cursor: Optional[Cursor], limit: int) -> Tuple[List[Review], Optional[Cursor]]:
+        """ A page of the latest reviews older than cursor (the latest if None), and the cursor of the next page. """
+        with self._lock:
+            return _page(self._feed, cursor, limit)
+
+    def user_reviews(self, username: str, cursor: Optional[Cursor],
+                     limit: int) -> Tuple[List[Review], Optional[Cursor]]:
+        """ A page of the user's reviews older than cursor, newest first, and the cursor of the next page. """
+        with self._lock:
+            return _page(self._histories.get(username, ()), cursor, limit)
+
+
+def _page(entries, cursor: Optional[Cursor], limit: int) -> Tuple[List[Review], Optional[Cursor]]:
+    # The reviews of the limit entries before cursor in entries, ordered by (timestamp, sequence), latest first.
+    end = len(entries) if cursor is None else bisect_left(entries, cursor)
+    start = max(0, end - limit)
+    page = [entries[index] for index in range(end - 1, start - 1, -1)]
+    next_cursor = page[-1][:2] if start > 0 else None
+    return [review for _, _, review in page], next_cursor
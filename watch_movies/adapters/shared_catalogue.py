@@ -0,0 +1,432 @@
+import json
+import mmap
+import os
+import struct
+import threading
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Iterator, List
+
+import numpy as np
+
+from watch_movies.adapters.memory_repository import MemoryRepository, populate, title_words
+from watch_movies.adapters.movie_columns import COLUMNS, MovieColumns, Predicate, Equals
+from watch_movies.adapters.repository import RepositoryException
+from watch_movies.domain.model import Director, Genre, Movie, Actor, Review
+
+
+MAGIC = b'WMCAT003'
+
+# Movies without reviews kept materialized, least recently used first evicted.
+CACHE_SIZE = 10000
+
+# Kinds of named entity with posting lists, and how to read a name from the entity.
+_ENTITY_KINDS = {
+    'actor': lambda movie: [actor.actor_full_name for actor in movie.actors],
+    'genre': lambda movie: [genre.genre_name for genre in movie.genres],
+    'director': lambda movie: [movie.director.director_full_name] if movie.director is not None else []
+}
+
+# Kinds of name with posting lists only, which aren't read back into movies.
+_INDEX_KINDS = {
+    'title_word': lambda movie: title_words(movie.title)
+}
+
+
+class SharedCatalogue:
+    """ A read-only, columnar copy of the movie catalogue in a memory-mapped file.
+
+    Every column is a flat array, and every string is stored in a UTF-8 heap indexed by an offsets column, so a
+    process that opens the file reads the columns in place: nothing is copied or unpickled, and all processes mapping
+    the same file share its pages. Movie objects are only materialized when a movie is actually requested. Movies
+    with reviews are pinned (see pin()) and kept for the lifetime of the catalogue, so that reviews attach to a single
+    object per movie; the cache_size most recently used other movies are kept too, and older ones are evicted and
+    built again when next requested, so that browsing the whole catalogue doesn't copy it into every process.
+
+    Movies are stored in ascending id order; their position in that order is their ordinal.
+    """
+
+    def __init__(self, path: str, cache_size: int = CACHE_SIZE):
+        self._path = path
+        with open(path, 'rb') as infile:
+            self._mmap = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise RepositoryException(f'{path} is not a movie catalogue')
+        table_length, data_start = struct.unpack_from('<QQ', self._mmap, len(MAGIC))
+        table_start = len(MAGIC) + 16
+        table = json.loads(self._mmap[table_start:table_start + table_length])
+
+        self._view = memoryview(self._mmap)
+        self._columns = dict()
+        for name, (offset, typecode, length) in table.items():
+            start = data_start + offset
+            itemsize = array(typecode).itemsize
+            self._columns[name] = self._view[start:start + length * itemsize].cast(typecode)
+
+        self._ids = self._columns['ids']
+        self._lock = threading.Lock()
+        # Materialized movies by ordinal: those pinned, and the others in least recently used order.
+        self._pinned = dict()
+        self._recent = OrderedDict()
+        self._cache_size = cache_size
+
+        # NumPy arrays over the numeric columns, reading the mapped pages in place.
+        self._movie_columns = MovieColumns(
+            np.asarray(self._ids),
+            {name: np.asarray(self._columns['column_' + name]) for name in COLUMNS}
+        )
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def __len__(self):
+        return len(self._ids)
+
+    @property
+    def movie_columns(self) -> MovieColumns:
+        return self._movie_columns
+
+    def close(self):
+        self._movie_columns = None
+        self._ids = None
+        try:
+            # The mapping can only be closed once no views of it remain. If arrays over it are still referenced
+            # elsewhere, it is unmapped when the last of them is garbage collected instead.
+            for column in self._columns.values():
+                column.release()
+            self._view.release()
+            self._mmap.close()
+        except BufferError:
+            pass
+        self._columns = dict()
+
+    # Reads that never materialize movies.
+
+    def ordinal_of(self, movie_id: int):
+        index = bisect_left(self._ids, movie_id)
+        if index < len(self._ids) and self._ids[index] == movie_id:
+            return index
+        return None
+
+    def ids(self):
+        return self._ids.tolist()
+
+    def ordinals_in_title_order(self):
+        return self._columns['title_order']
+
+    def movie_ids_for(self, kind: str, name: str) -> List[int]:
+        index = self._find_name(kind, name)
+        if index is None:
+            return list()
+        offsets = self._columns[kind + '_posting_offsets']
+        return self._columns[kind + '_postings'][offsets[index]:offsets[index + 1]].tolist()
+
+    def title(self, ordinal: int) -> str:
+        return self._string('titles', ordinal)
+
+    def release_year(self, ordinal: int) -> int:
+        return self._columns['years'][ordinal]
+
+    # Movie materialization.
+
+    def movie_at(self, ordinal: int) -> Movie:
+        movie = self._pinned.get(ordinal)
+        if movie is not None:
+            return movie
+        with self._lock:
+            movie = self._recent.get(ordinal)
+            if movie is not None:
+                self._recent.move_to_end(ordinal)
+                return movie
+        built = self._build_movie(ordinal)
+        with self._lock:
+            # Keep the first object if two threads materialized the same movie.
+            movie = self._pinned.get(ordinal) or self._recent.get(ordinal)
+            if movie is not None:
+                return movie
+            self._recent[ordinal] = built
+            if len(self._recent) > self._cache_size:
+                evicted_ordinal, evicted = self._recent.popitem(last=False)
+                if len(evicted.reviews) > 0:
+                    # Reviewed since it was materialized, but not pinned yet.
+                    self._pinned[evicted_ordinal] = evicted
+            return built
+
+    def get_movie(self, movie_id: int) -> Movie:
+        ordinal = self.ordinal_of(movie_id)
+        return self.movie_at(ordinal) if ordinal is not None else None
+
+    def transient_movie_at(self, ordinal: int) -> Movie:
+        # The movie at ordinal, built without keeping it when it hasn't been materialized, e.g. to export every movie.
+        movie = self._pinned.get(ordinal) or self._recent.get(ordinal)
+        return movie if movie is not None else self._build_movie(ordinal)
+
+    def materialized_movies(self) -> List[Movie]:
+        with self._lock:
+            return list(self._pinned.values()) + list(self._recent.values())
+
+    def pin(self, movie: Movie) -> Movie:
+        """ Keeps movie, a movie of this catalogue, materialized for the lifetime of the catalogue, e.g. once reviewed.
+
+        Returns the object kept for the movie: movie itself, unless another object was pinned for it first (when
+        movie was evicted and materialized again in between), in which case callers move what they attached to
+        movie onto the returned object.
+        """
+        ordinal = self.ordinal_of(movie.id)
+        if ordinal is None:
+            return movie
+        with self._lock:
+            kept = self._pinned.get(ordinal)
+            if kept is None:
+                self._recent.pop(ordinal, None)
+                kept = self._pinned[ordinal] = movie
+            return kept
+
+    def _build_movie(self, ordinal: int) -> Movie:
+        columns = self._columns
+        movie = Movie(self.title(ordinal), columns['years'][ordinal])
+        movie.add_id(self._ids[ordinal])
+        movie.description = self._string('descriptions', ordinal)
+
+        runtime_minutes = columns['column_runtime'][ordinal]
+        if runtime_minutes == runtime_minutes:
+            # Not NaN, i.e. not missing.
+            movie.runtime_minutes = int(runtime_minutes)
+        movie.rating = _optional(columns['column_rating'][ordinal], float)
+        movie.votes = _optional(columns['column_votes'][ordinal], int)
+        movie.revenue_millions = _optional(columns['column_revenue'][ordinal], float)
+        movie.metascore = _optional(columns['column_metascore'][ordinal], int)
+
+        director = columns['directors'][ordinal]
+        if director >= 0:
+            movie.set_director(Director(self._string('director_names', director)))
+
+        offsets = columns['movie_genre_offsets']
+        for genre in columns['movie_genres'][offsets[ordinal]:offsets[ordinal + 1]]:
+            movie.add_genre(Genre(self._string('genre_names', genre)))
+
+        offsets = columns['movie_actor_offsets']
+        for actor in columns['movie_actors'][offsets[ordinal]:offsets[ordinal + 1]]:
+            movie.add_actor(Actor(self._string('actor_names', actor)))
+
+        return movie
+
+    def _string(self, heap: str, index: int) -> str:
+        offsets = self._columns[heap + '_offsets']
+        return bytes(self._columns[heap][offsets[index]:offsets[index + 1]]).decode('utf-8')
+
+    def _find_name(self, kind: str, name: str):
+        # Names are stored sorted by their UTF-8 encoding, so they can be binary searched as bytes.
+        target = name.encode('utf-8')
+        offsets = self._columns[kind + '_names_offsets']
+        names = self._columns[kind + '_names']
+        low, high = 0, len(offsets) - 1
+        while low < high:
+            middle = (low + high) // 2
+            if bytes(names[offsets[middle]:offsets[middle + 1]]) < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(offsets) - 1 and bytes(names[offsets[low]:offsets[low + 1]]) == target:
+            return low
+        return None
+
+
+def write_catalogue(movies: List[Movie], path: str):
+    """ Writes movies to a catalogue file at path.
+
+    The file is written next to path and renamed into place, so processes opening path always see a complete
+    catalogue, and a catalogue can be replaced while others still have the previous one mapped.
+    """
+    movies = sorted(movies, key=lambda movie: movie.id)
+    columns = dict()
+
+    columns['ids'] = array('i', (movie.id for movie in movies))
+    columns['years'] = array('i', (movie.release_year or 0 for movie in movies))
+    title_order = sorted(range(len(movies)), key=lambda ordinal: movies[ordinal])
+    columns['title_order'] = array('i', title_order)
+    _add_heap(columns, 'titles', [movie.title or '' for movie in movies])
+    _add_heap(columns, 'descriptions', [movie.description or '' for movie in movies])
+    for name, read in COLUMNS.items():
+        columns['column_' + name] = array('d', (float('nan') if read(movie) is None else read(movie) for movie in movies))
+
+    for kind, names_of in _INDEX_KINDS.items():
+        _add_postings(columns, kind, movies, names_of)
+    for kind, names_of in _ENTITY_KINDS.items():
+        name_index = _add_postings(columns, kind, movies, names_of)
+        if kind == 'director':
+            directors = array('i')
+            for movie in movies:
+                director_names = [name for name in names_of(movie) if name is not None]
+                directors.append(name_index[director_names[0]] if len(director_names) > 0 else -1)
+            columns['directors'] = directors
+        else:
+            offsets = array('Q', [0])
+            values = array('i')
+            for movie in movies:
+                values.extend(name_index[name] for name in names_of(movie) if name is not None)
+                offsets.append(len(values))
+            columns[f'movie_{kind}_offsets'] = offsets
+            columns[f'movie_{kind}s'] = values
+
+    # Lay the columns out after the header, each at an offset (relative to the data start) aligned to 8 bytes.
+    table = dict()
+    offset = 0
+    for name, column in columns.items():
+        table[name] = [offset, column.typecode, len(column)]
+        offset += _aligned(len(column) * column.itemsize)
+    encoded_table = json.dumps(table).encode('utf-8')
+    data_start = _aligned(len(MAGIC) + 16 + len(encoded_table))
+
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'wb') as outfile:
+        outfile.write(MAGIC)
+        outfile.write(struct.pack('<QQ', len(encoded_table), data_start))
+        outfile.write(encoded_table)
+        for name, column in columns.items():
+            outfile.seek(data_start + table[name][0])
+            column.tofile(outfile)
+        outfile.flush()
+        os.fsync(outfile.fileno())
+    os.replace(temporary_path, path)
+
+
+def build_catalogue(data_path: str, path: str):
+    # Load the movies in data_path, as populate() does, and write them to a catalogue file at path.
+    movies_repo = MemoryRepository()
+    populate(data_path, movies_repo)
+    write_catalogue(list(movies_repo.snapshot.movies), path)
+
+
+def _add_postings(columns: dict, kind: str, movies: List[Movie], names_of) -> dict:
+    # Adds the sorted names of kind and the ids of the movies of each; returns the index of each name.
+    postings = dict()
+    for movie in movies:
+        for name in names_of(movie):
+            if name is not None:
+                postings.setdefault(name, list()).append(movie.id)
+    names = sorted(postings, key=lambda name: name.encode('utf-8'))
+
+    _add_heap(columns, kind + '_names', names)
+    posting_offsets = array('Q', [0])
+    posting_ids = array('i')
+    for name in names:
+        posting_ids.extend(postings[name])
+        posting_offsets.append(len(posting_ids))
+    columns[kind + '_posting_offsets'] = posting_offsets
+    columns[kind + '_postings'] = posting_ids
+    return {name: index for index, name in enumerate(names)}
+
+
+def _add_heap(columns: dict, name: str, strings: List[str]):
+    offsets = array('Q', [0])
+    heap = bytearray()
+    for string in strings:
+        heap += string.encode('utf-8')
+        offsets.append(len(heap))
+    columns[name + '_offsets'] = offsets
+    columns[name] = array('B', heap)
+
+
+def _optional(value: float, number_type):
+    return None if value != value else number_type(value)
+
+
+def _aligned(length: int) -> int:
+    return (length + 7) // 8 * 8
+
+
+class SharedCatalogueRepository(MemoryRepository):
+    """ A MemoryRepository whose movies are read from a SharedCatalogue rather than held in memory.
+
+    Users and reviews are kept as by MemoryRepository. The catalogue is read-only: movies cannot be added.
+    """
+
+    def __init__(self, catalogue: SharedCatalogue):
+        super().__init__()
+        self._catalogue = catalogue
+        self._snapshot = self._snapshot.replace_catalogue(catalogue=catalogue)
+
+    @property
+    def catalogue(self) -> SharedCatalogue:
+        return self._catalogue
+
+    def add_movies(self, movies: List[Movie]):
+        raise RepositoryException('Movies cannot be added to a shared catalogue')
+
+    def add_review(self, review: Review):
+        super().add_review(review)
+        self._pin_movie_of(review)
+
+    def add_reviews(self, reviews: List[Review]):
+        super().add_reviews(reviews)
+        for review in reviews:
+            self._pin_movie_of(review)
+
+    def _pin_movie_of(self, review: Review):
+        # Reviews are held by the movie object, so it mustn't be evicted and built again. If another object was
+        # pinned for the movie since it was read, the review moves to that one.
+        movie = review.movie
+        kept = self._catalogue.pin(movie)
+        if kept is not movie:
+            movie.reviews[:] = [other for other in movie.reviews if other is not review]
+            kept.add_review(review)
+            review.movie = kept
+
+    def get_movie(self, id: int) -> Movie:
+        return self._catalogue.get_movie(id)
+
+    def get_movies_by_year(self, target_year: int) -> List[Movie]:
+        catalogue = self._catalogue
+        return [catalogue.get_movie(id) for id in catalogue.movie_columns.select(Equals('year', target_year))]
+
+    def get_movie_ids_matching(self, predicate: Predicate, among: List[int] = None) -> List[int]:
+        return self._catalogue.movie_columns.select(predicate, among)
+
+    def get_number_of_movies(self):
+        return len(self._catalogue)
+
+    def get_first_movie(self):
+        catalogue = self._catalogue
+        if len(catalogue) == 0:
+            return None
+        return catalogue.movie_at(catalogue.ordinals_in_title_order()[0])
+
+    def get_last_movie(self):
+        catalogue = self._catalogue
+        if len(catalogue) == 0:
+            return None
+        return catalogue.movie_at(catalogue.ordinals_in_title_order()[-1])
+
+    def get_movies_by_ids(self, id_list):
+        catalogue = self._catalogue
+        movies = [catalogue.get_movie(id) for id in id_list]
+        return [movie for movie in movies if movie is not None]
+
+    def iter_movies_in(self, snapshot) -> Iterator[Movie]:
+        # The catalogue snapshot was published with, so an export reads one version throughout.
+        catalogue = snapshot.catalogue
+        return (catalogue.transient_movie_at(ordinal) for ordinal in catalogue.ordinals_in_title_order())
+
+    def get_movie_ids_for_actor(self, actor_name: str):
+        return self._catalogue.movie_ids_for('actor', actor_name)
+
+    def get_movie_ids_for_genre(self, genre_name: str):
+        return self._catalogue.movie_ids_for('genre', genre_name)
+
+    def get_movie_ids_for_director(self, director_name: str):
+        return self._catalogue.movie_ids_for('director', director_name)
+
+    def get_movie_ids_for_title_word(self, word: str):
+        return self._catalogue.movie_ids_for('title_word', word.lower())
+
+    def get_id_of_next_movie(self, movie: Movie):
+        if movie is None or movie.id >= len(self._catalogue):
+            return None
+        return movie.id + 1
+
+    def movie_index(self, movie: Movie):
+        raise ValueError
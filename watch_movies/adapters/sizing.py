@@ -0,0 +1,64 @@
+import sys
+import types
+
+from watch_movies.domain.model import Movie, Review, User
+
+
+# Domain objects referenced from other domain objects are measured in their own collection, not as part of the
+# objects referencing them (a review doesn't include its movie).
+_ENTITY_TYPES = (Movie, User, Review)
+_ATOMIC_TYPES = (str, bytes, int, float, bool, complex, type(None))
+_SKIPPED_TYPES = (type, types.ModuleType, types.FunctionType, types.MethodType, types.BuiltinFunctionType)
+
+
+def deep_size(obj, seen: set = None) -> int:
+    """ Returns the size in bytes of obj and of the objects it references, each counted once.
+
+    References to movies, users and reviews other than obj itself aren't followed, nor are references to modules,
+    classes and functions. NumPy arrays count their buffer.
+    """
+    seen = seen if seen is not None else set()
+    size = 0
+    stack = [(obj, True)]
+    while stack:
+        current, is_root = stack.pop()
+        if id(current) in seen:
+            continue
+        if not is_root and isinstance(current, _ENTITY_TYPES):
+            continue
+        if isinstance(current, _SKIPPED_TYPES):
+            continue
+        seen.add(id(current))
+        size += sys.getsizeof(current)
+        if isinstance(current, _ATOMIC_TYPES):
+            continue
+
+        nbytes = getattr(current, 'nbytes', None)
+        if isinstance(nbytes, int) and hasattr(current, 'dtype'):
+            # A NumPy array: getsizeof only covers the buffer when the array owns it.
+            if getattr(current, 'base', None) is not None:
+                size += nbytes
+            continue
+
+        if isinstance(current, dict):
+            for key, value in current.items():
+                stack.append((key, False))
+                stack.append((value, False))
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend((item, False) for item in current)
+        else:
+            attributes = getattr(current, '__dict__', None)
+            if attributes is not None:
+                stack.append((attributes, False))
+            for slot in _slots(type(current)):
+                if hasattr(current, slot):
+                    stack.append((getattr(current, slot), False))
+    return size
+
+
+def _slots(cls) -> list:
+    slots = list()
+    for klass in cls.__mro__:
+        names = klass.__dict__.get('__slots__', ())
+        slots.extend([names] if isinstance(names, str) else names)
+    return slots
@@ -0,0 +1,132 @@
+import heapq
+import threading
+import time
+from typing import Dict, List, Set, Tuple
+
+from watch_movies.adapters.memory_repository import RepositoryObserver
+from watch_movies.domain.model import Review
+
+
+WINDOW_HOURS = 24
+SIZE = 10
+BUCKET_SECONDS = 3600
+
+
+class _Counter:
+    # The reviews of one movie in each bucket of the window, in a ring indexed by bucket number, and their total.
+    __slots__ = ('counts', 'total')
+
+    def __init__(self, buckets: int):
+        self.counts = [0] * buckets
+        self.total = 0
+
+
+class TrendingMovies(RepositoryObserver):
+    """ The movies with most reviews over the last window_hours, kept up to date as reviews are added.
+
+    Time is divided into buckets of bucket_seconds. Each reviewed movie has a ring of counters, one per bucket of the
+    window, and the window's total; each bucket records the movies reviewed in it, so that when the bucket leaves
+    the window only those movies' counters are cleared. A review is counted in the bucket of its timestamp, so
+    reviews replayed from the journal or imported count only if they are recent. Removed movies aren't forgotten
+    (a changed movie is reported as removed, then added, and keeps its reviews), so callers skip the ids of movies
+    that no longer exist; their counts leave with the window.
+
+    The size movies with the highest totals are kept in order: a review can only move its own movie up, so it
+    updates them in O(size), and they are recounted from the totals when a bucket leaves the window, at most once a
+    bucket. top() is O(size).
+    """
+
+    def __init__(self, window_hours: float = WINDOW_HOURS, size: int = SIZE, bucket_seconds: float = BUCKET_SECONDS,
+                 clock=time.time):
+        self._window_hours = window_hours
+        self._buckets = max(1, round(window_hours * 3600 / bucket_seconds))
+        self._size = size
+        self._bucket_seconds = bucket_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._counters: Dict[int, _Counter] = dict()
+        # The movies reviewed in each bucket of the window, indexed like the counters.
+        self._reviewed: List[Set[int]] = [set() for _ in range(self._buckets)]
+        self._current = self._bucket(clock())
+        # The most reviewed movies, as (total, movie id) pairs by descending total, then ascending id.
+        self._top: List[Tuple[int, int]] = list()
+
+    @property
+    def window_hours(self) -> float:
+        return self._window_hours
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def _bucket(self, seconds: float) -> int:
+        return int(seconds // self._bucket_seconds)
+
+    def reviews_added(self, reviews: List[Review]):
+        with self._lock:
+            self._advance()
+            for review in reviews:
+                if review.movie is None:
+                    continue
+                bucket = min(self._bucket(review.timestamp.timestamp()), self._current)
+                if bucket <= self._current - self._buckets:
+                    # Older than the window.
+                    continue
+                self._count(review.movie.id, bucket)
+
+    def top(self, limit: int = None) -> List[Tuple[int, int]]:
+        """ The ids of the movies most reviewed over the window and their number of reviews, most reviewed first. """
+        with self._lock:
+            self._advance()
+            top = self._top if limit is None else self._top[:limit]
+            return [(movie_id, total) for total, movie_id in top]
+
+    def _count(self, movie_id: int, bucket: int):
+        counter = self._counters.get(movie_id)
+        if counter is None:
+            counter = self._counters[movie_id] = _Counter(self._buckets)
+        slot = bucket % self._buckets
+        counter.counts[slot] += 1
+        counter.total += 1
+        self._reviewed[slot].add(movie_id)
+
+        # The totals only grow between recounts, so the movie either moves up within the top or displaces its last.
+        top = self._top
+        for index, (total, top_id) in enumerate(top):
+            if top_id == movie_id:
+                del top[index]
+                break
+        else:
+            if len(top) == self._size and (counter.total, -movie_id) <= (top[-1][0], -top[-1][1]):
+                return
+            if len(top) == self._size:
+                top.pop()
+        index = len(top)
+        while index > 0 and (top[index - 1][0], -top[index - 1][1]) < (counter.total, -movie_id):
+            index -= 1
+        top.insert(index, (counter.total, movie_id))
+
+    def _advance(self):
+        # Clears the buckets that left the window since the last call, and recounts the top if any had reviews.
+        current = self._bucket(self._clock())
+        if current <= self._current:
+            return
+        expired = False
+        for bucket in range(max(self._current + 1, current - self._buckets + 1), current + 1):
+            slot = bucket % self._buckets
+            for movie_id in self._reviewed[slot]:
+                counter = self._counters[movie_id]
+                counter.total -= counter.counts[slot]
+                counter.counts[slot] = 0
+                if counter.total == 0:
+                    del self._counters[movie_id]
+                expired = True
+            self._reviewed[slot].clear()
+        self._current = current
+        if expired:
+            self._recount()
+
+    def _recount(self):
+        self._top = heapq.nsmallest(self._size, ((counter.total, movie_id)
+                                                 for movie_id, counter in self._counters.items()),
+                                    key=lambda item: (-item[0], item[1]))
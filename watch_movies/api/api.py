@@ -0,0 +1,164 @@
+import json
+
+import click
+from flask import Blueprint, Response, current_app, request
+
+import watch_movies.adapters.repository as repo
+import watch_movies.api.export as export
+import watch_movies.api.services as services
+from watch_movies.movie_lib.services import NonExistentMovieException, UnknownUserException
+from watch_movies.monitoring.startup import wait_until_ready_or_exit
+
+
+# Configure Blueprint.
+api_blueprint = Blueprint(
+    'api_bp', __name__, url_prefix='/api', cli_group=None)
+
+
+def _json(payload, status: int = 200) -> Response:
+    # Compact and unsorted: cheaper to encode and to send than Flask's default of sorted keys.
+    return Response(json.dumps(payload, separators=(',', ':')), status=status, mimetype='application/json')
+
+
+def _page():
+    # The cursor (offset) and limit query parameters of a paginated request.
+    cursor = request.args.get('cursor', 0, type=int)
+    if cursor < 0:
+        raise services.InvalidRequestException('cursor must be at least 0')
+    return cursor, _limit()
+
+
+def _limit():
+    limit = request.args.get('limit', 20, type=int)
+    if not 0 < limit <= services.MAX_MOVIES:
+        raise services.InvalidRequestException(f'limit must be from 1 to {services.MAX_MOVIES}')
+    return limit
+
+
+@api_blueprint.errorhandler(services.InvalidRequestException)
+def invalid_request(e):
+    return _json({'error': str(e)}, 400)
+
+
+@api_blueprint.errorhandler(NonExistentMovieException)
+def non_existent_movie(e):
+    return _json({'error': 'No such movie'}, 404)
+
+
+@api_blueprint.errorhandler(UnknownUserException)
+def unknown_user(e):
+    return _json({'error': 'No such user'}, 404)
+
+
+@api_blueprint.route('/movies', methods=['GET'])
+def movies():
+    # Batch lookup: /api/movies?ids=1,2,3
+    ids = request.args.get('ids')
+    if ids is None:
+        raise services.InvalidRequestException('ids is required, e.g. /api/movies?ids=1,2,3')
+    fields = services.parse_fields(request.args.get('fields'))
+    return _json(services.get_movies(services.parse_ids(ids), fields, repo.repo_instance))
+
+
+@api_blueprint.route('/movies/<int:movie_id>', methods=['GET'])
+def movie(movie_id):
+    fields = services.parse_fields(request.args.get('fields'))
+    return _json(services.get_movie(movie_id, fields, repo.repo_instance))
+
+
+@api_blueprint.route('/movies/<int:movie_id>/reviews', methods=['GET'])
+def reviews(movie_id):
+    cursor, limit = _page()
+    return _json(services.get_reviews(movie_id, cursor, limit, repo.repo_instance))
+
+
+@api_blueprint.route('/reviews', methods=['GET'])
+def recent_reviews():
+    # The latest reviews on the site, paginated by the timestamp cursor of the last review of the previous page.
+    return _json(services.get_recent_reviews(current_app.extensions['review_activity'],
+                                             request.args.get('cursor'), _limit()))
+
+
+@api_blueprint.route('/users/<username>/reviews', methods=['GET'])
+def user_reviews(username):
+    return _json(services.get_user_reviews(current_app.extensions['review_activity'], username,
+                                           request.args.get('cursor'), _limit(), repo.repo_instance))
+
+
+@api_blueprint.route('/actors/<name>/movies', methods=['GET'])
+def movies_by_actor(name):
+    return _movies_for('actor', name)
+
+
+@api_blueprint.route('/genres/<name>/movies', methods=['GET'])
+def movies_by_genre(name):
+    return _movies_for('genre', name)
+
+
+@api_blueprint.route('/directors/<name>/movies', methods=['GET'])
+def movies_by_director(name):
+    return _movies_for('director', name)
+
+
+def _movies_for(kind: str, name: str):
+    fields = services.parse_fields(request.args.get('fields'))
+    cursor, limit = _page()
+    return _json(services.get_movies_for(kind, name, cursor, limit, fields, repo.repo_instance))
+
+
+@api_blueprint.route('/analytics', methods=['GET'])
+def analytics():
+    """ Counts of movies, average ratings and total revenue by genre, year and director, e.g.
+    /api/analytics?by=genre,year or /api/analytics?by=director&genre=Action&sort=movies&limit=10.
+    """
+    cube = current_app.extensions.get('catalogue_cube')
+    if cube is None:
+        return _json({'error': 'Catalogue analytics are turned off'}, 404)
+    limit = request.args.get('limit', type=int)
+    if limit is not None and limit <= 0:
+        raise services.InvalidRequestException('limit must be positive')
+    filters = {name: request.args[name] for name in services.DIMENSIONS if name in request.args}
+    return _json(services.get_analytics(cube, request.args.get('by'), filters, request.args.get('sort'), limit))
+
+
+@api_blueprint.route('/trending', methods=['GET'])
+def trending():
+    # The movies most reviewed recently: /api/trending?limit=5
+    trending_movies = current_app.extensions.get('trending_movies')
+    if trending_movies is None:
+        return _json({'error': 'Trending movies are turned off'}, 404)
+    fields = services.parse_fields(request.args.get('fields'))
+    limit = request.args.get('limit', trending_movies.size, type=int)
+    return _json(services.get_trending(trending_movies, limit, fields, repo.repo_instance))
+
+
+@api_blueprint.route('/export/<kind>', methods=['GET'])
+def export_records(kind):
+    """ Streams every movie or review as NDJSON (the default) or CSV (format=csv), gzipped for clients that accept
+    it.
+    """
+    export_format = request.args.get('format', 'ndjson')
+    if kind not in export.EXPORTS or export_format not in export.FORMATS:
+        raise services.InvalidRequestException(f'Exports are of {", ".join(export.EXPORTS)}, in formats '
+                                               f'{", ".join(export.FORMATS)}')
+    compress = 'gzip' in request.accept_encodings
+    headers = {'Content-Disposition': f'attachment; filename={kind}.{export_format}', 'Vary': 'Accept-Encoding'}
+    if compress:
+        headers['Content-Encoding'] = 'gzip'
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    return Response(export.export(kind, export_format, repo.repo_instance, compress), mimetype=mimetype,
+                    headers=headers)
+
+
+@api_blueprint.cli.command('export')
+@click.argument('kind', type=click.Choice(list(export.EXPORTS)))
+@click.option('--format', 'export_format', type=click.Choice(export.FORMATS), default='ndjson')
+@click.option('--output', type=click.Path(dir_okay=False), required=True,
+              help='File to write; gzipped if it ends in .gz.')
+def export_command(kind, export_format, output):
+    """Write every movie or review to a file, as NDJSON or CSV."""
+    wait_until_ready_or_exit(current_app.extensions['startup'])
+    compress = output.endswith('.gz')
+    with open(output, 'wb') as output_file:
+        for chunk in export.export(kind, export_format, repo.repo_instance, compress):
+            output_file.write(chunk)
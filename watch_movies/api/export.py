@@ -0,0 +1,93 @@
+import csv
+import io
+import json
+import zlib
+from typing import Iterable, Iterator
+
+from watch_movies.api.services import DEFAULT_FIELDS, movie_serializer
+from watch_movies.movie_lib.services import movie_to_dict, review_to_dict
+
+
+# Kinds of records that can be exported, and the columns of their CSV form.
+EXPORTS = {
+    'movies': DEFAULT_FIELDS,
+    'reviews': ('username', 'movie_id', 'review_text', 'timestamp'),
+}
+FORMATS = ('ndjson', 'csv')
+
+# Encoded records are sent in chunks of about this many bytes.
+CHUNK_SIZE = 64 * 1024
+
+
+def movie_records(repository, snapshot) -> Iterator[dict]:
+    serialize = movie_serializer(DEFAULT_FIELDS)
+    for movie in repository.iter_movies_in(snapshot):
+        yield serialize(movie_to_dict(movie))
+
+
+def review_records(repository, snapshot) -> Iterator[dict]:
+    for review in repository.iter_reviews_in(snapshot):
+        record = review_to_dict(review)
+        record['timestamp'] = record['timestamp'].isoformat()
+        yield record
+
+
+def ndjson_lines(records: Iterable[dict]) -> Iterator[str]:
+    for record in records:
+        yield json.dumps(record, separators=(',', ':')) + '\n'
+
+
+def csv_lines(records: Iterable[dict], columns: tuple) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for record in records:
+        writer.writerow([','.join(value) if isinstance(value, list) else value
+                         for value in (record[column] for column in columns)])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # The header, when there are no records.
+    if buffer.tell() > 0:
+        yield buffer.getvalue()
+
+
+def chunked(lines: Iterable[str], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    # Joins lines into chunks of about chunk_size bytes, so each write carries more than one record.
+    parts, size = list(), 0
+    for line in lines:
+        data = line.encode('utf-8')
+        parts.append(data)
+        size += len(data)
+        if size >= chunk_size:
+            yield b''.join(parts)
+            parts, size = list(), 0
+    if len(parts) > 0:
+        yield b''.join(parts)
+
+
+def gzipped(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    # Compresses chunks into the gzip format as they are produced.
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export(kind: str, export_format: str, repository, compress: bool = False) -> Iterator[bytes]:
+    """ Returns the encoded records of kind ('movies' or 'reviews') as a generator of chunks of bytes.
+
+    The records are those of the repository's snapshot when export() is called: reviews added while the export is
+    read aren't included. Records are read and encoded one at a time, so memory use doesn't grow with the number of
+    records.
+    """
+    snapshot = repository.snapshot
+    records = movie_records(repository, snapshot) if kind == 'movies' else review_records(repository, snapshot)
+    if export_format == 'csv':
+        lines = csv_lines(records, EXPORTS[kind])
+    else:
+        lines = ndjson_lines(records)
+    chunks = chunked(lines)
+    return gzipped(chunks) if compress else chunks
@@ -0,0 +1,188 @@
+from datetime import datetime
+from typing import List
+
+from watch_movies.adapters.catalogue_cube import DIMENSIONS, CatalogueCube, CatalogueCubeException
+from watch_movies.adapters.repository import AbstractRepository
+from watch_movies.adapters.review_activity import Cursor, ReviewActivity
+from watch_movies.adapters.trending import TrendingMovies
+from watch_movies.movie_lib import services as movie_library_services
+from watch_movies.utilities import services as utilities_services
+
+
+class InvalidRequestException(Exception):
+    pass
+
+
+def _names(entities, attribute):
+    return [getattr(entity, attribute) for entity in entities]
+
+
+def _review_to_json(review: dict) -> dict:
+    return dict(review, timestamp=review['timestamp'].isoformat())
+
+
+# How each field of a movie DTO (see movie_to_dict) is written as JSON.
+MOVIE_FIELDS = {
+    'id': None,
+    'title': None,
+    'year': None,
+    'description': None,
+    'director': lambda director: director.director_full_name if director is not None else None,
+    'actors': lambda actors: _names(actors, 'actor_full_name'),
+    'genres': lambda genres: _names(genres, 'genre_name'),
+    'runtime_minutes': None,
+    'rating': None,
+    'votes': None,
+    'revenue_millions': None,
+    'metascore': None,
+    'reviews': lambda reviews: [_review_to_json(review)
+                                for review in movie_library_services.reviews_to_dict(reviews)],
+}
+
+# Reviews are left out unless asked for, as they can outweigh the rest of the movie.
+DEFAULT_FIELDS = tuple(field for field in MOVIE_FIELDS if field != 'reviews')
+
+# Most movies returned by one request.
+MAX_MOVIES = 100
+
+
+def parse_fields(fields: str) -> tuple:
+    """ Returns the movie fields listed, comma-separated, in a fields= parameter; all but reviews when absent. """
+    if fields is None or fields.strip() == '':
+        return DEFAULT_FIELDS
+    names = tuple(dict.fromkeys(name.strip() for name in fields.split(',') if name.strip()))
+    unknown = [name for name in names if name not in MOVIE_FIELDS]
+    if len(unknown) > 0:
+        raise InvalidRequestException(f'Unknown fields: {", ".join(unknown)}. Fields are: '
+                                      f'{", ".join(MOVIE_FIELDS)}')
+    return names
+
+
+def parse_ids(ids: str) -> List[int]:
+    try:
+        id_list = [int(movie_id) for movie_id in ids.split(',') if movie_id.strip()]
+    except ValueError:
+        raise InvalidRequestException('ids must be comma-separated movie ids')
+    if len(id_list) > MAX_MOVIES:
+        raise InvalidRequestException(f'At most {MAX_MOVIES} ids can be requested at once')
+    return id_list
+
+
+def movie_serializer(fields: tuple):
+    """ Returns a function writing a movie DTO as a JSON-ready dict holding only fields.
+
+    The conversions are looked up once, rather than for each movie, and fields not asked for are never converted.
+    """
+    conversions = [(field, MOVIE_FIELDS[field]) for field in fields]
+
+    def serialize(movie: dict) -> dict:
+        return {field: movie[field] if convert is None else convert(movie[field]) for field, convert in conversions}
+
+    return serialize
+
+
+def get_movie(movie_id: int, fields: tuple, repo: AbstractRepository) -> dict:
+    return movie_serializer(fields)(movie_library_services.get_movie(movie_id, repo))
+
+
+def get_movies(id_list: List[int], fields: tuple, repo: AbstractRepository) -> dict:
+    # The movies with the given ids that exist, in the order asked for, and the ids that don't.
+    movies = movie_library_services.get_movies_by_ids(id_list, repo)
+    by_id = {movie['id']: movie for movie in movies}
+    serialize = movie_serializer(fields)
+    return {
+        'movies': [serialize(by_id[movie_id]) for movie_id in dict.fromkeys(id_list) if movie_id in by_id],
+        'missing': [movie_id for movie_id in dict.fromkeys(id_list) if movie_id not in by_id]
+    }
+
+
+def get_movies_for(kind: str, name: str, cursor: int, limit: int, fields: tuple, repo: AbstractRepository) -> dict:
+    """ A page of the movies featuring the actor, genre or director name, by ascending id. """
+    lookups = {
+        'actor': movie_library_services.get_movie_ids_for_actor,
+        'genre': movie_library_services.get_movie_ids_for_genre,
+        'director': movie_library_services.get_movie_ids_for_director,
+    }
+    movie_ids = lookups[kind](name, repo)
+    page = movie_library_services.get_movies_by_ids(movie_ids[cursor:cursor + limit], repo)
+    serialize = movie_serializer(fields)
+    return {
+        kind: name,
+        'total': len(movie_ids),
+        'movies': [serialize(movie) for movie in page],
+        'next_cursor': cursor + limit if cursor + limit < len(movie_ids) else None
+    }
+
+
+def get_reviews(movie_id: int, cursor: int, limit: int, repo: AbstractRepository) -> dict:
+    reviews = movie_library_services.get_reviews_for_movie(movie_id, repo)
+    return {
+        'movie_id': movie_id,
+        'total': len(reviews),
+        'reviews': [_review_to_json(review) for review in reviews[cursor:cursor + limit]],
+        'next_cursor': cursor + limit if cursor + limit < len(reviews) else None
+    }
+
+
+def get_analytics(cube: CatalogueCube, by: str, filters: dict, sort: str, limit: int) -> dict:
+    """ The rows of the catalogue cube for the comma-separated dimensions of by, e.g. 'genre,year'. """
+    dimensions = [name for name in (by or '').split(',') if name != '']
+    if 'year' in filters:
+        try:
+            filters['year'] = int(filters['year'])
+        except ValueError:
+            raise InvalidRequestException('year must be a whole number')
+    try:
+        rows = cube.query(dimensions, filters, sort or (dimensions[0] if len(dimensions) > 0 else 'movies'), limit)
+    except CatalogueCubeException as e:
+        raise InvalidRequestException(str(e))
+    return {'by': dimensions, 'filters': filters, 'rows': rows}
+
+
+def get_trending(trending: TrendingMovies, limit: int, fields: tuple, repo: AbstractRepository) -> dict:
+    """ The movies with most reviews over the trending window, each with its number of recent_reviews. """
+    if not 0 < limit <= trending.size:
+        raise InvalidRequestException(f'limit must be from 1 to {trending.size}')
+    serialize = movie_serializer(fields)
+    return {
+        'window_hours': trending.window_hours,
+        'movies': [dict(serialize(movie), recent_reviews=movie['recent_reviews'])
+                   for movie in utilities_services.get_trending_movies(trending, limit, repo)]
+    }
+
+
+def parse_review_cursor(cursor: str) -> Cursor:
+    # Review cursors are the timestamp of the last review of the previous page and its sequence number,
+    # e.g. 2026-10-19T12:00:00.000001_42.
+    timestamp, _, sequence = (cursor or '').partition('_')
+    try:
+        timestamp, sequence = datetime.fromisoformat(timestamp), int(sequence)
+    except ValueError:
+        timestamp = None
+    # Review timestamps are naive, and can't be compared with a timestamp with a UTC offset.
+    if timestamp is None or timestamp.tzinfo is not None:
+        raise InvalidRequestException('cursor must be the next_cursor of the previous page')
+    return timestamp, sequence
+
+
+def _review_page(reviews: list, next_cursor: Cursor) -> dict:
+    return {
+        'reviews': [_review_to_json(review) for review in movie_library_services.reviews_to_dict(reviews)],
+        'next_cursor': f'{next_cursor[0].isoformat()}_{next_cursor[1]}' if next_cursor is not None else None
+    }
+
+
+def get_recent_reviews(activity: ReviewActivity, cursor: str, limit: int) -> dict:
+    """ A page of the reviews most recently written on the site, newest first. """
+    return _review_page(*activity.recent_reviews(parse_review_cursor(cursor) if cursor else None, limit))
+
+
+def get_user_reviews(activity: ReviewActivity, username: str, cursor: str, limit: int,
+                     repo: AbstractRepository) -> dict:
+    """ A page of the reviews written by a user, newest first. """
+    user = repo.get_user(username.strip().lower())
+    if user is None:
+        raise movie_library_services.UnknownUserException
+    page = _review_page(*activity.user_reviews(user.username, parse_review_cursor(cursor) if cursor else None,
+                                               limit))
+    return dict(page, username=user.username)
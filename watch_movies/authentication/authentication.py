@@ -1,11 +1,9 @@
-from flask import Blueprint, render_template, redirect, url_for, session, request
+from flask import Blueprint, abort, current_app, render_template, redirect, url_for, session, request
 
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, SubmitField
 from wtforms.validators import DataRequired, Length, ValidationError
 
-from password_validator import PasswordValidator
-
 from functools import wraps
 
 import watch_movies.utilities.utilities as utilities
@@ -26,7 +24,9 @@ def register():
         # Successful POST, i.e. the username and password have passed validation checking.
         # Use the service layer to attempt to add the new user.
         try:
-            services.add_user(form.username.data, form.password.data, repo.repo_instance)
+            # Admins are named by ADMIN_USERS, so their names can't be taken by registering.
+            services.add_user(form.username.data, form.password.data, repo.repo_instance,
+                              admin_users(current_app.config))
 
             # All is well, redirect the user to the login page.
             return redirect(url_for('authentication_bp.login'))
@@ -104,6 +104,26 @@ def login_required(view):
     return wrapped_view
 
 
+def admin_required(view):
+    # Only the users listed in ADMIN_USERS may use the view, and only once logged in to an existing account with
+    # that name: the names can't be registered (see register()), so admin accounts are created with bulk-import.
+    # Others are refused, and anonymous users sent to log in.
+    @wraps(view)
+    def wrapped_view(**kwargs):
+        if 'username' not in session:
+            return redirect(url_for('authentication_bp.login'))
+        username = session['username']
+        if username not in admin_users(current_app.config) or repo.repo_instance.get_user(username) is None:
+            abort(403)
+        return view(**kwargs)
+    return wrapped_view
+
+
+def admin_users(config) -> set:
+    # Usernames are stored in lower case.
+    return {name.strip().lower() for name in (config.get('ADMIN_USERS') or '').split(',') if name.strip()}
+
+
 class PasswordValid:
     def __init__(self, message=None):
         if not message:
@@ -112,6 +132,9 @@ class PasswordValid:
         self.message = message
 
     def __call__(self, form, field):
+        # Imported on first use, so that loading the blueprint doesn't wait for it.
+        from password_validator import PasswordValidator
+
         schema = PasswordValidator()
         schema \
             .min(8) \
@@ -16,10 +16,10 @@ class AuthenticationException(Exception):
     pass
 
 
-def add_user(username: str, password: str, repo: AbstractRepository):
-    # Check that the given username is available.
+def add_user(username: str, password: str, repo: AbstractRepository, reserved_names: set = frozenset()):
+    # Check that the given username is available, and isn't one of the reserved names (those of the admins).
     user = repo.get_user(username)
-    if user is not None:
+    if user is not None or username.strip().lower() in reserved_names:
         raise NameNotUniqueException
 
     # Encrypt password so that the database doesn't store passwords 'in the clear'.
@@ -1,4 +1,6 @@
+import heapq
 from datetime import date, datetime
+from itertools import islice
 
 
 class Director:
@@ -115,6 +117,10 @@ class Movie:
         self.__actors = []
         self.__genres = []
         self.__runtime_minutes = None
+        self.__rating = None
+        self.__votes = None
+        self.__revenue_millions = None
+        self.__metascore = None
         self.__id = None
         self.__reviews = []
         self.__watchlist = []
@@ -235,6 +241,50 @@ class Movie:
         else:
             raise ValueError(f'Movie.runtime_minutes setter: Value out of range {val}')
 
+    @property
+    def rating(self) -> float:
+        return self.__rating
+
+    @rating.setter
+    def rating(self, rating: float):
+        if type(rating) in (int, float) and 0 <= rating <= 10:
+            self.__rating = float(rating)
+        else:
+            self.__rating = None
+
+    @property
+    def votes(self) -> int:
+        return self.__votes
+
+    @votes.setter
+    def votes(self, votes: int):
+        if type(votes) is int and votes >= 0:
+            self.__votes = votes
+        else:
+            self.__votes = None
+
+    @property
+    def revenue_millions(self) -> float:
+        return self.__revenue_millions
+
+    @revenue_millions.setter
+    def revenue_millions(self, revenue_millions: float):
+        if type(revenue_millions) in (int, float) and revenue_millions >= 0:
+            self.__revenue_millions = float(revenue_millions)
+        else:
+            self.__revenue_millions = None
+
+    @property
+    def metascore(self) -> int:
+        return self.__metascore
+
+    @metascore.setter
+    def metascore(self, metascore: int):
+        if type(metascore) is int and 0 <= metascore <= 100:
+            self.__metascore = metascore
+        else:
+            self.__metascore = None
+
     def __get_unique_string_rep(self):
         return f"{self.__title}, {self.__release_year}"
 
@@ -266,9 +316,16 @@ class User:
             self.__password = None
         else:
             self.__password = password
-        self.__watched_movies = list()
+        # Movies by id, in the order they were last watched and added: dicts, so that checking and removing a movie
+        # costs the same however many there are.
+        self.__watched_movies = dict()
+        self.__times_watched = dict()
+        self.__watchlist = dict()
         self.__reviews = list()
         self.__time_spent_watching_movies_minutes = 0
+        # Totals over the watch history, kept as movies are watched rather than recounted when shown.
+        self.__total_times_watched = 0
+        self.__minutes_by_genre = dict()
 
     @property
     def username(self) -> str:
@@ -280,7 +337,27 @@ class User:
 
     @property
     def watched_movies(self) -> list:
-        return self.__watched_movies
+        # Least recently watched first.
+        return list(self.__watched_movies.values())
+
+    @property
+    def watchlist(self) -> list:
+        return list(self.__watchlist.values())
+
+    @property
+    def number_of_watched_movies(self) -> int:
+        return len(self.__watched_movies)
+
+    @property
+    def watchlist_size(self) -> int:
+        return len(self.__watchlist)
+
+    def watch_history_page(self, start: int, stop: int) -> list:
+        # Most recently watched first; only the movies before stop are visited.
+        return list(islice(reversed(self.__watched_movies.values()), start, stop))
+
+    def watchlist_page(self, start: int, stop: int) -> list:
+        return list(islice(self.__watchlist.values(), start, stop))
 
     @property
     def reviews(self) -> list:
@@ -290,10 +367,47 @@ class User:
     def time_spent_watching_movies_minutes(self) -> int:
         return self.__time_spent_watching_movies_minutes
 
-    def watch_movie(self, movie: Movie):
-        if isinstance(movie, Movie):
-            self.__watched_movies.append(movie)
-            self.__time_spent_watching_movies_minutes += movie.runtime_minutes
+    @property
+    def total_times_watched(self) -> int:
+        return self.__total_times_watched
+
+    def top_genres(self, quantity: int) -> list:
+        # The names of the genres the user has spent most time watching, most watched first.
+        top = heapq.nlargest(quantity, self.__minutes_by_genre.items(), key=lambda item: item[1])
+        return [genre_name for genre_name, minutes in top if minutes > 0]
+
+    def watch_movie(self, movie: Movie, times: int = 1):
+        # Watching a movie again moves it to the end of the history, and adds to the time spent watching.
+        if isinstance(movie, Movie) and times > 0:
+            self.__watched_movies.pop(movie.id, None)
+            self.__watched_movies[movie.id] = movie
+            self.__times_watched[movie.id] = self.__times_watched.get(movie.id, 0) + times
+            self.__total_times_watched += times
+            if movie.runtime_minutes is not None:
+                minutes = movie.runtime_minutes * times
+                self.__time_spent_watching_movies_minutes += minutes
+                minutes_by_genre = self.__minutes_by_genre
+                for genre in movie.genres:
+                    minutes_by_genre[genre.genre_name] = minutes_by_genre.get(genre.genre_name, 0) + minutes
+
+    def has_watched(self, movie_id: int) -> bool:
+        return movie_id in self.__watched_movies
+
+    def times_watched(self, movie_id: int) -> int:
+        return self.__times_watched.get(movie_id, 0)
+
+    def add_to_watchlist(self, movie: Movie) -> bool:
+        # Returns whether the movie was added, i.e. wasn't already in the watchlist.
+        if not isinstance(movie, Movie) or movie.id in self.__watchlist:
+            return False
+        self.__watchlist[movie.id] = movie
+        return True
+
+    def remove_from_watchlist(self, movie_id: int) -> bool:
+        return self.__watchlist.pop(movie_id, None) is not None
+
+    def is_in_watchlist(self, movie_id: int) -> bool:
+        return movie_id in self.__watchlist
 
     def add_review(self, review):
         if isinstance(review, Review):
@@ -316,7 +430,7 @@ class User:
 
 class Review:
 
-    def __init__(self, movie: Movie, review_text: str, user: User):
+    def __init__(self, movie: Movie, review_text: str, user: User, timestamp: datetime = None):
         if isinstance(movie, Movie):
             self.__movie = movie
         else:
@@ -325,7 +439,10 @@ class Review:
             self.__review_text = review_text
         else:
             self.__review_text = None
-        self.__timestamp = datetime.now()
+        if isinstance(timestamp, datetime):
+            self.__timestamp = timestamp
+        else:
+            self.__timestamp = datetime.now()
         if isinstance(user, User):
             self.__user = user
         else:
@@ -340,6 +457,12 @@ class Review:
     def movie(self) -> Movie:
         return self.__movie
 
+    @movie.setter
+    def movie(self, movie: Movie):
+        # Relinks the review to another object for the same movie, e.g. the one kept by the repository.
+        if isinstance(movie, Movie):
+            self.__movie = movie
+
     @property
     def review_text(self) -> str:
         return self.__review_text
@@ -357,8 +480,8 @@ class Review:
         return f'<Review of movie {self.__movie}, timestamp = {self.__timestamp}, user = {self.__user}>'
 
 
-def make_review( movie: Movie, review_text: str, user: User):
-    review = Review(movie, review_text, user)
+def make_review( movie: Movie, review_text: str, user: User, timestamp: datetime = None):
+    review = Review(movie, review_text, user, timestamp)
     user.add_review(review)
     movie.add_review(review)
 
@@ -12,6 +12,7 @@ def home():
     return render_template(
         'home/home.html',
         selected_movies=utilities.get_selected_movies(),
+        trending_movies=utilities.get_trending_movies(),
         genre_urls=utilities.get_genres_and_urls(),
         actor_urls=utilities.get_actors_and_urls(),
         director_urls=utilities.get_directors_and_urls()
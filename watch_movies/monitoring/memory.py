@@ -0,0 +1,175 @@
+import os
+import random
+import sys
+import threading
+import tracemalloc
+from typing import Iterable
+
+from watch_movies.adapters.sizing import deep_size
+
+
+# Collections with more items than this are measured on a random sample of this many items.
+SAMPLE_SIZE = 1000
+
+
+def estimate_collection(items, sample_size: int = SAMPLE_SIZE, rng: random.Random = None) -> dict:
+    """ Estimates the deep size of a list, tuple or dict of items, without following references to entities.
+
+    Collections larger than sample_size are estimated from the mean size of a random sample of their items.
+    """
+    rng = rng or random.Random(0)
+    values = list(items.values()) if isinstance(items, dict) else items
+    keys = list(items) if isinstance(items, dict) else None
+    count = len(values)
+    container = sys.getsizeof(items)
+    if count <= sample_size:
+        positions, scale = range(count), 1
+    else:
+        positions = [rng.randrange(count) for _ in range(sample_size)]
+        scale = count / sample_size
+    items_size = sum(deep_size(values[position]) + (deep_size(keys[position]) if keys is not None else 0)
+                     for position in positions)
+    return {
+        'items': count,
+        'bytes': int(container + items_size * scale),
+        'sampled': count > sample_size
+    }
+
+
+def list_lengths(objects: list, length, sample_size: int = SAMPLE_SIZE, rng: random.Random = None) -> dict:
+    # Mean and maximum length of a list held by each of objects (e.g. every movie's reviews), given by length(object),
+    # estimated from a sample of sample_size objects.
+    count = len(objects)
+    lengths = [length(item) for item in _sample(objects, sample_size, rng or random.Random(0))]
+    if len(lengths) == 0:
+        return {'objects': count, 'total': 0, 'mean': 0, 'max': 0}
+    mean = sum(lengths) / len(lengths)
+    return {'objects': count, 'total': int(mean * count), 'mean': mean, 'max': max(lengths),
+            'sampled': count > sample_size}
+
+
+def repository_memory_report(repository, sample_size: int = SAMPLE_SIZE) -> dict:
+    """ Estimates the memory held by each collection and index of repository.
+
+    Proxies are unwrapped to the repository they wrap. Movies and users also report the lengths of their reviews
+    and watched movies lists, which grow without bound as the application is used.
+    """
+    while hasattr(type(repository), 'repository'):
+        repository = repository.repository
+
+    rng = random.Random(0)
+    report = {'repository': type(repository).__name__, 'collections': dict(), 'process': process_memory()}
+    snapshot = getattr(repository, 'snapshot', None)
+    if snapshot is None:
+        return report
+    collections = report['collections']
+
+    movies = list(snapshot.movies)
+    collections['movies'] = estimate_collection(movies, sample_size, rng)
+    collections['movies_index'] = {'items': len(snapshot.movies_index),
+                                   'bytes': deep_size(snapshot.movies_index) if snapshot.movies_index is not None
+                                   else 0, 'sampled': False}
+    for name in ('actor_ids', 'genre_ids', 'director_ids', 'title_word_ids'):
+        collections[name] = estimate_collection(getattr(snapshot, name) or dict(), sample_size, rng)
+    if snapshot.columns is not None:
+        collections['columns'] = {'items': len(snapshot.columns), 'bytes': deep_size(snapshot.columns),
+                                  'sampled': False}
+    for name in ('genres', 'actors', 'directors'):
+        collections[name] = estimate_collection(getattr(snapshot, name), sample_size, rng)
+
+    users = repository.get_users_in(snapshot)
+    reviews = repository.get_reviews_in(snapshot)
+    collections['users'] = estimate_collection(users, sample_size, rng)
+    collections['reviews'] = estimate_collection(reviews, sample_size, rng)
+
+    catalogue = getattr(repository, 'catalogue', None)
+    if catalogue is not None:
+        collections['catalogue_file'] = {'items': len(catalogue), 'bytes': os.path.getsize(catalogue.path),
+                                         'sampled': False, 'mapped': True}
+        collections['materialized_movies'] = estimate_collection(catalogue.materialized_movies(), sample_size, rng)
+
+    report['lists'] = {
+        'movie_reviews': list_lengths(movies, lambda movie: len(movie.reviews), sample_size, rng),
+        'user_reviews': list_lengths(users, lambda user: len(user.reviews), sample_size, rng),
+        'user_watched_movies': list_lengths(users, lambda user: user.number_of_watched_movies, sample_size, rng)
+    }
+    report['total_bytes'] = sum(collection['bytes'] for collection in collections.values()
+                                if not collection.get('mapped'))
+    return report
+
+
+def _sample(items: list, sample_size: int, rng: random.Random) -> list:
+    if len(items) <= sample_size:
+        return items
+    return [items[rng.randrange(len(items))] for _ in range(sample_size)]
+
+
+def process_memory() -> dict:
+    # The process's resident memory in bytes, where the platform reports it.
+    from watch_movies.prefork import read_memory_usage
+
+    usage = read_memory_usage(os.getpid())
+    if usage is None:
+        return dict()
+    return {key: kilobytes * 1024 for key, kilobytes in usage.items()}
+
+
+def format_memory_report(report: dict) -> str:
+    lines = [f'{report["repository"]}:', f'  {"collection":<22}{"items":>12}{"MB":>12}']
+    for name, collection in report['collections'].items():
+        note = ' (sampled)' if collection.get('sampled') else (' (mapped)' if collection.get('mapped') else '')
+        lines.append(f'  {name:<22}{collection["items"]:>12}{collection["bytes"] / 2 ** 20:>12.2f}{note}')
+    if 'total_bytes' in report:
+        lines.append(f'  {"total":<22}{"":>12}{report["total_bytes"] / 2 ** 20:>12.2f}')
+    for name, lengths in report.get('lists', {}).items():
+        lines.append(f'  {name}: {lengths["total"]} in all, {lengths["mean"]:.2f} on average, at most '
+                     f'{lengths["max"]}')
+    for key, value in report['process'].items():
+        lines.append(f'  process {key}: {value / 2 ** 20:.1f} MB')
+    return '\n'.join(lines)
+
+
+class AllocationTracker:
+    """ Takes tracemalloc snapshots, and compares the latest one with the one before, by allocation site. """
+
+    def __init__(self, frames: int = 1):
+        self._frames = frames
+        self._lock = threading.Lock()
+        self._snapshot = None
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self._frames)
+        with self._lock:
+            self._snapshot = _snapshot()
+
+    def stop(self):
+        with self._lock:
+            self._snapshot = None
+        tracemalloc.stop()
+
+    def diff(self, top: int = 20) -> list:
+        """ Returns the allocation sites whose memory changed most since the previous call (or start()), and
+        makes the current snapshot the baseline for the next call.
+        """
+        if not tracemalloc.is_tracing():
+            raise RuntimeError('tracemalloc is not tracing; start it first')
+        current = _snapshot()
+        with self._lock:
+            previous, self._snapshot = self._snapshot, current
+        if previous is None:
+            return list()
+        return [{'location': str(stat.traceback), 'size_diff': stat.size_diff, 'size': stat.size,
+                 'count_diff': stat.count_diff}
+                for stat in current.compare_to(previous, 'lineno')[:top]]
+
+
+def _snapshot():
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    ))
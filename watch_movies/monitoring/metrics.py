@@ -0,0 +1,177 @@
+import threading
+from bisect import bisect_left
+
+
+# Upper bounds of histogram buckets, per kind of measurement.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class _Shard:
+    # The metrics recorded by one thread. Only that thread writes to it.
+
+    def __init__(self):
+        self.counters = dict()
+        self.gauges = dict()
+        self.histograms = dict()
+
+    def merge_into(self, other):
+        for key, value in self.counters.items():
+            other.counters[key] = other.counters.get(key, 0) + value
+        for key, value in self.gauges.items():
+            other.gauges[key] = other.gauges.get(key, 0) + value
+        for key, (buckets, counts, total) in self.histograms.items():
+            merged = other.histograms.get(key)
+            if merged is None:
+                other.histograms[key] = (buckets, list(counts), total)
+            else:
+                merged_counts = [a + b for a, b in zip(merged[1], counts)]
+                other.histograms[key] = (buckets, merged_counts, merged[2] + total)
+
+
+class MetricsRegistry:
+    """ Counters, gauges and histograms, recorded without locks and aggregated when scraped.
+
+    Each thread records into its own shard, so recording is a couple of dict operations with no contention; a lock
+    is only taken the first time a thread records anything, and when scraping. Scraping sums the shards. Shards of
+    threads that have finished are folded into a retired total whenever a new thread registers its shard and when
+    scraping, so thread-per-request servers keep about one shard per live thread, whether or not they are scraped.
+
+    Metrics are keyed by (name, labels), where labels is a tuple of (label, value) pairs.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards = list()
+        self._retired = _Shard()
+        self._help = dict()
+        self._collectors = list()
+
+    def describe(self, name: str, metric_type: str, help_text: str):
+        self._help[name] = (metric_type, help_text)
+
+    def add_collector(self, collector):
+        """ Adds a callable returning further Prometheus text to include whenever the registry is rendered. """
+        self._collectors.append(collector)
+
+    def _shard(self) -> _Shard:
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = _Shard()
+            self._local.shard = shard
+            with self._lock:
+                self._retire_finished()
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _retire_finished(self):
+        # Folds the shards of finished threads into the retired total; called with the lock held.
+        live_shards = list()
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live_shards.append((thread, shard))
+            else:
+                shard.merge_into(self._retired)
+        self._shards = live_shards
+
+    def increment(self, name: str, labels: tuple = (), amount: float = 1):
+        counters = self._shard().counters
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + amount
+
+    def add_to_gauge(self, name: str, labels: tuple = (), amount: float = 1):
+        # Gauges are sums over threads, e.g. each thread adds 1 when a request starts and -1 when it ends.
+        gauges = self._shard().gauges
+        key = (name, labels)
+        gauges[key] = gauges.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, labels: tuple = (), buckets=LATENCY_BUCKETS):
+        histograms = self._shard().histograms
+        key = (name, labels)
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = (buckets, [0] * (len(buckets) + 1), 0)
+        counts = histogram[1]
+        counts[bisect_left(buckets, value)] += 1
+        histograms[key] = (buckets, counts, histogram[2] + value)
+
+    def collect(self) -> _Shard:
+        """ Returns the totals over all threads. """
+        total = _Shard()
+        with self._lock:
+            self._retire_finished()
+            self._retired.merge_into(total)
+            shards = [shard for _, shard in self._shards]
+
+        # Live shards may be written to while they are read; a scrape can be off by the in-progress update.
+        for shard in shards:
+            _Shard.merge_into(_copy(shard), total)
+        return total
+
+    def render_prometheus(self) -> str:
+        """ Returns the totals in the Prometheus text exposition format. """
+        total = self.collect()
+        lines = list()
+
+        for name, series in _by_name(total.counters).items():
+            self._header(lines, name, 'counter')
+            for labels, value in series:
+                lines.append(f'{name}{_labels(labels)} {_number(value)}')
+
+        for name, series in _by_name(total.gauges).items():
+            self._header(lines, name, 'gauge')
+            for labels, value in series:
+                lines.append(f'{name}{_labels(labels)} {_number(value)}')
+
+        for name, series in _by_name(total.histograms).items():
+            self._header(lines, name, 'histogram')
+            for labels, (buckets, counts, value_sum) in series:
+                cumulative = 0
+                for bound, count in zip(buckets, counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_labels(labels + (("le", _number(bound)),))} {cumulative}')
+                cumulative += counts[-1]
+                lines.append(f'{name}_bucket{_labels(labels + (("le", "+Inf"),))} {cumulative}')
+                lines.append(f'{name}_sum{_labels(labels)} {_number(value_sum)}')
+                lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+
+        text = '\n'.join(lines) + '\n'
+        for collector in self._collectors:
+            text += collector()
+        return text
+
+    def _header(self, lines: list, name: str, default_type: str):
+        metric_type, help_text = self._help.get(name, (default_type, None))
+        if help_text is not None:
+            lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {metric_type}')
+
+
+def _copy(shard: _Shard) -> _Shard:
+    copied = _Shard()
+    copied.counters = dict(shard.counters)
+    copied.gauges = dict(shard.gauges)
+    copied.histograms = dict(shard.histograms)
+    return copied
+
+
+def _by_name(metrics: dict) -> dict:
+    grouped = dict()
+    for (name, labels), value in sorted(metrics.items(), key=lambda item: (item[0][0], item[0][1])):
+        grouped.setdefault(name, list()).append((labels, value))
+    return grouped
+
+
+def _labels(labels: tuple) -> str:
+    if len(labels) == 0:
+        return ''
+    escaped = [(label, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+               for label, value in labels]
+    return '{' + ','.join(f'{label}="{value}"' for label, value in escaped) + '}'
+
+
+def _number(value) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
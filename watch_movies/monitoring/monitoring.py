@@ -0,0 +1,254 @@
+import time
+
+from flask import Blueprint, Response, current_app, request
+from flask_wtf import FlaskForm
+from flask_wtf.csrf import generate_csrf
+from jinja2 import Template
+
+import watch_movies.adapters.repository as repo
+from watch_movies.adapters.instrumented_repository import InstrumentedRepository, format_request_calls
+from watch_movies.authentication.authentication import admin_required
+from watch_movies.monitoring.memory import AllocationTracker, SAMPLE_SIZE, repository_memory_report
+from watch_movies.monitoring.metrics import MetricsRegistry, SIZE_BUCKETS
+
+
+# Configure Blueprint.
+monitoring_blueprint = Blueprint(
+    'monitoring_bp', __name__)
+
+# Key of the per-request metrics record in the WSGI environ, shared by the middleware and the Flask hooks.
+ENVIRON_KEY = 'watch_movies.metrics'
+
+
+@monitoring_blueprint.route('/metrics', methods=['GET'])
+def metrics():
+    registry = current_app.extensions['metrics']
+    return Response(registry.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+
+@monitoring_blueprint.route('/health', methods=['GET'])
+def health():
+    # The process is up and serving requests, though it may not be ready yet.
+    return {'status': 'ok'}
+
+
+@monitoring_blueprint.route('/ready', methods=['GET'])
+def ready():
+    # Ready once the catalogue (and journal) have been loaded; the body is the startup report.
+    report = current_app.extensions['startup']
+    return report.as_dict(), 200 if report.ready else 503
+
+
+@monitoring_blueprint.route('/admin/memory', methods=['GET'])
+@admin_required
+def memory():
+    # Estimated memory held by each repository collection and index; see repository_memory_report().
+    sample_size = request.args.get('sample', SAMPLE_SIZE, type=int)
+    report = repository_memory_report(repo.repo_instance, max(1, sample_size))
+    report['tracemalloc'] = {'tracing': current_app.extensions['allocations'].tracing}
+    return report
+
+
+@monitoring_blueprint.route('/admin/csrf_token', methods=['GET'])
+@admin_required
+def csrf_token():
+    # The token to post, as the csrf_token field, with the forms sent to the admin endpoints below.
+    return {'csrf_token': generate_csrf()}
+
+
+class AdminForm(FlaskForm):
+    # Checks the CSRF token posted to an admin endpoint; the endpoints read their other fields themselves.
+    pass
+
+
+def _invalid_csrf_token():
+    # An error response when the CSRF token posted is missing or invalid, else None.
+    if not AdminForm().validate_on_submit():
+        return {'error': 'missing or invalid csrf_token; get one from /admin/csrf_token'}, 400
+    return None
+
+
+@monitoring_blueprint.route('/admin/memory/allocations', methods=['POST'])
+@admin_required
+def allocations():
+    """ Controls tracemalloc: action=start takes a first snapshot, action=diff returns the allocation sites that
+    grew most since the previous snapshot (top=N of them) and takes a new one, and action=stop stops tracing.
+    """
+    error = _invalid_csrf_token()
+    if error is not None:
+        return error
+    tracker = current_app.extensions['allocations']
+    action = request.values.get('action')
+    if action == 'start':
+        tracker.start()
+        return {'tracing': True}
+    elif action == 'diff':
+        if not tracker.tracing:
+            return {'error': 'tracemalloc is not tracing; start it first'}, 409
+        return {'tracing': True, 'top': tracker.diff(request.values.get('top', 20, type=int))}
+    elif action == 'stop':
+        tracker.stop()
+        return {'tracing': False}
+    return {'error': 'action must be one of start, diff or stop'}, 400
+
+
+@monitoring_blueprint.route('/admin/catalogue/reload', methods=['POST'])
+@admin_required
+def reload_catalogue():
+    # Applies changes to the data file now, rather than at the reloader's next check.
+    error = _invalid_csrf_token()
+    if error is not None:
+        return error
+    reloader = current_app.extensions.get('catalogue_reloader')
+    if reloader is None:
+        return {'error': 'catalogue reloading is not enabled; set CATALOGUE_RELOAD_INTERVAL'}, 409
+    diff = reloader.check(force=True)
+    return {'added': len(diff.added), 'changed': len(diff.changed), 'removed': len(diff.removed_ids),
+            'version': repo.repo_instance.version}
+
+
+@monitoring_blueprint.route('/admin/ingest', methods=['GET', 'POST'])
+@admin_required
+def ingest():
+    # GET returns how far each file of the ingest directory has been read; POST ingests new rows now.
+    ingester = current_app.extensions.get('ingester')
+    if ingester is None:
+        return {'error': 'ingesting is not enabled; set INGEST_DIRECTORY'}, 409
+    if request.method == 'POST':
+        error = _invalid_csrf_token()
+        if error is not None:
+            return error
+        return ingester.run().as_dict()
+    return {'manifest': ingester.manifest.as_dict()}
+
+
+class MetricsMiddleware:
+    """ WSGI middleware timing each request from arrival until its response body has been sent.
+
+    Timing at the WSGI layer covers work Flask's hooks can't see, such as streaming the response body. The Flask
+    hooks installed by init_app() add the endpoint and template render time to the request's record in the environ.
+    """
+
+    def __init__(self, wsgi_app, registry: MetricsRegistry):
+        self._wsgi_app = wsgi_app
+        self._registry = registry
+
+    def __call__(self, environ, start_response):
+        start = time.perf_counter()
+        record = {'endpoint': None, 'status': None, 'size': 0}
+        environ[ENVIRON_KEY] = record
+        self._registry.add_to_gauge('http_requests_in_flight', (), 1)
+
+        def recording_start_response(status, headers, exc_info=None):
+            record['status'] = status.split(' ', 1)[0]
+            return start_response(status, headers, exc_info)
+
+        try:
+            body = self._wsgi_app(environ, recording_start_response)
+        except BaseException:
+            self._finish(record, environ, start)
+            raise
+        return MeasuredBody(body, record, lambda: self._finish(record, environ, start))
+
+    def _finish(self, record: dict, environ: dict, start: float):
+        registry = self._registry
+        duration = time.perf_counter() - start
+        endpoint = record['endpoint'] or 'unmatched'
+        method = environ.get('REQUEST_METHOD', '')
+        registry.add_to_gauge('http_requests_in_flight', (), -1)
+        registry.increment('http_requests_total',
+                           (('endpoint', endpoint), ('method', method), ('status', record['status'] or '500')))
+        registry.observe('http_request_duration_seconds', duration, (('endpoint', endpoint), ('method', method)))
+        registry.observe('http_response_size_bytes', record['size'], (('endpoint', endpoint),), SIZE_BUCKETS)
+
+
+class MeasuredBody:
+    """ Wraps a WSGI response body to count the bytes sent into record['size'], and to call on_finish once the body
+    has been sent in full or closed, whichever happens first. Used by the metrics and profiling middlewares.
+    """
+
+    def __init__(self, body, record: dict, on_finish):
+        self._body = body
+        self._record = record
+        self._on_finish = on_finish
+        self._finished = False
+
+    def __iter__(self):
+        for chunk in self._body:
+            self._record['size'] += len(chunk)
+            yield chunk
+        self._finish()
+
+    def close(self):
+        try:
+            if hasattr(self._body, 'close'):
+                self._body.close()
+        finally:
+            self._finish()
+
+    def _finish(self):
+        if not self._finished:
+            self._finished = True
+            self._on_finish()
+
+
+class _TimedTemplate(Template):
+    # A Jinja template recording how long rendering it takes.
+
+    def render(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            registry = getattr(self.environment, 'metrics_registry', None)
+            if registry is not None:
+                registry.observe('template_render_duration_seconds', time.perf_counter() - start,
+                                 (('template', self.name),))
+
+
+def init_app(app):
+    """ Instruments app and registers the /metrics, health and memory endpoints. """
+    registry = MetricsRegistry()
+    registry.describe('http_requests_total', 'counter', 'Requests handled, by endpoint, method and status.')
+    registry.describe('http_requests_in_flight', 'gauge', 'Requests currently being handled.')
+    registry.describe('http_request_duration_seconds', 'histogram',
+                      'Time from receiving a request until its response body was sent.')
+    registry.describe('http_response_size_bytes', 'histogram', 'Size of response bodies.')
+    registry.describe('template_render_duration_seconds', 'histogram', 'Time spent rendering templates.')
+    app.extensions['metrics'] = registry
+    app.extensions['allocations'] = AllocationTracker()
+
+    app.jinja_env.template_class = _TimedTemplate
+    app.jinja_env.metrics_registry = registry
+
+    @app.before_request
+    def record_endpoint():
+        record = request.environ.get(ENVIRON_KEY)
+        if record is not None:
+            record['endpoint'] = request.endpoint
+
+    app.wsgi_app = MetricsMiddleware(app.wsgi_app, registry)
+    app.register_blueprint(monitoring_blueprint)
+
+
+def instrument_repository(app):
+    """ Wraps the repository to measure every call, reporting through /metrics.
+
+    In debug mode each response also carries an X-Repository-Calls header summarizing the repository calls made
+    while handling it.
+    """
+    registry = app.extensions['metrics']
+    instrumented = InstrumentedRepository(repo.repo_instance, registry)
+    repo.repo_instance = instrumented
+    registry.add_collector(instrumented.render_prometheus)
+
+    @app.before_request
+    def begin_repository_calls():
+        instrumented.begin_request()
+
+    @app.after_request
+    def summarize_repository_calls(response):
+        calls = instrumented.end_request()
+        if app.debug:
+            response.headers['X-Repository-Calls'] = format_request_calls(calls)
+        return response
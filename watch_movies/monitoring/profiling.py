@@ -0,0 +1,234 @@
+import cProfile
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from flask import request
+
+from watch_movies.monitoring.monitoring import MeasuredBody
+
+
+# Key of the per-request profiling record in the WSGI environ.
+ENVIRON_KEY = 'watch_movies.profile'
+
+# Seconds between two stack samples of a profiled request.
+SAMPLE_INTERVAL = 0.005
+
+
+class _Capture:
+    # The profile of one request in progress.
+
+    def __init__(self, thread_id: int, start: float, profiler: cProfile.Profile = None):
+        self.thread_id = thread_id
+        self.start = start
+        self.profiler = profiler
+        self.stacks = Counter()
+        self.endpoint = None
+        self.status = None
+        # Counted by MeasuredBody as the response body is sent.
+        self.record = {'size': 0}
+
+
+class StackSampler:
+    """ A thread sampling the stacks of the threads handling profiled requests.
+
+    A request is sampled for its whole duration when it was picked for profiling, and otherwise from the moment it
+    has taken longer than slow_seconds, so slow requests show where they spend their time without every request
+    paying for a profiler. The thread only runs while requests are in progress.
+    """
+
+    def __init__(self, slow_seconds: float = None, interval: float = SAMPLE_INTERVAL):
+        self._slow_seconds = slow_seconds
+        self._interval = interval
+        self._captures = dict()
+        self._lock = threading.Lock()
+        self._busy = threading.Event()
+        self._thread = None
+
+    def begin(self, capture: _Capture):
+        with self._lock:
+            self._captures[capture.thread_id] = capture
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+                self._thread.start()
+        self._busy.set()
+
+    def end(self, capture: _Capture):
+        with self._lock:
+            self._captures.pop(capture.thread_id, None)
+            if len(self._captures) == 0:
+                self._busy.clear()
+
+    def _run(self):
+        while True:
+            self._busy.wait()
+            time.sleep(self._interval)
+            now = time.perf_counter()
+            with self._lock:
+                captures = list(self._captures.values())
+            frames = sys._current_frames()
+            for capture in captures:
+                if capture.profiler is None and (self._slow_seconds is None or
+                                                 now - capture.start < self._slow_seconds):
+                    continue
+                frame = frames.get(capture.thread_id)
+                if frame is not None:
+                    capture.stacks[collapse_stack(frame)] += 1
+
+
+def collapse_stack(frame) -> str:
+    """ Returns the stack ending at frame as 'module:function;...' from the outermost call, as flame graph tools
+    read it.
+    """
+    names = list()
+    while frame is not None:
+        names.append(f'{frame.f_globals.get("__name__", "?")}:{frame.f_code.co_name}')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class ProfilingMiddleware:
+    """ WSGI middleware profiling a fraction of requests, and every request slower than a threshold.
+
+    Requests picked at random with probability sample_rate are profiled with cProfile, and their stacks sampled,
+    from start to end. Other requests have their stacks sampled once they've run for slow_seconds. Profiles of
+    requests that were picked, or turned out slower than slow_seconds, are written to directory: the request's
+    details as JSON, its cProfile statistics (readable with pstats) and its sampled stacks in the collapsed format
+    of flame graph tools. Only the most recent keep profiles are kept.
+    """
+
+    def __init__(self, wsgi_app, directory: str, sample_rate: float = 0.0, slow_seconds: float = None,
+                 keep: int = 100, registry=None):
+        self._wsgi_app = wsgi_app
+        self._directory = directory
+        self._sample_rate = sample_rate
+        self._slow_seconds = slow_seconds
+        self._keep = keep
+        self._registry = registry
+        self._sampler = StackSampler(slow_seconds)
+        self._sequence = 0
+        self._write_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def __call__(self, environ, start_response):
+        profiler = None
+        if self._sample_rate > 0 and random.random() < self._sample_rate:
+            profiler = cProfile.Profile()
+        capture = _Capture(threading.get_ident(), time.perf_counter(), profiler)
+        environ[ENVIRON_KEY] = capture
+        if profiler is not None:
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiler is active in this process; sample the stacks only.
+                capture.profiler = profiler = None
+        if profiler is not None or self._slow_seconds is not None:
+            self._sampler.begin(capture)
+
+        def recording_start_response(status, headers, exc_info=None):
+            capture.status = status.split(' ', 1)[0]
+            return start_response(status, headers, exc_info)
+
+        try:
+            body = self._wsgi_app(environ, recording_start_response)
+        except BaseException:
+            self._finish(capture, environ)
+            raise
+        return MeasuredBody(body, capture.record, lambda: self._finish(capture, environ))
+
+    def _finish(self, capture: _Capture, environ: dict):
+        duration = time.perf_counter() - capture.start
+        if capture.profiler is not None:
+            capture.profiler.disable()
+        self._sampler.end(capture)
+
+        if capture.profiler is not None:
+            reason = 'sampled'
+        elif self._slow_seconds is not None and duration >= self._slow_seconds:
+            reason = 'slow'
+        else:
+            return
+        self._write(capture, environ, duration, reason)
+        if self._registry is not None:
+            self._registry.increment('profiles_captured_total', (('reason', reason),))
+
+    def _write(self, capture: _Capture, environ: dict, duration: float, reason: str):
+        with self._write_lock:
+            self._sequence += 1
+            sequence = self._sequence
+        endpoint = capture.endpoint or 'unmatched'
+        name = f'{datetime.now().strftime("%Y%m%dT%H%M%S.%f")}-{os.getpid()}-{sequence:06d}-{endpoint}'
+        base = os.path.join(self._directory, name)
+
+        files = ['json']
+        if capture.profiler is not None:
+            capture.profiler.dump_stats(base + '.pstats')
+            files.append('pstats')
+        # The sampler may still be adding a last sample.
+        stacks = dict(capture.stacks)
+        if len(stacks) > 0:
+            with open(base + '.collapsed', 'w') as collapsed:
+                for stack, count in stacks.items():
+                    collapsed.write(f'{stack} {count}\n')
+            files.append('collapsed')
+
+        metadata = {
+            'reason': reason,
+            'method': environ.get('REQUEST_METHOD'),
+            'path': environ.get('PATH_INFO'),
+            'query': environ.get('QUERY_STRING'),
+            'endpoint': endpoint,
+            'status': capture.status,
+            'duration': duration,
+            'response_size': capture.record['size'],
+            'samples': sum(stacks.values()),
+            'sample_interval': SAMPLE_INTERVAL,
+            'pid': os.getpid(),
+            'time': datetime.now().isoformat(),
+            'files': [f'{name}.{extension}' for extension in files]
+        }
+        with open(base + '.json', 'w') as metadata_file:
+            json.dump(metadata, metadata_file, indent=2)
+        self._rotate()
+
+    def _rotate(self):
+        # Profiles are named from their time, so the oldest sort first.
+        with self._write_lock:
+            names = sorted(name for name in os.listdir(self._directory) if name.endswith('.json'))
+            for name in names[:max(0, len(names) - self._keep)]:
+                base = name[:-len('.json')]
+                for extension in ('.json', '.pstats', '.collapsed'):
+                    try:
+                        os.remove(os.path.join(self._directory, base + extension))
+                    except FileNotFoundError:
+                        pass
+
+
+def init_profiling(app):
+    """ Profiles requests as configured by PROFILE_SAMPLE_RATE and PROFILE_SLOW_REQUEST_SECONDS.
+
+    Nothing is installed when neither is set, so requests pay nothing for profiling being available.
+    """
+    sample_rate = float(app.config.get('PROFILE_SAMPLE_RATE') or 0)
+    slow_seconds = app.config.get('PROFILE_SLOW_REQUEST_SECONDS')
+    slow_seconds = float(slow_seconds) if slow_seconds else None
+    if sample_rate <= 0 and slow_seconds is None:
+        return
+
+    registry = app.extensions.get('metrics')
+    if registry is not None:
+        registry.describe('profiles_captured_total', 'counter', 'Request profiles written, by reason.')
+    app.wsgi_app = ProfilingMiddleware(app.wsgi_app, app.config.get('PROFILE_DIRECTORY') or 'profiles',
+                                       sample_rate, slow_seconds, int(app.config.get('PROFILE_KEEP') or 100),
+                                       registry)
+
+    @app.before_request
+    def record_profiled_endpoint():
+        capture = request.environ.get(ENVIRON_KEY)
+        if capture is not None:
+            capture.endpoint = request.endpoint
@@ -0,0 +1,131 @@
+import importlib
+import threading
+import time
+from contextlib import contextmanager
+
+import click
+from flask import Response, request
+
+
+# Modules only needed to validate forms; see load_validators().
+VALIDATOR_MODULES = ('better_profanity', 'password_validator')
+
+# Endpoints that answer while the catalogue is still loading.
+ALWAYS_AVAILABLE_ENDPOINTS = {'monitoring_bp.health', 'monitoring_bp.ready', 'monitoring_bp.metrics', 'static'}
+
+
+class StartupReport:
+    """ How long each phase of starting the application took, and whether the application is ready to serve.
+
+    Phases are recorded in the order they finish; a phase run in the background (such as loading the catalogue in
+    lazy mode) is recorded from the thread that runs it.
+    """
+
+    def __init__(self, import_seconds: float = None):
+        self._start = time.perf_counter()
+        self._phases = list()
+        if import_seconds is not None:
+            self._phases.append(('import watch_movies', import_seconds))
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        # Set once loading has finished, whether it succeeded or failed, to release the waiters.
+        self._done = threading.Event()
+        self._ready_seconds = None
+        self._error = None
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._phases.append((name, time.perf_counter() - start))
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    @property
+    def error(self):
+        return self._error
+
+    def wait_until_ready(self, timeout: float = None) -> bool:
+        # Waits until loading has finished, and returns whether the application is ready: False if loading failed
+        # (see error) or didn't finish within timeout.
+        self._done.wait(timeout)
+        return self.ready
+
+    def mark_ready(self):
+        self._ready_seconds = time.perf_counter() - self._start
+        self._ready.set()
+        self._done.set()
+
+    def mark_failed(self, error: BaseException):
+        self._error = f'{type(error).__name__}: {error}'
+        self._done.set()
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            phases = list(self._phases)
+        return {
+            'ready': self.ready,
+            'error': self._error,
+            'seconds_until_ready': self._ready_seconds,
+            'phases': [{'phase': name, 'seconds': seconds} for name, seconds in phases]
+        }
+
+    def format(self) -> str:
+        report = self.as_dict()
+        lines = ['Startup:']
+        for phase in report['phases']:
+            lines.append(f'  {phase["phase"]:<32}{phase["seconds"] * 1000:>10.1f}ms')
+        if report['seconds_until_ready'] is not None:
+            lines.append(f'  {"ready after":<32}{report["seconds_until_ready"] * 1000:>10.1f}ms')
+        if report['error'] is not None:
+            lines.append(f'  failed: {report["error"]}')
+        return '\n'.join(lines)
+
+
+def load_validators(report: StartupReport):
+    # Imports the form validators' libraries now rather than on their first use.
+    with report.phase('import validators'):
+        for module in VALIDATOR_MODULES:
+            importlib.import_module(module)
+
+
+def wait_until_ready_or_exit(report: StartupReport):
+    # For commands that need the loaded application: exits with an error if loading it failed.
+    if not report.wait_until_ready():
+        raise click.ClickException(f'Loading the application failed: {report.error}')
+
+
+def load_in_background(app, report: StartupReport, load):
+    """ Runs load in a background thread, marking the application ready when it returns.
+
+    Until then, every request other than the health, readiness and metrics endpoints is answered with 503 Service
+    Unavailable; if load raises, they are answered with 500 Internal Server Error, and the error is reported by the
+    readiness endpoint.
+    """
+
+    @app.before_request
+    def unavailable_until_ready():
+        if not report.ready and request.endpoint not in ALWAYS_AVAILABLE_ENDPOINTS:
+            if report.error is not None:
+                return Response('The catalogue failed to load.\n', status=500, mimetype='text/plain')
+            return Response('The catalogue is loading, try again shortly.\n', status=503,
+                            headers={'Retry-After': '1'}, mimetype='text/plain')
+
+    def run():
+        try:
+            load()
+        except Exception as e:
+            report.mark_failed(e)
+            app.logger.exception('Loading the application failed')
+            return
+        report.mark_ready()
+        app.logger.info(report.format())
+
+    thread = threading.Thread(target=run, name='startup-loader', daemon=True)
+    thread.start()
+    return thread
@@ -1,9 +1,9 @@
 from datetime import date
+from urllib.parse import urlsplit, urlunsplit
 
 from flask import Blueprint
-from flask import request, render_template, redirect, url_for, session
+from flask import abort, request, render_template, redirect, url_for, session
 
-from better_profanity import profanity
 from flask_wtf import FlaskForm
 from wtforms import TextAreaField, HiddenField, SubmitField, Form, StringField, SelectField
 from wtforms.validators import DataRequired, Length, ValidationError
@@ -46,7 +46,7 @@ def movies_by_id():
 
     # Fetch movie(s) for the target id. This call also returns the previous and next ids for watch_movie immediately
     # before and after the target.
-    movies, previous_id, next_id = services.get_movies_by_ids(target_id, repo.repo_instance)
+    movies, previous_id, next_id = services.get_movies_by_id(target_id, repo.repo_instance)
 
     first_movie_url = None
     last_movie_url = None
@@ -69,10 +69,11 @@ def movies_by_id():
         for movie in movies:
             movie['view_review_url'] = url_for('movie_lib_bp.movies_by_id', id=target_id, view_reviews_for=movie['id'])
             movie['add_review_url'] = url_for('movie_lib_bp.write_review_on_movie', movie=movie['id'])
+        add_watchlist_urls(movies)
 
         # Generate the webpage to display the watch_movie.
         return render_template(
-            'movie_lib/watch_movie.html',
+            'movie_lib/movie.html',
             title='Movies',
             movies_title="ided: " + str(target_id),
             movies=movies,
@@ -143,10 +144,11 @@ def movies_by_actor():
     for movie in movies:
         movie['view_review_url'] = url_for('movie_lib_bp.movies_by_actor', actor=actor_name, cursor=cursor, view_reviews_for = movie['id'])
         movie['add_review_url'] = url_for('movie_lib_bp.write_review_on_movie', movie=movie['id'])
+    add_watchlist_urls(movies)
 
     # Generate the webpage to display the watch_movie.
     return render_template(
-        'movie_lib/watch_movie.html',
+        'movie_lib/movie.html',
         title='Movies',
         movies_title='Movies featuring ' + actor_name,
         movies=movies,
@@ -215,10 +217,11 @@ def movies_by_genre():
     for movie in movies:
         movie['view_review_url'] = url_for('movie_lib_bp.movies_by_genre', genre=genre_name, cursor=cursor, view_reviews_for=movie['id'])
         movie['add_review_url'] = url_for('movie_lib_bp.write_review_on_movie', movie=movie['id'])
+    add_watchlist_urls(movies)
 
     # Generate the webpage to display the watch_movie.
     return render_template(
-        'movie_lib/watch_movie.html',
+        'movie_lib/movie.html',
         title='Movies',
         movies_title=genre_name + ' Movies',
         movies=movies,
@@ -286,10 +289,11 @@ def movies_by_director():
     for movie in movies:
         movie['view_review_url'] = url_for('movie_lib_bp.movies_by_director', director=director_name, cursor=cursor, view_reviews_for=movie['id'])
         movie['add_review_url'] = url_for('movie_lib_bp.write_review_on_movie', movie=movie['id'])
+    add_watchlist_urls(movies)
 
     # Generate the webpage to display the watch_movie.
     return render_template(
-        'movie_lib/watch_movie.html',
+        'movie_lib/movie.html',
         title='Movies',
         movies_title = 'Movies directed by ' + director_name,
         movies=movies,
@@ -305,6 +309,126 @@ def movies_by_director():
     )
 
 
+def add_watchlist_urls(movies):
+    # Adds the urls the forms to add each movie to the watchlist, remove it and mark it watched are posted to, and
+    # whether it's in the logged in user's watchlist: a constant-time check per movie.
+    services.set_watchlist_flags(movies, session.get('username'), repo.repo_instance)
+    add_to_watchlist_url = url_for('movie_lib_bp.add_to_watchlist')
+    remove_from_watchlist_url = url_for('movie_lib_bp.remove_from_watchlist')
+    watch_url = url_for('movie_lib_bp.watch_movie')
+    for movie in movies:
+        movie['add_to_watchlist_url'] = add_to_watchlist_url
+        movie['remove_from_watchlist_url'] = remove_from_watchlist_url
+        movie['watch_url'] = watch_url
+
+
+@movie_library_blueprint.route('/watchlist/add', methods=['POST'])
+@login_required
+def add_to_watchlist():
+    # Adds the movies given by one or more movie fields, e.g. movie=1&movie=2.
+    services.add_to_watchlist(_movie_ids(), session['username'], repo.repo_instance)
+    return _redirect_back(url_for('movie_lib_bp.watchlist'))
+
+
+@movie_library_blueprint.route('/watchlist/remove', methods=['POST'])
+@login_required
+def remove_from_watchlist():
+    services.remove_from_watchlist(_movie_ids(), session['username'], repo.repo_instance)
+    return _redirect_back(url_for('movie_lib_bp.watchlist'))
+
+
+@movie_library_blueprint.route('/watch', methods=['POST'])
+@login_required
+def watch_movie():
+    movie_ids = _movie_ids()
+    if len(movie_ids) != 1:
+        abort(400)
+    try:
+        services.watch_movie(movie_ids[0], session['username'], repo.repo_instance)
+    except services.NonExistentMovieException:
+        abort(404)
+    return _redirect_back(url_for('movie_lib_bp.watch_history'))
+
+
+def _movie_ids():
+    # The movie ids posted by a watchlist form, once its CSRF token is checked.
+    if not WatchlistForm().validate_on_submit():
+        abort(400)
+    try:
+        return [int(movie_id) for movie_id in request.form.getlist('movie')]
+    except ValueError:
+        abort(400)
+
+
+def _redirect_back(default_url: str):
+    # Returns to the page the form was posted from, unless it's on another site. Only the path and query are kept,
+    # and paths browsers would read as another host ('//host', '/\host') are refused.
+    referrer = urlsplit(request.referrer or '')
+    same_site = (referrer.scheme, referrer.netloc) in (('', ''), (request.scheme, request.host))
+    if same_site and referrer.path.startswith('/') and not referrer.path.startswith(('//', '/\\')):
+        return redirect(urlunsplit(('', '', referrer.path, referrer.query, '')))
+    return redirect(default_url)
+
+
+@movie_library_blueprint.route('/watchlist', methods=['GET'])
+@login_required
+def watchlist():
+    return _my_movies('watchlist', services.get_watchlist, 'Your watchlist')
+
+
+@movie_library_blueprint.route('/watch_history', methods=['GET'])
+@login_required
+def watch_history():
+    return _my_movies('watch_history', services.get_watch_history, 'Watched',
+                      services.get_watch_stats(session['username'], repo.repo_instance))
+
+
+def _my_movies(endpoint: str, get_page, title: str, watch_stats: dict = None):
+    # A page of the logged in user's watchlist or watch history.
+    movies_per_page = 3
+    cursor = request.args.get('cursor', 0, type=int)
+    movies, total = get_page(session['username'], cursor, movies_per_page, repo.repo_instance)
+
+    first_movie_url = None
+    last_movie_url = None
+    next_movie_url = None
+    prev_movie_url = None
+
+    if cursor > 0:
+        prev_movie_url = url_for(f'movie_lib_bp.{endpoint}', cursor=max(0, cursor - movies_per_page))
+        first_movie_url = url_for(f'movie_lib_bp.{endpoint}')
+
+    if cursor + movies_per_page < total:
+        next_movie_url = url_for(f'movie_lib_bp.{endpoint}', cursor=cursor + movies_per_page)
+
+        last_cursor = movies_per_page * int(total / movies_per_page)
+        if total % movies_per_page == 0:
+            last_cursor -= movies_per_page
+        last_movie_url = url_for(f'movie_lib_bp.{endpoint}', cursor=last_cursor)
+
+    for movie in movies:
+        movie['view_review_url'] = url_for('movie_lib_bp.movies_by_id', id=movie['id'], view_reviews_for=movie['id'])
+        movie['add_review_url'] = url_for('movie_lib_bp.write_review_on_movie', movie=movie['id'])
+    add_watchlist_urls(movies)
+
+    return render_template(
+        'movie_lib/movie.html',
+        title='Movies',
+        movies_title=f'{title} ({total} movies)',
+        movies=movies,
+        watch_stats=watch_stats,
+        selected_movies=utilities.get_selected_movies(3),
+        actor_urls=utilities.get_actors_and_urls(),
+        director_urls=utilities.get_directors_and_urls(),
+        genre_urls=utilities.get_genres_and_urls(),
+        first_movie_url=first_movie_url,
+        last_movie_url=last_movie_url,
+        prev_movie_url=prev_movie_url,
+        next_movie_url=next_movie_url,
+        show_reviews_for_movie=-1,
+    )
+
+
 @movie_library_blueprint.route('/review', methods=['GET', 'POST'])
 @login_required
 def write_review_on_movie():
@@ -362,10 +486,18 @@ class ProfanityFree:
         self.message = message
 
     def __call__(self, form, field):
+        # Imported on first use: importing better_profanity loads its word list.
+        from better_profanity import profanity
+
         if profanity.contains_profanity(field.data):
             raise ValidationError(self.message)
 
 
+class WatchlistForm(FlaskForm):
+    # The movie fields are read as a list; the form checks the CSRF token.
+    movie = HiddenField('Movie id')
+
+
 class ReviewForm(FlaskForm):
     review = TextAreaField('Review', [
         DataRequired(),
@@ -49,10 +49,10 @@ def get_last_movie(repo: AbstractRepository):
     return movie_to_dict(movie)
 
 
-def get_movies_by_ids(id, repo: AbstractRepository):
-    # Returns articles for the target date (empty if no matches), the date of the previous article (might be null), the date of the next article (might be null)
+def get_movies_by_id(id, repo: AbstractRepository):
+    # Returns movies for the target id (empty if no matches), the id of the previous movie (might be null), the id of the next movie (might be null)
 
-    movies = repo.get_movies_by_ids(id)
+    movies = repo.get_movies_by_ids([id])
 
     movies_dto = list()
     prev_id = next_id = None
@@ -103,6 +103,61 @@ def get_reviews_for_movie(movie_id, repo: AbstractRepository):
     return reviews_to_dict(movie.reviews)
 
 
+def _get_user(username: str, repo: AbstractRepository) -> User:
+    user = repo.get_user(username)
+    if user is None:
+        raise UnknownUserException
+    return user
+
+
+def add_to_watchlist(movie_ids: List[int], username: str, repo: AbstractRepository) -> int:
+    # Ids of movies that don't exist, and movies already in the watchlist, are skipped.
+    user = _get_user(username, repo)
+    return repo.add_to_watchlist(user, repo.get_movies_by_ids(movie_ids))
+
+
+def remove_from_watchlist(movie_ids: List[int], username: str, repo: AbstractRepository) -> int:
+    user = _get_user(username, repo)
+    return repo.remove_from_watchlist(user, movie_ids)
+
+
+def watch_movie(movie_id: int, username: str, repo: AbstractRepository):
+    movie = repo.get_movie(movie_id)
+    if movie is None:
+        raise NonExistentMovieException
+
+    repo.add_watched_movie(_get_user(username, repo), movie)
+
+
+def get_watchlist(username: str, cursor: int, quantity: int, repo: AbstractRepository):
+    # A page of the user's watchlist, in the order the movies were added, and the number of movies in it.
+    user = _get_user(username, repo)
+    return movies_to_dict(user.watchlist_page(cursor, cursor + quantity)), user.watchlist_size
+
+
+def get_watch_history(username: str, cursor: int, quantity: int, repo: AbstractRepository):
+    # A page of the movies the user has watched, most recently watched first, and the number of movies watched.
+    user = _get_user(username, repo)
+    return movies_to_dict(user.watch_history_page(cursor, cursor + quantity)), user.number_of_watched_movies
+
+
+def get_watch_stats(username: str, repo: AbstractRepository) -> dict:
+    user = _get_user(username, repo)
+    return {
+        'movies_watched': user.number_of_watched_movies,
+        'times_watched': user.total_times_watched,
+        'minutes_watched': user.time_spent_watching_movies_minutes,
+        'top_genres': user.top_genres(3)
+    }
+
+
+def set_watchlist_flags(movies: List[dict], username: str, repo: AbstractRepository):
+    # Marks each movie dict with whether the user has it in their watchlist; no movies are when nobody is logged in.
+    user = repo.get_user(username) if username is not None else None
+    for movie in movies:
+        movie['in_watchlist'] = user is not None and user.is_in_watchlist(movie['id'])
+
+
 # ============================================
 # Functions to convert model entities to dicts
 # ============================================
@@ -116,6 +171,11 @@ def movie_to_dict(movie: Movie):
         'director': movie.director,
         'actors': movie.actors,
         'genres': movie.genres,
+        'runtime_minutes': movie.runtime_minutes,
+        'rating': movie.rating,
+        'votes': movie.votes,
+        'revenue_millions': movie.revenue_millions,
+        'metascore': movie.metascore,
         'reviews': movie.reviews
 
     }
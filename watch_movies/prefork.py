@@ -0,0 +1,170 @@
+"""Preload-and-fork server.
+
+The application (and with it the repository and its indexes) is built once in the master process. The master then
+freezes the garbage collector's view of every object it holds and forks the workers, which serve from one shared
+listening socket. Frozen objects are never visited by the collector again, so the workers don't dirty - and so don't
+copy - the pages holding the catalogue just by collecting garbage, and N workers cost close to one catalogue's worth
+of memory instead of N.
+
+Run with:  python -m watch_movies.prefork --workers 4 --port 5000
+"""
+
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+from werkzeug.serving import make_server
+
+
+def read_memory_usage(pid: int):
+    """ Returns the memory of process pid in kB, split into pages unique to it and pages shared with others.
+
+    Reads /proc/<pid>/smaps_rollup, so it is only available on Linux; returns None elsewhere.
+    """
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as infile:
+            fields = dict()
+            for line in infile:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == 'kB':
+                    fields[parts[0].rstrip(':')] = int(parts[1])
+    except OSError:
+        return None
+
+    return {
+        'rss': fields.get('Rss', 0),
+        'pss': fields.get('Pss', 0),
+        'unique': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0),
+        'shared': fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0)
+    }
+
+
+def memory_report(master_pid: int, worker_pids):
+    lines = ['pid       role      rss kB    pss kB    unique kB shared kB']
+    total_unique = 0
+    for role, pid in [('master', master_pid)] + [('worker', pid) for pid in worker_pids]:
+        usage = read_memory_usage(pid)
+        if usage is None:
+            return 'Memory report not available on this platform'
+        lines.append(f"{pid:<9} {role:<9} {usage['rss']:<9} {usage['pss']:<9} {usage['unique']:<9} {usage['shared']}")
+        total_unique += usage['unique']
+    lines.append(f'Unique memory across all processes: {total_unique} kB')
+    return '\n'.join(lines)
+
+
+class PreforkServer:
+
+    def __init__(self, app, host: str, port: int, workers: int, threaded: bool = False):
+        self._app = app
+        self._host = host
+        self._port = port
+        self._workers = workers
+        self._threaded = threaded
+        self._socket = None
+        self._worker_pids = set()
+        self._stopping = False
+
+    @property
+    def worker_pids(self):
+        return sorted(self._worker_pids)
+
+    def serve(self, report_interval: float = 0):
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind((self._host, self._port))
+        self._socket.listen(128)
+        self._socket.set_inheritable(True)
+
+        # Move everything built so far out of reach of the collector, so that workers never write to it.
+        gc.collect()
+        gc.freeze()
+
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        for _ in range(self._workers):
+            self._spawn_worker()
+
+        print(f' * Serving on http://{self._host}:{self._port} with {self._workers} preforked workers')
+        self._supervise(report_interval)
+
+    def _spawn_worker(self):
+        pid = os.fork()
+        if pid == 0:
+            # Worker: restore default signal handling and collect garbage created from now on as usual.
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            gc.enable()
+            server = make_server(self._host, self._port, self._app, threaded=self._threaded, fd=self._socket.fileno())
+            try:
+                server.serve_forever()
+            finally:
+                os._exit(0)
+        self._worker_pids.add(pid)
+
+    def _supervise(self, report_interval: float):
+        # Give workers a moment to start serving before the first report.
+        next_report = time.monotonic() + 1
+        while not self._stopping:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                pid = 0
+            if pid != 0 and pid in self._worker_pids:
+                # A worker died unexpectedly; replace it to keep capacity.
+                self._worker_pids.discard(pid)
+                if not self._stopping:
+                    self._spawn_worker()
+
+            if next_report is not None and time.monotonic() >= next_report:
+                print(memory_report(os.getpid(), self.worker_pids), flush=True)
+                next_report = time.monotonic() + report_interval if report_interval > 0 else None
+
+            time.sleep(0.5)
+
+        for pid in self._worker_pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+
+    def _stop(self, signum, frame):
+        self._stopping = True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve the application from preforked workers sharing one catalogue.')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--threaded', action='store_true', help='Serve requests with a thread per request in workers.')
+    parser.add_argument('--report-interval', type=float, default=0,
+                        help='Seconds between worker memory reports; 0 reports once after start up.')
+    args = parser.parse_args(argv)
+
+    from config import Config
+    if Config.JOURNAL_PATH:
+        # The journal's writer thread doesn't survive fork, and workers must not share one log. Checked before the
+        # app is created, which would open the journal and replay it.
+        sys.exit('The preforked server cannot be used with JOURNAL_PATH set')
+
+    # Objects created while loading are long-lived; don't let collections run (and scatter them) while loading.
+    gc.disable()
+
+    from watch_movies import create_app
+    app = create_app()
+    # Threads don't survive fork: with LAZY_STARTUP, let the catalogue finish loading before forking the workers.
+    report = app.extensions['startup']
+    if not report.wait_until_ready():
+        sys.exit(f'Loading the application failed: {report.error}')
+
+    PreforkServer(app, args.host, args.port, args.workers, args.threaded).serve(args.report_interval)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,295 @@
+import re
+import time
+from contextlib import contextmanager
+from typing import List
+
+from watch_movies.adapters.memory_repository import title_words
+from watch_movies.adapters.movie_columns import And, Between, Not
+from watch_movies.adapters.repository import AbstractRepository
+
+
+# Fields answered by a repository posting list, in the order their lists are fetched: the fields that usually
+# match fewest movies first, so that a query with no matches stops early.
+INDEX_FIELDS = {
+    'director': 'get_movie_ids_for_director',
+    'actor': 'get_movie_ids_for_actor',
+    'title': 'get_movie_ids_for_title_word',
+    'genre': 'get_movie_ids_for_genre'
+}
+
+# Fields filtered on the numeric movie columns, and the Movie attribute of each.
+NUMERIC_FIELDS = {
+    'year': 'release_year',
+    'runtime': 'runtime_minutes',
+    'rating': 'rating',
+    'votes': 'votes',
+    'revenue': 'revenue_millions',
+    'metascore': 'metascore'
+}
+
+# Fields only checked against the movies the other terms select.
+TEXT_FIELDS = ('description',)
+
+# Numeric filters are checked movie by movie when the other terms select at most this many movies, and evaluated
+# over the whole columns otherwise.
+MAX_CHECKED_MOVIES = 256
+
+_TOKEN = re.compile(r'(-?)(?:([A-Za-z]+):)?(?:"([^"]*)"|([^\s"]+))')
+
+
+class QueryException(Exception):
+    pass
+
+
+class Term:
+    """ One condition of a query: a field, its value, and whether the condition is negated.
+
+    value is a name or text for index and text fields, and a (low, high) pair, either of which may be None, for
+    numeric fields.
+    """
+
+    def __init__(self, field: str, value, negated: bool = False, quoted: bool = False):
+        self.field = field
+        self.value = value
+        self.negated = negated
+        self.quoted = quoted
+
+    def __repr__(self):
+        if self.field in NUMERIC_FIELDS:
+            low, high = self.value
+            text = str(low) if low == high else f'{_format(low)}..{_format(high)}'
+        else:
+            text = f'"{self.value}"' if self.quoted else self.value
+        return f'{"-" if self.negated else ""}{self.field}:{text}'
+
+
+def parse_query(text: str) -> List[Term]:
+    """ Parses a query such as actor:"Chris Pratt" genre:Action year:2010..2016 -genre:Horror "galaxy".
+
+    Terms are separated by spaces and all must hold; a term prefixed by - must not. Text without a field matches
+    words of the title (quoted text matches that phrase of the title). Numeric fields take a value or a range,
+    either end of which may be left open (rating:8..). Raises QueryException for text that isn't a valid query.
+    """
+    terms = list()
+    position = 0
+    text = text.strip()
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if match is None:
+            raise QueryException(f'Unexpected {text[position:]!r}; check that quotes are closed')
+        negated, field, quoted, bare = match.groups()
+        field = field.lower() if field is not None else 'title'
+        value = quoted if quoted is not None else bare
+        if field not in INDEX_FIELDS and field not in NUMERIC_FIELDS and field not in TEXT_FIELDS:
+            raise QueryException(f'Unknown field {field!r}; use one of {", ".join(_fields())}')
+        if value.strip() == '':
+            raise QueryException(f'{field} needs a value')
+        if field in NUMERIC_FIELDS:
+            terms.append(Term(field, _parse_range(field, value), negated == '-'))
+        else:
+            terms.append(Term(field, value.strip(), negated == '-', quoted is not None))
+        position = match.end()
+        while position < len(text) and text[position].isspace():
+            position += 1
+    if len(terms) == 0:
+        raise QueryException('The query is empty')
+    return terms
+
+
+def _fields() -> List[str]:
+    return list(INDEX_FIELDS) + list(NUMERIC_FIELDS) + list(TEXT_FIELDS)
+
+
+def _parse_range(field: str, value: str) -> tuple:
+    low, separator, high = value.partition('..')
+    try:
+        low = _number(low) if low != '' else None
+        high = (_number(high) if high != '' else None) if separator else low
+    except ValueError:
+        raise QueryException(f'{field} takes a number or a range such as 2010..2016, not {value!r}')
+    if low is None and high is None:
+        raise QueryException(f'{field} needs at least one end of its range')
+    return low, high
+
+
+def _number(text: str):
+    number = float(text)
+    return int(number) if number.is_integer() else number
+
+
+def _format(number) -> str:
+    return '' if number is None else str(number)
+
+
+class PlanStep:
+    """ One step of a query plan, with the number of movies it left and how long it took once executed. """
+
+    def __init__(self, operation: str, detail: str):
+        self.operation = operation
+        self.detail = detail
+        self.rows = None
+        self.seconds = None
+
+    def as_dict(self) -> dict:
+        return {'operation': self.operation, 'detail': self.detail, 'rows': self.rows,
+                'ms': round(self.seconds * 1000, 3) if self.seconds is not None else None}
+
+
+class QueryResult:
+    # The ascending ids of the movies matching a query, and the steps that found them.
+
+    def __init__(self, terms: List[Term], movie_ids: List[int], steps: List[PlanStep], seconds: float):
+        self.terms = terms
+        self.movie_ids = movie_ids
+        self.steps = steps
+        self.seconds = seconds
+
+    def explain(self) -> dict:
+        return {'terms': [repr(term) for term in self.terms], 'steps': [step.as_dict() for step in self.steps],
+                'results': len(self.movie_ids), 'ms': round(self.seconds * 1000, 3)}
+
+
+def run_query(terms: List[Term], repo: AbstractRepository) -> QueryResult:
+    """ Finds the movies matching all of terms, using the repository's posting lists and columns.
+
+    1. The posting lists of the positive actor, director, genre and title word terms are fetched, and intersected
+       from the shortest up, stopping as soon as the intersection is empty.
+    2. Numeric terms are checked movie by movie when step 1 left at most MAX_CHECKED_MOVIES movies, and otherwise
+       evaluated as one vectorized filter over the columns, restricted to the movies step 1 left.
+    3. The posting lists of negated index terms are subtracted.
+    4. Title phrases and description terms are checked against the movies that remain: full text is only read for
+       those.
+
+    Raises QueryException for queries that would have to read the full text of the whole catalogue, i.e. those
+    with neither a positive index term nor a numeric term.
+    """
+    start = time.perf_counter()
+    steps = list()
+    index_terms = [term for term in terms if term.field in INDEX_FIELDS and not term.negated]
+    numeric_terms = [term for term in terms if term.field in NUMERIC_FIELDS]
+    excluded_terms = [term for term in terms if term.field in INDEX_FIELDS and term.negated]
+    text_terms = [term for term in terms if _needs_text(term)]
+    if len(index_terms) == 0 and len(numeric_terms) == 0:
+        raise QueryException('Add an actor, director, genre, title word or numeric term: other terms are only '
+                             'checked against the movies those select')
+
+    candidates = None
+    if len(index_terms) > 0:
+        candidates = _intersect_postings(index_terms, repo, steps)
+
+    if len(numeric_terms) > 0 and (candidates is None or len(candidates) > 0):
+        if candidates is not None and len(candidates) <= MAX_CHECKED_MOVIES:
+            with _step(steps, 'check', ' '.join(repr(term) for term in numeric_terms)) as step:
+                movies = repo.get_movies_by_ids(candidates)
+                candidates = [movie.id for movie in movies if all(_holds(term, movie) for term in numeric_terms)]
+                step.rows = len(candidates)
+        else:
+            predicates = [_predicate(term) for term in numeric_terms]
+            with _step(steps, 'filter', ' '.join(repr(term) for term in numeric_terms)) as step:
+                predicate = predicates[0] if len(predicates) == 1 else And(*predicates)
+                candidates = repo.get_movie_ids_matching(predicate, candidates)
+                step.rows = len(candidates)
+
+    for term in excluded_terms:
+        if len(candidates) == 0:
+            break
+        with _step(steps, 'exclude', repr(term)) as step:
+            excluded = set(_posting_list(term, repo))
+            candidates = [movie_id for movie_id in candidates if movie_id not in excluded]
+            step.rows = len(candidates)
+
+    if len(text_terms) > 0 and len(candidates) > 0:
+        with _step(steps, 'text', ' '.join(repr(term) for term in text_terms)) as step:
+            movies = repo.get_movies_by_ids(candidates)
+            candidates = [movie.id for movie in movies if all(_text_holds(term, movie) for term in text_terms)]
+            step.rows = len(candidates)
+
+    return QueryResult(terms, candidates, steps, time.perf_counter() - start)
+
+
+def _intersect_postings(terms: List[Term], repo: AbstractRepository, steps: List[PlanStep]) -> List[int]:
+    postings = list()
+    for term in sorted(terms, key=lambda term: list(INDEX_FIELDS).index(term.field)):
+        for word in _words(term):
+            with _step(steps, 'lookup', f'{term.field}:{word}') as step:
+                posting_list = _posting_list(term, repo, word)
+                step.rows = len(posting_list)
+            if len(posting_list) == 0:
+                return list()
+            postings.append(posting_list)
+
+    # Intersect from the shortest list up, so each step probes the fewest ids.
+    postings.sort(key=len)
+    candidates = postings[0]
+    for posting_list in postings[1:]:
+        with _step(steps, 'intersect', f'{len(candidates)} with {len(posting_list)} ids') as step:
+            candidates = _intersection(candidates, posting_list)
+            step.rows = len(candidates)
+        if len(candidates) == 0:
+            break
+    return candidates
+
+
+def _words(term: Term) -> List[str]:
+    # The keys term looks up: each word of a title term, or the name of any other index term.
+    if term.field == 'title':
+        words = title_words(term.value)
+        if len(words) == 0:
+            raise QueryException(f'{term!r} has no words to look up')
+        return words
+    return [term.value]
+
+
+def _posting_list(term: Term, repo: AbstractRepository, key: str = None) -> List[int]:
+    lookup = getattr(repo, INDEX_FIELDS[term.field])
+    if term.field == 'title':
+        if key is not None:
+            return lookup(key)
+        # A negated title term excludes the movies with all of its words.
+        return _intersect_postings([Term('title', term.value)], repo, list())
+    movie_ids = lookup(term.value)
+    if len(movie_ids) == 0 and term.value.title() != term.value:
+        # Names are stored capitalized; accept them typed in lowercase.
+        movie_ids = lookup(term.value.title())
+    return movie_ids
+
+
+def _intersection(ascending: List[int], other: List[int]) -> List[int]:
+    other = set(other)
+    return [movie_id for movie_id in ascending if movie_id in other]
+
+
+def _needs_text(term: Term) -> bool:
+    # Title terms found by their words alone need no check of the text; phrases do, to check the words' order.
+    if term.field in TEXT_FIELDS:
+        return True
+    return term.field == 'title' and not term.negated and term.quoted and len(title_words(term.value)) > 1
+
+
+def _text_holds(term: Term, movie) -> bool:
+    text = movie.description if term.field == 'description' else movie.title
+    found = text is not None and term.value.lower() in text.lower()
+    return found != term.negated
+
+
+def _holds(term: Term, movie) -> bool:
+    value = getattr(movie, NUMERIC_FIELDS[term.field])
+    low, high = term.value
+    within = value is not None and (low is None or value >= low) and (high is None or value <= high)
+    return within != term.negated
+
+
+def _predicate(term: Term):
+    # Numeric fields are named after the movie columns.
+    predicate = Between(term.field, *term.value)
+    return Not(predicate) if term.negated else predicate
+
+
+@contextmanager
+def _step(steps: List[PlanStep], operation: str, detail: str):
+    # Times a plan step and appends it to steps.
+    step = PlanStep(operation, detail)
+    start = time.perf_counter()
+    yield step
+    step.seconds = time.perf_counter() - start
+    steps.append(step)
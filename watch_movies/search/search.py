@@ -1,5 +1,5 @@
 from flask import Blueprint
-from flask import request, render_template, redirect, url_for, session, flash
+from flask import request, render_template, redirect, url_for, session, flash, jsonify
 
 from flask_wtf import FlaskForm
 from wtforms import TextAreaField, HiddenField, SubmitField, Form, StringField, SelectField
@@ -7,7 +7,10 @@ from wtforms.validators import DataRequired, Length, ValidationError
 
 import watch_movies.adapters.repository as repo
 import watch_movies.movie_lib.movie_lib as movie_lib
+import watch_movies.movie_lib.services as movie_services
 import watch_movies.search.services as services
+import watch_movies.utilities.utilities as utilities
+from watch_movies.search.query import QueryException
 
 search_blueprint = Blueprint(
     'search_bp', __name__)
@@ -22,11 +25,15 @@ def search():
     return render_template('search/search.html',
                            form=search,
                            title="search",
-                           description="search for watch_movies by actor, genre or director")
+                           description="search for watch_movies by actor, genre or director, or choose Query to "
+                                       "combine terms such as actor:\"Chris Pratt\" genre:Action year:2010..2016 "
+                                       "-genre:Horror galaxy")
 
 
 @search_blueprint.route('/results')
 def search_results(search, select):
+    if select == "Query":
+        return redirect(url_for('search_bp.query', q=search))
     search = search.title()
     exists = services.search_exists(search, select, repo.repo_instance)
     if exists:
@@ -41,9 +48,74 @@ def search_results(search, select):
         return redirect(url_for('search_bp.search'))
 
 
+@search_blueprint.route('/search/query', methods=['GET'])
+def query():
+    movies_per_page = 3
+
+    # Read query parameters.
+    query_text = request.args.get('q', '')
+    cursor = max(0, request.args.get('cursor', 0, type=int))
+    explain = request.args.get('explain') is not None
+
+    try:
+        result = services.query_movies(query_text, repo.repo_instance)
+    except QueryException as e:
+        if explain:
+            return jsonify({'error': str(e)}), 400
+        flash(str(e))
+        return redirect(url_for('search_bp.search'))
+
+    if explain:
+        # The plan, with the movies each step left and its timing, for checking how a query is answered.
+        return jsonify({'query': query_text, **result.explain()})
+
+    movie_ids = result.movie_ids
+    movies = movie_services.get_movies_by_ids(movie_ids[cursor:cursor + movies_per_page], repo.repo_instance)
+
+    first_movie_url = None
+    last_movie_url = None
+    next_movie_url = None
+    prev_movie_url = None
+
+    if cursor > 0:
+        prev_movie_url = url_for('search_bp.query', q=query_text, cursor=cursor - movies_per_page)
+        first_movie_url = url_for('search_bp.query', q=query_text)
+
+    if cursor + movies_per_page < len(movie_ids):
+        next_movie_url = url_for('search_bp.query', q=query_text, cursor=cursor + movies_per_page)
+
+        last_cursor = movies_per_page * int(len(movie_ids) / movies_per_page)
+        if len(movie_ids) % movies_per_page == 0:
+            last_cursor -= movies_per_page
+        last_movie_url = url_for('search_bp.query', q=query_text, cursor=last_cursor)
+
+    # Construct urls for viewing movie reviews and adding reviews.
+    for movie in movies:
+        movie['view_review_url'] = url_for('movie_lib_bp.movies_by_id', id=movie['id'], view_reviews_for=movie['id'])
+        movie['add_review_url'] = url_for('movie_lib_bp.write_review_on_movie', movie=movie['id'])
+    movie_lib.add_watchlist_urls(movies)
+
+    return render_template(
+        'movie_lib/movie.html',
+        title='Movies',
+        movies_title=f'{len(movie_ids)} movies matching {query_text}',
+        movies=movies,
+        selected_movies=utilities.get_selected_movies(3),
+        actor_urls=utilities.get_actors_and_urls(),
+        director_urls=utilities.get_directors_and_urls(),
+        genre_urls=utilities.get_genres_and_urls(),
+        first_movie_url=first_movie_url,
+        last_movie_url=last_movie_url,
+        prev_movie_url=prev_movie_url,
+        next_movie_url=next_movie_url,
+        show_reviews_for_movie=-1,
+    )
+
+
 class MovieSearchForm(Form):
     choices = [('Actor', 'Actor'),
                ('Director', 'Director'),
-               ('Genre', 'Genre')]
+               ('Genre', 'Genre'),
+               ('Query', 'Query')]
     select = SelectField('search movie:', choices=choices)
     search = StringField('')
@@ -1,5 +1,6 @@
 from watch_movies.adapters.repository import AbstractRepository
 from watch_movies.domain.model import Movie, Review, Actor, Director, Genre
+from watch_movies.search.query import QueryResult, parse_query, run_query
 
 
 def search_exists(search, select, repo: AbstractRepository):
@@ -20,4 +21,9 @@ def search_exists(search, select, repo: AbstractRepository):
         if Director(search) in directors:
             return True
         else:
-            return False
\ No newline at end of file
+            return False
+
+
+def query_movies(query: str, repo: AbstractRepository) -> QueryResult:
+    # Raises QueryException when query isn't a valid query.
+    return run_query(parse_query(query), repo)
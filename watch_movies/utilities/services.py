@@ -2,6 +2,7 @@ from typing import Iterable
 import random
 
 from watch_movies.adapters.repository import AbstractRepository
+from watch_movies.adapters.trending import TrendingMovies
 from watch_movies.domain.model import Director, Genre, Movie, Actor, Review, User
 
 
@@ -40,6 +41,17 @@ def get_random_movies(quantity, repo: AbstractRepository):
     return movies_to_dict(movies)
 
 
+def get_trending_movies(trending: TrendingMovies, quantity, repo: AbstractRepository):
+    # The movies most reviewed recently, with their number of recent reviews; removed movies are skipped.
+    top = trending.top(quantity)
+    recent_reviews = dict(top)
+    movies = movies_to_dict(repo.get_movies_by_ids([movie_id for movie_id, _ in top]))
+    for movie in movies:
+        movie['recent_reviews'] = recent_reviews[movie['id']]
+
+    return movies
+
+
 # ============================================
 # Functions to convert dicts to model entities
 # ============================================
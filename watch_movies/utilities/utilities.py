@@ -1,4 +1,4 @@
-from flask import Blueprint, request, render_template, redirect, url_for, session
+from flask import Blueprint, current_app, request, render_template, redirect, url_for, session
 
 import watch_movies.adapters.repository as repo
 import watch_movies.utilities.services as services
@@ -41,3 +41,14 @@ def get_selected_movies(quantity=3):
     for movie in movies:
         movie['hyperlink'] = url_for('movie_lib_bp.movies_by_id', id=movie['id'])
     return movies
+
+
+def get_trending_movies(quantity=5):
+    trending = current_app.extensions.get('trending_movies')
+    if trending is None:
+        return []
+    movies = services.get_trending_movies(trending, quantity, repo.repo_instance)
+
+    for movie in movies:
+        movie['hyperlink'] = url_for('movie_lib_bp.movies_by_id', id=movie['id'])
+    return movies